@@ -0,0 +1,127 @@
+"""Persistent cache for Gemini responses keyed by request content."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+CACHE_ENABLED = os.getenv("GEMINI_CACHE_ENABLED", "true").strip().lower() not in {"0", "false", "no", "off"}
+CACHE_TTL_SECONDS = _env_int("GEMINI_CACHE_TTL_SECONDS", 24 * 3600)
+CACHE_MAX_ENTRIES = _env_int("GEMINI_CACHE_MAX_ENTRIES", 1000)
+CACHE_MAX_BYTES = _env_int("GEMINI_CACHE_MAX_BYTES", 20_000_000)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+
+def _bump(name: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def cache_key(
+    kind: str,
+    model: str,
+    parts: Sequence[Sequence[Any]],
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """SHA-256 over the model, prompt part fingerprints and sampling settings.
+
+    ``parts`` holds ``("text", value)`` or ``("bytes", mime, sha256)`` tuples so
+    image payloads contribute their digest rather than their content.
+    """
+    material = {
+        "kind": kind,
+        "model": model,
+        "parts": [list(part) for part in parts],
+        "temperature": round(float(temperature), 4),
+        "maxTokens": int(max_tokens),
+    }
+    encoded = json.dumps(material, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str) -> Optional[str]:
+    """Return the cached response text for ``key``, counting the hit or miss."""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        cached = db.get_ai_response(key, time.time())
+    except Exception as exc:
+        _bump("errors")
+        logger.warning("AI response cache lookup failed: %s", exc)
+        return None
+    _bump("hits" if cached is not None else "misses")
+    return cached
+
+
+def record_bypass() -> None:
+    _bump("bypassed")
+
+
+def store(key: str, model: str, response: str) -> None:
+    """Persist ``response`` under ``key``; failures only cost a future miss."""
+    if not CACHE_ENABLED or not response:
+        return
+    try:
+        evicted = db.put_ai_response(
+            key,
+            model,
+            response,
+            now=time.time(),
+            ttl_seconds=CACHE_TTL_SECONDS,
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+        )
+    except Exception as exc:
+        _bump("errors")
+        logger.warning("AI response cache store failed: %s", exc)
+        return
+    _bump("stores")
+    if evicted:
+        _bump("evictions", evicted)
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    summary = db.ai_cache_summary()
+    return {
+        **counters,
+        "hitRate": round(counters["hits"] / lookups, 4) if lookups else None,
+        "entries": summary["entries"],
+        "bytes": summary["bytes"],
+        "enabled": CACHE_ENABLED,
+        "ttlSeconds": CACHE_TTL_SECONDS,
+        "maxEntries": CACHE_MAX_ENTRIES,
+        "maxBytes": CACHE_MAX_BYTES,
+    }
+
+
+def clear() -> int:
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+    return db.clear_ai_responses()
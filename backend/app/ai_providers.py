@@ -0,0 +1,158 @@
+"""Pluggable text-generation backends for the AI endpoints."""
+from __future__ import annotations
+
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List
+
+from google.genai import types
+
+
+class ProviderError(Exception):
+    """Backend failure with an HTTP-like status code, mirroring ``genai.errors.APIError``."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class AiProvider(abc.ABC):
+    """Interface the generators call; responses expose ``.text`` like SDK responses."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def generate(
+        self, *, model: str, contents: types.Content, config: types.GenerateContentConfig, timeout: float
+    ) -> Any:
+        """Return one complete response."""
+
+    @abc.abstractmethod
+    async def generate_stream(
+        self, *, model: str, contents: types.Content, config: types.GenerateContentConfig, timeout: float
+    ) -> AsyncIterator[Any]:
+        """Resolve to an async iterator of partial responses."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name}
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+_EXAMPLE_RE = re.compile(r"Example:\n(\{.*\})\s*$", re.DOTALL)
+
+
+class FakeProvider(AiProvider):
+    """Deterministic offline stand-in for load tests and benchmarks.
+
+    Answers depend only on the prompt: JSON-mode prompts get the schema example
+    from their strict-JSON instruction with placeholders filled in, and text
+    prompts get a fixed echo. Latency, generic errors and 429s are injected from
+    a seeded RNG so runs are reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 200.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        chunks: int = 4,
+        seed: int = 0,
+    ) -> None:
+        self.latency_ms = max(0.0, latency_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self.rate_limit_rate = min(1.0, max(0.0, rate_limit_rate))
+        self.chunks = max(1, chunks)
+        self._rng = random.Random(seed)
+        self._stats = {"calls": 0, "rateLimited": 0, "errors": 0, "completed": 0}
+
+    @classmethod
+    def from_env(cls) -> FakeProvider:
+        return cls(
+            latency_ms=_env_float("FAKE_AI_LATENCY_MS", 200.0),
+            jitter_ms=_env_float("FAKE_AI_JITTER_MS", 0.0),
+            error_rate=_env_float("FAKE_AI_ERROR_RATE", 0.0),
+            rate_limit_rate=_env_float("FAKE_AI_429_RATE", 0.0),
+            chunks=int(_env_float("FAKE_AI_STREAM_CHUNKS", 4)),
+            seed=int(_env_float("FAKE_AI_SEED", 0)),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            **self._stats,
+            "latencyMs": self.latency_ms,
+            "errorRate": self.error_rate,
+            "rateLimitRate": self.rate_limit_rate,
+        }
+
+    @staticmethod
+    def _prompt(contents: types.Content) -> str:
+        return "\n".join(part.text for part in contents.parts or [] if getattr(part, "text", None))
+
+    def answer(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        match = _EXAMPLE_RE.search(prompt)
+        if match:
+            try:
+                example = json.loads(match.group(1))
+            except json.JSONDecodeError:
+                example = None
+            if isinstance(example, dict):
+                filled = json.dumps(example, ensure_ascii=False, separators=(",", ":"))
+                return filled.replace('"..."', json.dumps(f"fake response {digest}"))
+        words = " ".join(prompt.split()[:12])
+        return f"[fake {digest}] {words}"
+
+    async def _admit(self) -> None:
+        self._stats["calls"] += 1
+        delay = self.latency_ms + self._rng.uniform(0.0, self.jitter_ms)
+        roll = self._rng.random()
+        if delay:
+            await asyncio.sleep(delay / 1000.0)
+        if roll < self.rate_limit_rate:
+            self._stats["rateLimited"] += 1
+            raise ProviderError(429, "Fake provider rate limit")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._stats["errors"] += 1
+            raise ProviderError(503, "Fake provider failure")
+
+    async def generate(self, *, model, contents, config, timeout):
+        await self._admit()
+        self._stats["completed"] += 1
+        return SimpleNamespace(text=self.answer(self._prompt(contents)))
+
+    async def generate_stream(self, *, model, contents, config, timeout):
+        await self._admit()
+        text = self.answer(self._prompt(contents))
+        size = max(1, -(-len(text) // self.chunks))
+        pieces: List[str] = [text[start:start + size] for start in range(0, len(text), size)]
+        gap = self.latency_ms / 1000.0 / max(1, len(pieces))
+
+        async def iterate():
+            for piece in pieces:
+                await asyncio.sleep(gap)
+                yield SimpleNamespace(text=piece)
+            self._stats["completed"] += 1
+
+        return iterate()
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import hashlib
 import json
 import logging
 import math
@@ -10,16 +11,26 @@ import os
 import random
 import re
 import html
-from typing import Any, Dict, List, Optional, Tuple, Union
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, TypeVar, Union
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from google import genai
 from google.genai import errors, types
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ValidationError, field_validator
+
+from . import ai_cache, image_pipeline
+from .ai_providers import AiProvider, FakeProvider, ProviderError
+from .ai_scheduler import MAX_CONCURRENCY, QueueFullError, scheduler
+from .journal_context import journal_context
+from .uploads import UploadedFile, multipart_boundary, read_multipart
 
 router = APIRouter(prefix="/api/gemini", tags=["gemini"])
 logger = logging.getLogger(__name__)
+T = TypeVar("T")
 _RETRYABLE_API_CODES = {429, 500, 502, 503, 504}
 DEFAULT_MODEL = "models/gemini-2.5-flash"
 DEFAULT_SAFETY_THRESHOLD = "BLOCK_MEDIUM_AND_ABOVE"
@@ -53,6 +64,9 @@ class AnalyzeImagePayload(BaseModel):
     lang: Optional[str] = "en"
     ppm: Optional[Dict[str, float]] = None
     journalHistory: Optional[List[Dict[str, Any]]] = None
+    growId: Optional[str] = None
+    bypassCache: bool = False
+    priority: Literal["interactive", "batch"] = "interactive"
     
     @field_validator('prompt', 'userNotes')
     @classmethod
@@ -75,6 +89,8 @@ class AnalyzeImagePayload(BaseModel):
 
 class AnalyzeTextPayload(BaseModel):
     text: str
+    bypassCache: bool = False
+    priority: Literal["interactive", "batch"] = "interactive"
     
     @field_validator('text')
     @classmethod
@@ -90,6 +106,8 @@ class StagePayload(BaseModel):
     phase: str
     daysSinceStart: int
     lang: Optional[str] = "en"
+    bypassCache: bool = False
+    priority: Literal["interactive", "batch"] = "interactive"
 
 
 class SteeringCopilotPayload(BaseModel):
@@ -101,6 +119,8 @@ class SteeringCopilotPayload(BaseModel):
     constraints: Optional[List[str]] = None
     existingRules: Optional[List[str]] = None
     existingAlerts: Optional[List[str]] = None
+    bypassCache: bool = False
+    priority: Literal["interactive", "batch"] = "interactive"
 
 
 def _build_steering_copilot_prompt(payload: SteeringCopilotPayload) -> Tuple[List[types.Part], str]:
@@ -157,12 +177,118 @@ def _seconds_to_ms(seconds: float) -> int:
     return int(math.ceil(max(1.0, seconds) * 1000.0))
 
 
+_clients: Dict[Tuple[str, int], genai.Client] = {}
+_clients_lock = threading.Lock()
+
+
 def _client(timeout_seconds: Optional[float] = None) -> genai.Client:
+    """Return the long-lived client for the current API key and timeout.
+
+    Clients are shared across requests and retries; entries for a rotated API key
+    are dropped on first use of the new one.
+    """
     timeout_ms = _seconds_to_ms(timeout_seconds or _retry_settings()["timeout"])
-    return genai.Client(
-        api_key=_api_key(),
-        http_options=types.HttpOptions(api_version="v1beta", timeout=timeout_ms),
-    )
+    api_key = _api_key()
+    key = (api_key, timeout_ms)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            for stale in [existing for existing in _clients if existing[0] != api_key]:
+                del _clients[stale]
+            client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(api_version="v1beta", timeout=timeout_ms),
+            )
+            _clients[key] = client
+    return client
+
+
+class GeminiProvider(AiProvider):
+    """Google Gemini through the shared long-lived clients.
+
+    The pinned SDK's ``aio`` layer is only ``asyncio.to_thread`` around blocking
+    ``requests`` calls, i.e. it would occupy the default executor. Calls run on a
+    dedicated bounded pool instead.
+    """
+
+    name = "gemini"
+
+    async def generate(self, *, model, contents, config, timeout):
+        call = functools.partial(
+            _client(timeout).models.generate_content, model=model, contents=contents, config=config
+        )
+        return await asyncio.get_running_loop().run_in_executor(_gemini_pool(), call)
+
+    async def generate_stream(self, *, model, contents, config, timeout):
+        call = functools.partial(
+            _client(timeout).models.generate_content_stream, model=model, contents=contents, config=config
+        )
+        return _threaded_stream(call)
+
+
+async def _threaded_stream(open_stream: Callable[[], Any]) -> AsyncIterator[Any]:
+    """Iterate a blocking SDK stream on the Gemini pool, handing chunks back through a queue.
+
+    The SDK reads chunks with blocking ``iter_lines()``; consuming it on the loop
+    would stall every other request for the duration of the answer.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def post(kind: str, value: Any) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+        except RuntimeError:  # loop already closed
+            stop.set()
+
+    def pump() -> None:
+        try:
+            for chunk in open_stream():
+                if stop.is_set():
+                    return
+                post("chunk", chunk)
+        except Exception as exc:
+            post("error", exc)
+        else:
+            post("done", None)
+
+    loop.run_in_executor(_gemini_pool(), pump)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        # A cancelled consumer stops the worker at the next chunk boundary.
+        stop.set()
+
+
+_providers: Dict[str, AiProvider] = {}
+_PROVIDER_FACTORIES = {"gemini": GeminiProvider, "fake": FakeProvider.from_env}
+
+
+def _provider_name() -> str:
+    name = os.getenv("AI_PROVIDER", "gemini").strip().lower()
+    return name if name in _PROVIDER_FACTORIES else "gemini"
+
+
+def _provider() -> AiProvider:
+    """Backend selected by AI_PROVIDER (``gemini`` or ``fake``), built once per name."""
+    name = _provider_name()
+    provider = _providers.get(name)
+    if provider is None:
+        provider = _providers.setdefault(name, _PROVIDER_FACTORIES[name]())
+    return provider
+
+
+def _ensure_configured() -> None:
+    if _provider_name() == "gemini":
+        _api_key()
 
 
 def _model() -> str:
@@ -219,6 +345,14 @@ def _env_int(name: str, default: int, minimum: int = 1) -> int:
 ALLOWED_IMAGE_MIME = {"image/jpeg", "image/png", "image/webp"}
 MAX_IMAGE_BYTES = _env_int("GEMINI_MAX_IMAGE_BYTES", 5_000_000, minimum=1)
 MAX_IMAGE_COUNT = _env_int("GEMINI_MAX_IMAGE_COUNT", 4, minimum=1)
+# The upload route's JSON ``payload`` field carries the journal history of long grows.
+MAX_UPLOAD_PAYLOAD_BYTES = _env_int("GEMINI_MAX_UPLOAD_PAYLOAD_BYTES", 8_000_000, minimum=1)
+DECODE_WORKERS = _env_int("GEMINI_DECODE_WORKERS", 2)
+# Each in-flight call holds a worker; headroom covers calls abandoned by cancelled requests.
+GEMINI_WORKERS = _env_int("GEMINI_WORKERS", MAX_CONCURRENCY * 2)
+_gemini_executor: Optional[ThreadPoolExecutor] = None
+_decode_executor: Optional[ThreadPoolExecutor] = None
+_decode_executor_lock = threading.Lock()
 
 
 def _safety_threshold() -> str:
@@ -242,6 +376,24 @@ def _is_thinking_model(model_name: str) -> bool:
     return "thinking" in lowered or "gemini-3" in lowered or "gemini-2.0-flash-thinking" in lowered
 
 
+def _generation_config(
+    model_name: str, temperature: float, max_tokens: int, *, safety: bool
+) -> types.GenerateContentConfig:
+    config: Dict[str, Any] = {
+        "temperature": temperature,
+        "max_output_tokens": max_tokens,
+    }
+    if safety:
+        config["safety_settings"] = _safety_settings()
+    if _is_thinking_model(model_name):
+        budget = _env_int("GEMINI_THINKING_BUDGET", 1024)
+        try:
+            config["thinking_config"] = types.ThinkingConfig(include_thoughts=True, thinking_budget=budget)
+        except (AttributeError, TypeError):
+            pass
+    return types.GenerateContentConfig(**config)
+
+
 def _resp_text(resp: Any) -> str:
     text = getattr(resp, "text", None)
     if text:
@@ -281,6 +433,39 @@ def _extract_json(value: str) -> Optional[Any]:
     return None
 
 
+def _part_fingerprints(parts: List[types.Part]) -> List[Tuple[str, ...]]:
+    """Cache-key material for prompt parts: text verbatim, inline images by digest."""
+    fingerprints: List[Tuple[str, ...]] = []
+    for part in parts:
+        text = getattr(part, "text", None)
+        if text is not None:
+            fingerprints.append(("text", text))
+            continue
+        blob = getattr(part, "inline_data", None)
+        if blob is not None and blob.data is not None:
+            fingerprints.append(("bytes", blob.mime_type or "", hashlib.sha256(blob.data).hexdigest()))
+    return fingerprints
+
+
+async def _schedule(factory: Callable[[], Awaitable[T]], key: str, priority: str) -> T:
+    """Admit a generation through the shared scheduler, mapping a full queue to 503."""
+    try:
+        return await scheduler.run(factory, key=key, priority=priority)
+    except QueueFullError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="AI request queue is full, retry later.",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+async def _cached_response(key: str, bypass: bool) -> Optional[str]:
+    if bypass:
+        ai_cache.record_bypass()
+        return None
+    return await asyncio.to_thread(ai_cache.lookup, key)
+
+
 def _strict_json_instruction(sample: str, lang_label: str) -> str:
     return (
         "Output JSON only. No markdown. No prose.\n"
@@ -297,51 +482,73 @@ async def _generate_json_with_retry(
     temperature: float,
     tries: Optional[int] = None,
     request_timeout: Optional[float] = None,
+    bypass_cache: bool = False,
+    priority: str = "interactive",
+) -> Tuple[Optional[dict], str]:
+    """Generate JSON response with comprehensive retry and error handling.
+
+    Parsed responses are cached by request content; ``bypass_cache`` skips the
+    lookup but still refreshes the stored entry. Cache misses go through the AI
+    scheduler, which coalesces identical in-flight requests.
+    """
+    model_name = _model()
+    cache_key = ai_cache.cache_key(
+        "json",
+        model_name,
+        _part_fingerprints(user_parts) + [("text", extra_instruction)],
+        temperature,
+        max_tokens,
+    )
+    cached = await _cached_response(cache_key, bypass_cache)
+    if cached is not None:
+        parsed = _extract_json(cached)
+        if isinstance(parsed, dict):
+            return parsed, cached
+    return await _schedule(
+        lambda: _json_attempts(
+            user_parts, extra_instruction, max_tokens, temperature, tries, request_timeout, model_name, cache_key
+        ),
+        cache_key,
+        priority,
+    )
+
+
+async def _json_attempts(
+    user_parts: List[types.Part],
+    extra_instruction: str,
+    max_tokens: int,
+    temperature: float,
+    tries: Optional[int],
+    request_timeout: Optional[float],
+    model_name: str,
+    cache_key: str,
 ) -> Tuple[Optional[dict], str]:
-    """Generate JSON response with comprehensive retry and error handling."""
     retry = _retry_settings()
     attempt_limit = max(1, int(tries if tries is not None else retry["tries"]))
     timeout_sec = max(1.0, float(request_timeout if request_timeout is not None else retry["timeout"]))
     delay = float(retry["initial_delay"])
     max_delay = float(retry["max_delay"])
     jitter_ratio = float(retry["jitter_ratio"])
-    client: Optional[genai.Client] = None
+    provider = _provider()
     last_text = ""
     last_error: Optional[Exception] = None
 
     for attempt in range(attempt_limit):
-        if client is None:
-            client = _client(timeout_sec)
-
         contents = types.Content(role="user", parts=user_parts + [types.Part.from_text(text=extra_instruction)])
-        config: Dict[str, Any] = {
-            "temperature": temperature,
-            "max_output_tokens": max_tokens,
-            "safety_settings": _safety_settings(),
-        }
-        model_name = _model()
-        if _is_thinking_model(model_name):
-            budget = _env_int("GEMINI_THINKING_BUDGET", 1024)
-            try:
-                config["thinking_config"] = types.ThinkingConfig(include_thoughts=True, thinking_budget=budget)
-            except (AttributeError, TypeError):
-                pass
-
         try:
-            resp = await asyncio.to_thread(
-                client.models.generate_content,
+            resp = await provider.generate(
                 model=model_name,
                 contents=contents,
-                config=types.GenerateContentConfig(**config),
+                config=_generation_config(model_name, temperature, max_tokens, safety=True),
+                timeout=timeout_sec,
             )
-        except errors.APIError as exc:
+        except (errors.APIError, ProviderError) as exc:
             last_error = exc
             last_text = f"APIError {exc.code}: {exc.message}"
             if exc.code in _RETRYABLE_API_CODES and attempt < attempt_limit - 1:
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 continue
             raise HTTPException(status_code=502, detail="Gemini API error") from exc
         except asyncio.TimeoutError as exc:
@@ -351,7 +558,6 @@ async def _generate_json_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 logger.debug(f"Timeout on attempt {attempt + 1}/{attempt_limit}, retrying...")
                 continue
             raise HTTPException(status_code=504, detail="Request timeout") from exc
@@ -363,7 +569,6 @@ async def _generate_json_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 logger.debug(f"Connection error on attempt {attempt + 1}/{attempt_limit}, retrying...")
                 continue
             raise HTTPException(status_code=502, detail="Network error") from exc
@@ -375,13 +580,13 @@ async def _generate_json_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 continue
             raise HTTPException(status_code=500, detail="Processing error") from exc
 
         last_text = _resp_text(resp)
         parsed = _extract_json(last_text)
         if isinstance(parsed, dict):
+            await asyncio.to_thread(ai_cache.store, cache_key, model_name, last_text)
             return parsed, last_text
         extra_instruction = "Return only valid minified JSON matching the schema. No extra text."
     
@@ -403,6 +608,7 @@ def _build_image_prompt(payload: AnalyzeImagePayload) -> str:
         "notes": "Benutzernotizen" if is_german else "User notes",
         "obs": "Beobachtungen" if is_german else "Observations",
         "ppm": "Nährstoffwerte (PPM)" if is_german else "Nutrient levels (PPM)",
+        "history": "Journalverlauf (neueste zuerst)" if is_german else "Journal history (newest first)",
     }
     inputs = payload.inputs or {}
     observed = [key for key in ["tipburn", "pale", "caMgDeficiency", "claw"] if inputs.get(key)]
@@ -421,6 +627,9 @@ def _build_image_prompt(payload: AnalyzeImagePayload) -> str:
     ]
     if payload.ppm:
         parts.append(f"{labels['ppm']}: {payload.ppm}")
+    history = journal_context(payload.journalHistory, payload.growId)
+    if history:
+        parts.append(f"{labels['history']}:\n{history}")
     format_instruction = "GIB NUR MINIFIZIERTES JSON ZURÜCK (KEIN MARKDOWN, KEIN PROSA-TEXT)." if is_german else "RETURN ONLY MINIFIED JSON (NO MARKDOWN, NO PROSE)."
     parts.append(format_instruction)
     parts.append("Keys: potentialIssues(array[{issue,confidence,explanation}]), recommendedActions(array[string]), disclaimer(string).")
@@ -436,10 +645,11 @@ def _decode_data_uri_or_b64(value: str) -> Tuple[bytes, str]:
     mime_type = "image/jpeg"
     payload = raw
 
-    match = re.match(r"^data:([^;]+);base64,(.*)$", raw, flags=re.IGNORECASE | re.DOTALL)
-    if match:
-        mime_type = match.group(1).strip() or mime_type
-        payload = match.group(2).strip()
+    if raw[:5].lower() == "data:":
+        header, separator, body = raw.partition(",")
+        if separator and header.lower().endswith(";base64"):
+            mime_type = header[5:-len(";base64")].strip() or mime_type
+            payload = body.strip()
 
     mime_type = mime_type.lower().strip()
     if mime_type == "image/jpg":
@@ -464,6 +674,49 @@ def _decode_data_uri_or_b64(value: str) -> Tuple[bytes, str]:
     return decoded, mime_type
 
 
+def _gemini_pool() -> ThreadPoolExecutor:
+    global _gemini_executor
+    with _decode_executor_lock:
+        if _gemini_executor is None:
+            _gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_WORKERS, thread_name_prefix="gemini")
+        return _gemini_executor
+
+
+def _decode_pool() -> ThreadPoolExecutor:
+    global _decode_executor
+    with _decode_executor_lock:
+        if _decode_executor is None:
+            _decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="image-decode")
+        return _decode_executor
+
+
+async def _decode_images(values: List[str]) -> List[Tuple[bytes, str]]:
+    """Decode base64 images on a dedicated pool so the event loop keeps serving."""
+    loop = asyncio.get_running_loop()
+    pool = _decode_pool()
+    return list(await asyncio.gather(*(loop.run_in_executor(pool, _decode_data_uri_or_b64, value) for value in values)))
+
+
+def _sniff_image_mime(data: bytes) -> Optional[str]:
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _validate_upload(upload: UploadedFile) -> Tuple[bytes, str]:
+    """Check an uploaded image by its magic bytes; the client's Content-Type is not trusted."""
+    if not upload.data:
+        raise HTTPException(status_code=400, detail="Uploaded image is empty")
+    mime_type = _sniff_image_mime(upload.data)
+    if mime_type not in ALLOWED_IMAGE_MIME:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+    return upload.data, mime_type
+
+
 def _build_stage_prompt(payload: StagePayload) -> Tuple[List[types.Part], str]:
     lang = (payload.lang or "en").lower()
     is_german = lang.startswith("de")
@@ -491,49 +744,56 @@ async def _generate_text_with_retry(
     temperature: float,
     tries: Optional[int] = None,
     request_timeout: Optional[float] = None,
+    bypass_cache: bool = False,
+    priority: str = "interactive",
 ) -> str:
     """Generate text response with comprehensive retry and error handling."""
+    model_name = _model()
+    cache_key = ai_cache.cache_key("text", model_name, [("text", prompt)], temperature, max_tokens)
+    cached = await _cached_response(cache_key, bypass_cache)
+    if cached:
+        return cached
+    return await _schedule(
+        lambda: _text_attempts(prompt, max_tokens, temperature, tries, request_timeout, model_name, cache_key),
+        cache_key,
+        priority,
+    )
+
+
+async def _text_attempts(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    tries: Optional[int],
+    request_timeout: Optional[float],
+    model_name: str,
+    cache_key: str,
+) -> str:
     retry = _retry_settings()
     attempt_limit = max(1, int(tries if tries is not None else retry["tries"]))
     timeout_sec = max(1.0, float(request_timeout if request_timeout is not None else retry["timeout"]))
     delay = float(retry["initial_delay"])
     max_delay = float(retry["max_delay"])
     jitter_ratio = float(retry["jitter_ratio"])
-    client: Optional[genai.Client] = None
+    provider = _provider()
     last_text = ""
     last_error: Optional[Exception] = None
 
     for attempt in range(attempt_limit):
-        if client is None:
-            client = _client(timeout_sec)
-
-        model_name = _model()
-        config: Dict[str, Any] = {
-            "temperature": temperature,
-            "max_output_tokens": max_tokens,
-        }
-        if _is_thinking_model(model_name):
-            budget = _env_int("GEMINI_THINKING_BUDGET", 1024)
-            try:
-                config["thinking_config"] = types.ThinkingConfig(include_thoughts=True, thinking_budget=budget)
-            except (AttributeError, TypeError):
-                pass
-
         try:
-            resp = await asyncio.to_thread(
-                client.models.generate_content,
+            resp = await provider.generate(
                 model=model_name,
                 contents=types.Content(role="user", parts=[types.Part.from_text(text=prompt)]),
-                config=types.GenerateContentConfig(**config),
+                config=_generation_config(model_name, temperature, max_tokens, safety=False),
+                timeout=timeout_sec,
             )
-        except errors.APIError as exc:
+        except (errors.APIError, ProviderError) as exc:
             last_error = exc
             last_text = f"APIError {exc.code}: {exc.message}"
             if exc.code in _RETRYABLE_API_CODES and attempt < attempt_limit - 1:
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 continue
             raise HTTPException(status_code=502, detail="Gemini API error") from exc
         except asyncio.TimeoutError as exc:
@@ -543,7 +803,6 @@ async def _generate_text_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 logger.debug(f"Timeout on attempt {attempt + 1}/{attempt_limit}, retrying...")
                 continue
             raise HTTPException(status_code=504, detail="Request timeout") from exc
@@ -554,7 +813,6 @@ async def _generate_text_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 logger.debug(f"Connection error on attempt {attempt + 1}/{attempt_limit}, retrying...")
                 continue
             raise HTTPException(status_code=502, detail="Network error") from exc
@@ -565,40 +823,214 @@ async def _generate_text_with_retry(
                 jitter = random.uniform(0.0, delay * jitter_ratio)
                 await asyncio.sleep(delay + jitter)
                 delay = min(delay * 2.0, max_delay)
-                client = None
                 continue
             raise HTTPException(status_code=500, detail="Processing error") from exc
 
         last_text = _resp_text(resp)
         if last_text:
+            await asyncio.to_thread(ai_cache.store, cache_key, model_name, last_text)
             return last_text
     logger.error(f"Failed to get text after {attempt_limit} attempts. Last error: {last_error}")
     return last_text
 
 
+def _build_image_request(
+    payload: AnalyzeImagePayload, images: List[Tuple[bytes, str]]
+) -> Tuple[List[types.Part], str]:
+    instruction = payload.prompt or _build_image_prompt(payload)
+    user_parts = [types.Part.from_text(text=instruction)]
+    for img_bytes, mime in images:
+        user_parts.append(types.Part.from_bytes(data=img_bytes, mime_type=mime))
+    language_label = "German" if (payload.lang or "").lower().startswith("de") else "English"
+    example = '{"potentialIssues":[{"issue":"Example","confidence":"High","explanation":"..."}],"recommendedActions":["..."],"disclaimer":"..."}'
+    return user_parts, _strict_json_instruction(example, language_label)
+
+
+def _is_image_result(parsed: Any) -> bool:
+    return isinstance(parsed, dict) and isinstance(parsed.get("potentialIssues"), list)
+
+
+def _image_fallback(text: str) -> Dict[str, Any]:
+    return {"potentialIssues": [], "recommendedActions": [], "disclaimer": text}
+
+
+class _JsonStreamValidator:
+    """Incremental structural check of streamed JSON.
+
+    Tracks bracket nesting and string/escape state chunk by chunk so malformed
+    output is flagged as soon as it appears; a leading markdown fence is tolerated.
+    """
+
+    def __init__(self) -> None:
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.complete = False
+        self.error: Optional[str] = None
+        self._prefix = ""
+
+    @property
+    def started(self) -> bool:
+        return bool(self.stack) or self.complete
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk:
+            if self.error:
+                return
+            if self.complete:
+                if not (char.isspace() or char == "`"):
+                    self.error = "Unexpected data after the JSON value"
+                continue
+            if not self.stack:
+                if char in "{[":
+                    self.stack.append(char)
+                    continue
+                self._prefix += char
+                label = self._prefix.strip().strip("`").strip().lower()
+                if not "json".startswith(label):
+                    self.error = "Output does not start with a JSON value"
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.stack.append(char)
+            elif char in "}]":
+                opener = self.stack.pop()
+                if "{[".index(opener) != "}]".index(char):
+                    self.error = f"Mismatched '{char}'"
+                elif not self.stack:
+                    self.complete = True
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _ensure_admission() -> None:
+    if not scheduler.admits():
+        raise HTTPException(
+            status_code=503,
+            detail="AI request queue is full, retry later.",
+            headers={"Retry-After": str(scheduler.retry_after())},
+        )
+
+
+async def _stream_generation(
+    user_parts: List[types.Part],
+    *,
+    kind: str,
+    max_tokens: int,
+    temperature: float,
+    finalize: Callable[[str], Tuple[Dict[str, Any], bool]],
+    bypass_cache: bool = False,
+    priority: str = "interactive",
+) -> AsyncIterator[str]:
+    """Yield SSE events: ``start``, ``delta`` chunks, then ``result`` or ``error``.
+
+    ``finalize`` turns the full text into the result payload and says whether it
+    may be cached. JSON output is checked as it streams and an ``invalid`` event
+    is sent once if it stops being well-formed. Retries only happen before the
+    first chunk has been forwarded.
+    """
+    model_name = _model()
+    yield _sse("start", {"model": model_name})
+    cache_key = ai_cache.cache_key(kind, model_name, _part_fingerprints(user_parts), temperature, max_tokens)
+    cached = await _cached_response(cache_key, bypass_cache)
+    if cached:
+        yield _sse("delta", {"text": cached})
+        yield _sse("result", finalize(cached)[0])
+        return
+
+    retry = _retry_settings()
+    attempt_limit = max(1, int(retry["tries"]))
+    delay = float(retry["initial_delay"])
+    validator = _JsonStreamValidator() if kind == "json" else None
+    chunks: List[str] = []
+    try:
+        async with scheduler.slot(priority):
+            provider = _provider()
+            for attempt in range(attempt_limit):
+                try:
+                    stream = await provider.generate_stream(
+                        model=model_name,
+                        contents=types.Content(role="user", parts=user_parts),
+                        config=_generation_config(model_name, temperature, max_tokens, safety=kind == "json"),
+                        timeout=float(retry["timeout"]),
+                    )
+                    async for chunk in stream:
+                        text = _resp_text(chunk)
+                        if not text:
+                            continue
+                        chunks.append(text)
+                        yield _sse("delta", {"text": text})
+                        if validator is not None and validator.error is None:
+                            validator.feed(text)
+                            if validator.error:
+                                yield _sse("invalid", {"error": validator.error})
+                    break
+                except Exception as exc:
+                    retryable = not isinstance(exc, (errors.APIError, ProviderError)) or exc.code in _RETRYABLE_API_CODES
+                    if chunks or not retryable or attempt == attempt_limit - 1:
+                        logger.warning("Gemini stream failed after %d chunks: %s", len(chunks), exc)
+                        yield _sse("error", {"error": "Gemini API error."})
+                        return
+                    jitter = random.uniform(0.0, delay * float(retry["jitter_ratio"]))
+                    await asyncio.sleep(delay + jitter)
+                    delay = min(delay * 2.0, float(retry["max_delay"]))
+    except QueueFullError:
+        yield _sse("error", {"error": "AI request queue is full, retry later."})
+        return
+
+    text = "".join(chunks)
+    if not text.strip():
+        yield _sse("error", {"error": "No model output."})
+        return
+    result, cacheable = finalize(text)
+    if cacheable:
+        await asyncio.to_thread(ai_cache.store, cache_key, model_name, text)
+    yield _sse("result", result)
+
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/analyze-image")
 async def analyze_image(payload: AnalyzeImagePayload):
-    _ = _api_key()
+    _ensure_configured()
     if not payload.imagesBase64:
         return JSONResponse({"error": "No images provided."}, status_code=400)
     if len(payload.imagesBase64) > MAX_IMAGE_COUNT:
         return JSONResponse({"error": "Too many images provided."}, status_code=400)
-    instruction = payload.prompt or _build_image_prompt(payload)
-    user_parts = [types.Part.from_text(text=instruction)]
-    for image in payload.imagesBase64:
-        img_bytes, mime = _decode_data_uri_or_b64(image)
-        user_parts.append(types.Part.from_bytes(data=img_bytes, mime_type=mime))
-    language_label = "German" if (payload.lang or "").lower().startswith("de") else "English"
-    example = '{"potentialIssues":[{"issue":"Example","confidence":"High","explanation":"..."}],"recommendedActions":["..."],"disclaimer":"..."}'
-    extra = _strict_json_instruction(example, language_label)
+    return await _run_image_analysis(payload, await _decode_images(payload.imagesBase64))
+
+
+async def _run_image_analysis(payload: AnalyzeImagePayload, images: List[Tuple[bytes, str]]):
+    images = await image_pipeline.preprocess_images(images)
+    user_parts, extra = _build_image_request(payload, images)
     try:
-        parsed, raw = await _generate_json_with_retry(user_parts, extra_instruction=extra, max_tokens=2048, temperature=0.2)
-        if isinstance(parsed, dict) and isinstance(parsed.get("potentialIssues"), list):
+        parsed, raw = await _generate_json_with_retry(
+            user_parts, extra_instruction=extra, max_tokens=2048, temperature=0.2,
+            bypass_cache=payload.bypassCache, priority=payload.priority,
+        )
+        if _is_image_result(parsed):
             return parsed
         fallback = _strip_code_fences(raw)
         if not fallback:
             return JSONResponse({"error": "No model output."}, status_code=502)
-        return {"potentialIssues": [], "recommendedActions": [], "disclaimer": fallback}
+        return _image_fallback(fallback)
     except errors.APIError as exc:
         logger.warning("Gemini analyze-image failed (%s)", exc.code)
         return JSONResponse({"error": "Gemini API error."}, status_code=502)
@@ -609,12 +1041,81 @@ async def analyze_image(payload: AnalyzeImagePayload):
         return JSONResponse({"error": "Failed to analyze image."}, status_code=500)
 
 
+@router.post("/analyze-image/stream")
+async def analyze_image_stream(payload: AnalyzeImagePayload):
+    _ensure_configured()
+    if not payload.imagesBase64:
+        return JSONResponse({"error": "No images provided."}, status_code=400)
+    if len(payload.imagesBase64) > MAX_IMAGE_COUNT:
+        return JSONResponse({"error": "Too many images provided."}, status_code=400)
+    _ensure_admission()
+    return await _stream_image_analysis(payload, await _decode_images(payload.imagesBase64))
+
+
+async def _stream_image_analysis(payload: AnalyzeImagePayload, images: List[Tuple[bytes, str]]) -> StreamingResponse:
+    images = await image_pipeline.preprocess_images(images)
+    user_parts, extra = _build_image_request(payload, images)
+
+    def finalize(text: str) -> Tuple[Dict[str, Any], bool]:
+        parsed = _extract_json(text)
+        if _is_image_result(parsed):
+            return parsed, True
+        return _image_fallback(_strip_code_fences(text)), False
+
+    return _event_stream(
+        _stream_generation(
+            user_parts + [types.Part.from_text(text=extra)],
+            kind="json",
+            max_tokens=2048,
+            temperature=0.2,
+            finalize=finalize,
+            bypass_cache=payload.bypassCache,
+            priority=payload.priority,
+        )
+    )
+
+
+@router.post("/analyze-image/upload")
+async def analyze_image_upload(request: Request, stream: bool = False):
+    """Multipart variant of analyze-image: raw ``images`` file parts plus a JSON ``payload`` field.
+
+    Parts are size-checked while the body streams in, avoiding base64 inflation
+    and decoding altogether.
+    """
+    _ensure_configured()
+    boundary = multipart_boundary(request.headers.get("content-type"))
+    form = await read_multipart(
+        request.stream(),
+        boundary,
+        max_file_bytes=MAX_IMAGE_BYTES,
+        max_files=MAX_IMAGE_COUNT,
+        field_limits={"payload": MAX_UPLOAD_PAYLOAD_BYTES},
+    )
+    if not form.files:
+        return JSONResponse({"error": "No images provided."}, status_code=400)
+    try:
+        meta = json.loads(form.fields.get("payload") or "{}")
+        if not isinstance(meta, dict):
+            raise ValueError("payload must be a JSON object")
+        payload = AnalyzeImagePayload.model_validate({**meta, "imagesBase64": []})
+    except (ValueError, ValidationError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid payload field: {exc}") from exc
+    images = [_validate_upload(upload) for upload in form.files]
+    if stream:
+        _ensure_admission()
+        return await _stream_image_analysis(payload, images)
+    return await _run_image_analysis(payload, images)
+
+
 @router.post("/analyze-stage")
 async def analyze_stage(payload: StagePayload):
-    _ = _api_key()
+    _ensure_configured()
     user_parts, extra = _build_stage_prompt(payload)
     try:
-        parsed, raw = await _generate_json_with_retry(user_parts, extra_instruction=extra, max_tokens=768, temperature=0.2)
+        parsed, raw = await _generate_json_with_retry(
+            user_parts, extra_instruction=extra, max_tokens=768, temperature=0.2,
+            bypass_cache=payload.bypassCache, priority=payload.priority,
+        )
         if isinstance(parsed, dict) and parsed.get("stage"):
             return parsed
         fallback = _strip_code_fences(raw)
@@ -633,10 +1134,13 @@ async def analyze_stage(payload: StagePayload):
 
 @router.post("/steering-copilot")
 async def steering_copilot(payload: SteeringCopilotPayload):
-    _ = _api_key()
+    _ensure_configured()
     user_parts, extra = _build_steering_copilot_prompt(payload)
     try:
-        parsed, raw = await _generate_json_with_retry(user_parts, extra_instruction=extra, max_tokens=1536, temperature=0.3)
+        parsed, raw = await _generate_json_with_retry(
+            user_parts, extra_instruction=extra, max_tokens=1536, temperature=0.3,
+            bypass_cache=payload.bypassCache, priority=payload.priority,
+        )
         if isinstance(parsed, dict) and isinstance(parsed.get("rules"), list):
             return parsed
         fallback = _strip_code_fences(raw)
@@ -655,12 +1159,15 @@ async def steering_copilot(payload: SteeringCopilotPayload):
 
 @router.post("/analyze-text")
 async def analyze_text(payload: AnalyzeTextPayload):
-    _ = _api_key()
+    _ensure_configured()
     prompt = payload.text.strip()
     if not prompt:
         return JSONResponse({"error": "Empty prompt."}, status_code=400)
     try:
-        result = await _generate_text_with_retry(prompt, max_tokens=1024, temperature=0.4)
+        result = await _generate_text_with_retry(
+            prompt, max_tokens=1024, temperature=0.4,
+            bypass_cache=payload.bypassCache, priority=payload.priority,
+        )
         return {"result": result}
     except errors.APIError as exc:
         logger.warning("Gemini analyze-text failed (%s)", exc.code)
@@ -670,3 +1177,43 @@ async def analyze_text(payload: AnalyzeTextPayload):
     except Exception as exc:
         logger.exception("Gemini analyze-text failed")
         return JSONResponse({"error": "Failed to analyze text."}, status_code=500)
+
+
+@router.post("/analyze-text/stream")
+async def analyze_text_stream(payload: AnalyzeTextPayload):
+    _ensure_configured()
+    prompt = payload.text.strip()
+    if not prompt:
+        return JSONResponse({"error": "Empty prompt."}, status_code=400)
+    _ensure_admission()
+    return _event_stream(
+        _stream_generation(
+            [types.Part.from_text(text=prompt)],
+            kind="text",
+            max_tokens=1024,
+            temperature=0.4,
+            finalize=lambda text: ({"result": text}, True),
+            bypass_cache=payload.bypassCache,
+            priority=payload.priority,
+        )
+    )
+
+
+@router.get("/cache/stats")
+def read_cache_stats():
+    return ai_cache.stats()
+
+
+@router.delete("/cache")
+def clear_cache():
+    return {"cleared": ai_cache.clear()}
+
+
+@router.get("/scheduler/stats")
+def read_scheduler_stats():
+    return scheduler.stats()
+
+
+@router.get("/provider")
+def read_provider_stats():
+    return _provider().stats()
@@ -0,0 +1,151 @@
+"""Admission control for outbound AI requests."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+MAX_CONCURRENCY = _env_int("GEMINI_MAX_CONCURRENCY", 4)
+MAX_QUEUE = _env_int("GEMINI_MAX_QUEUE", 32, minimum=0)
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when no slot is free and the wait queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("AI request queue is full")
+        self.retry_after = retry_after
+
+
+class AiScheduler:
+    """Bounded-concurrency scheduler with a priority wait queue.
+
+    Identical requests (same ``key``) that arrive while one is queued or running
+    share its outcome instead of taking another slot. Freed slots are handed
+    straight to the best waiter: lower priority value first, then arrival order.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._avg_seconds = 5.0
+        self._stats = {"started": 0, "queued": 0, "coalesced": 0, "rejected": 0}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    def retry_after(self) -> int:
+        """Seconds until a queue position is likely to open up."""
+        backlog = self.queued + self._active
+        return max(1, math.ceil(self._avg_seconds * backlog / self.max_concurrency))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "active": self._active,
+            "waiting": self.queued,
+            "inflightKeys": len(self._inflight),
+            "maxConcurrency": self.max_concurrency,
+            "maxQueue": self.max_queue,
+            "avgSeconds": round(self._avg_seconds, 3),
+        }
+
+    def admits(self) -> bool:
+        """Whether a new request would currently get a slot or a queue position."""
+        return self._active < self.max_concurrency or self.queued < self.max_queue
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self.max_concurrency and not self.queued:
+            self._active += 1
+            return
+        if self.queued >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise QueueFullError(self.retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._stats["queued"] += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation; pass it on.
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    async def _run_slot(self, factory: Callable[[], Awaitable[T]], priority: str) -> T:
+        async with self.slot(priority):
+            return await factory()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: str = "interactive") -> AsyncIterator[None]:
+        """Hold one slot for a long-lived call such as a streamed generation."""
+        await self._acquire(PRIORITIES.get(priority, PRIORITIES["interactive"]))
+        self._stats["started"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._release()
+
+    async def run(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        key: Optional[str] = None,
+        priority: str = "interactive",
+    ) -> T:
+        """Run ``factory()`` once a slot is free, coalescing on ``key``."""
+        if key is None:
+            return await self._run_slot(factory, priority)
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(shared)
+        task = asyncio.ensure_future(self._run_slot(factory, priority))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Mark the outcome retrieved even if every caller disconnected.
+            task.exception()
+
+
+scheduler = AiScheduler(MAX_CONCURRENCY, MAX_QUEUE)
@@ -9,7 +9,7 @@ import re
 import sqlite3
 import threading
 from pathlib import Path
-from typing import Any, Dict, Generator, List, Optional
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +21,15 @@ class InvalidIdentifierError(ValueError):
     """Raised when a collection/key identifier is invalid."""
 
 
+class InsufficientStockError(ValueError):
+    """Raised when a batch of inventory deductions exceeds the available stock."""
+
+    def __init__(self, shortages: Dict[str, Dict[str, float]]):
+        self.shortages = shortages
+        names = ", ".join(sorted(shortages))
+        super().__init__(f"Insufficient stock for: {names}")
+
+
 _IDENTIFIER_RE = re.compile(r"^[A-Za-z0-9_.:-]+$")
 _MAX_IDENTIFIER_LENGTH = 128
 
@@ -40,6 +49,45 @@ def _validate_identifier(value: str, label: str, *, max_length: int = _MAX_IDENT
     return cleaned
 
 
+def _json_diff(old: Any, new: Any, path: Tuple[Any, ...] = ()) -> List[List[Any]]:
+    """Compact forward diff: ``[path, value]`` sets a value, ``[path]`` removes a key."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[List[Any]] = []
+        for key in old:
+            if key not in new:
+                ops.append([list(path + (key,))])
+        for key, value in new.items():
+            if key not in old:
+                ops.append([list(path + (key,)), value])
+            else:
+                ops.extend(_json_diff(old[key], value, path + (key,)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (before, after) in enumerate(zip(old, new)):
+            ops.extend(_json_diff(before, after, path + (index,)))
+        return ops
+    if old == new and type(old) is type(new):
+        return []
+    return [[list(path), new]]
+
+
+def _apply_json_diff(doc: Any, ops: List[List[Any]]) -> Any:
+    for op in ops:
+        path = op[0]
+        if not path:
+            doc = op[1] if len(op) > 1 else {}
+            continue
+        target = doc
+        for key in path[:-1]:
+            target = target[key]
+        if len(op) > 1:
+            target[path[-1]] = op[1]
+        elif isinstance(target, dict):
+            target.pop(path[-1], None)
+    return doc
+
+
 def _resolve_db_path() -> Path:
     override = os.getenv("DATABASE_URL")
     if override:
@@ -117,6 +165,47 @@ class GrowMindDB:
                 )
             """)
 
+            # Append-only ledger of inventory changes; `inventory` holds the balance
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inventory_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    component TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    delta REAL NOT NULL,
+                    balance_after REAL NOT NULL,
+                    reference TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_inventory_events_component
+                ON inventory_events (component, id)
+            """)
+
+            # One row per stored nutrient plan plus its append-only diff history
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plans (
+                    cultivar TEXT NOT NULL,
+                    substrate TEXT NOT NULL,
+                    plan_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    revision INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (cultivar, substrate, plan_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plan_revisions (
+                    cultivar TEXT NOT NULL,
+                    substrate TEXT NOT NULL,
+                    plan_id TEXT NOT NULL,
+                    revision INTEGER NOT NULL,
+                    diff TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (cultivar, substrate, plan_id, revision)
+                )
+            """)
+
             # Key-Value Collections table
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS collections (
@@ -136,6 +225,77 @@ class GrowMindDB:
                     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+
+            # Hourly per-grow metric rollups maintained on journal writes
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metric_buckets (
+                    grow_id TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    sample_count INTEGER NOT NULL DEFAULT 0,
+                    value_sum REAL NOT NULL DEFAULT 0.0,
+                    value_min REAL,
+                    value_max REAL,
+                    PRIMARY KEY (grow_id, bucket_start, metric)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metric_buckets_start
+                ON metric_buckets (bucket_start)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metric_histogram_bins (
+                    grow_id TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    bin INTEGER NOT NULL,
+                    sample_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (grow_id, bucket_start, metric, bin)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metric_rollup_state (
+                    grow_id TEXT PRIMARY KEY,
+                    latest_at TEXT,
+                    latest_phase TEXT,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Durable queue of telemetry summaries awaiting delivery
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS telemetry_outbox (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT NOT NULL,
+                    delivered_at TEXT,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_telemetry_outbox_pending
+                ON telemetry_outbox (delivered_at, next_attempt_at)
+            """)
+
+            # Gemini responses keyed by a hash of the request content
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_ai_response_cache_used
+                ON ai_response_cache (last_used_at)
+            """)
             conn.commit()
         except Exception as e:
             conn.rollback()
@@ -162,6 +322,15 @@ class GrowMindDB:
                     result[row["key"]] = None
             return result
 
+    def list_collection_keys(self, category: str) -> List[str]:
+        """List the keys of a collection without decoding their values."""
+        category = _validate_identifier(category, "category")
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT key FROM collections WHERE category = ? ORDER BY key", (category,)
+            )
+            return [row["key"] for row in cursor.fetchall()]
+
     def set_collection(self, category: str, data: Dict[str, Any]) -> None:
         """Replace entire collection with new data."""
         category = _validate_identifier(category, "category")
@@ -251,9 +420,27 @@ class GrowMindDB:
                 } for row in cursor.fetchall()
             }
 
+    def _log_inventory_event(
+        self,
+        conn: sqlite3.Connection,
+        component: str,
+        kind: str,
+        previous: float,
+        reference: Optional[str] = None,
+    ) -> None:
+        conn.execute(
+            """
+            INSERT INTO inventory_events (component, kind, delta, balance_after, reference)
+            SELECT component, ?, grams - ?, grams, ? FROM inventory WHERE component = ?
+            """,
+            (kind, previous, reference, component),
+        )
+
     def update_inventory(self, component: str, grams: float, initial_grams: Optional[float] = None) -> None:
         """Update or create an inventory item."""
-        with self._get_connection() as conn:
+        with self.transaction() as conn:
+            row = conn.execute("SELECT grams FROM inventory WHERE component = ?", (component,)).fetchone()
+            previous = float(row["grams"]) if row else 0.0
             if initial_grams is not None:
                 conn.execute(
                     """
@@ -277,20 +464,258 @@ class GrowMindDB:
                     """,
                     (component, grams, grams)
                 )
-            conn.commit()
+            self._log_inventory_event(conn, component, "set", previous)
+
+    def consume_inventory(
+        self,
+        consumption: Dict[str, float],
+        *,
+        initial: Optional[Dict[str, float]] = None,
+        reference: Optional[str] = None,
+    ) -> Dict[str, float]:
+        """Decrement stock for several components in one transaction, logging one event each.
+
+        Balances are clamped at zero in SQL, so concurrent callers cannot lose
+        updates. Missing components are created empty with ``initial`` as their
+        full size. Returns the new balances.
+        """
+        return self.consume_inventory_batch([(reference, consumption)], initial=initial)
+
+    def consume_inventory_batch(
+        self,
+        batches: Sequence[Tuple[Optional[str], Dict[str, float]]],
+        *,
+        initial: Optional[Dict[str, float]] = None,
+        require_available: bool = False,
+    ) -> Dict[str, float]:
+        """Apply several (reference, consumption) deductions in a single transaction.
+
+        With ``require_available`` the summed demand is checked against stock
+        inside the transaction first, and InsufficientStockError is raised
+        before anything is written.
+        """
+        balances: Dict[str, float] = {}
+        with self.transaction() as conn:
+            demand: Dict[str, float] = {}
+            for _, consumption in batches:
+                for component, used in consumption.items():
+                    if float(used) > 0:
+                        demand[component] = demand.get(component, 0.0) + float(used)
+            for component in demand:
+                full = float((initial or {}).get(component) or 0.0)
+                conn.execute(
+                    "INSERT OR IGNORE INTO inventory (component, grams, initial_grams) VALUES (?, 0.0, ?)",
+                    (component, full),
+                )
+            if require_available and demand:
+                placeholders = ", ".join("?" for _ in demand)
+                stock = {
+                    row["component"]: float(row["grams"])
+                    for row in conn.execute(
+                        f"SELECT component, grams FROM inventory WHERE component IN ({placeholders})",
+                        tuple(demand),
+                    ).fetchall()
+                }
+                shortages = {
+                    component: {"required": needed, "available": stock.get(component, 0.0)}
+                    for component, needed in demand.items()
+                    if needed > stock.get(component, 0.0) + 1e-9
+                }
+                if shortages:
+                    raise InsufficientStockError(shortages)
+
+            for reference, consumption in batches:
+                for component, used in consumption.items():
+                    used = float(used)
+                    if used <= 0:
+                        continue
+                    previous = float(
+                        conn.execute("SELECT grams FROM inventory WHERE component = ?", (component,)).fetchone()["grams"]
+                    )
+                    conn.execute(
+                        """
+                        UPDATE inventory SET grams = MAX(0.0, grams - ?), updated_at = CURRENT_TIMESTAMP
+                        WHERE component = ?
+                        """,
+                        (used, component),
+                    )
+                    self._log_inventory_event(conn, component, "consume", previous, reference)
+                    balances[component] = max(0.0, previous - used)
+        return balances
+
+    def fetch_inventory_events(
+        self, component: Optional[str] = None, limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Retrieve the most recent inventory ledger events, newest first."""
+        query = "SELECT id, component, kind, delta, balance_after, reference, created_at FROM inventory_events"
+        params: List[Any] = []
+        if component:
+            query += " WHERE component = ?"
+            params.append(component)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._get_connection() as conn:
+            return [
+                {
+                    "id": int(row["id"]),
+                    "component": row["component"],
+                    "kind": row["kind"],
+                    "delta": float(row["delta"]),
+                    "balanceAfter": float(row["balance_after"]),
+                    "reference": row["reference"],
+                    "createdAt": row["created_at"],
+                }
+                for row in conn.execute(query, params).fetchall()
+            ]
 
     def ensure_inventory_items(self, items: Dict[str, float]):
         """Ensure these components exist in the inventory table with at least these initial values."""
-        with self._get_connection() as conn:
+        with self.transaction() as conn:
             for component, full_size in items.items():
-                conn.execute(
+                cursor = conn.execute(
                     """
                     INSERT OR IGNORE INTO inventory (component, grams, initial_grams)
                     VALUES (?, ?, ?)
                     """,
                     (component, full_size, full_size)
                 )
-            conn.commit()
+                if cursor.rowcount:
+                    self._log_inventory_event(conn, component, "seed", 0.0)
+
+    # --- Plan Methods ---
+
+    def fetch_plans(self) -> List[Dict[str, Any]]:
+        """Retrieve every stored plan row in insertion order."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT cultivar, substrate, plan_id, payload, revision FROM plans ORDER BY rowid"
+            )
+            rows = []
+            for row in cursor.fetchall():
+                try:
+                    payload = json.loads(row["payload"])
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON in plan {row['plan_id']}: {e}")
+                    continue
+                rows.append({
+                    "cultivar": row["cultivar"],
+                    "substrate": row["substrate"],
+                    "planId": row["plan_id"],
+                    "revision": int(row["revision"]),
+                    "payload": payload,
+                })
+            return rows
+
+    def _write_plan_revision(
+        self, conn: sqlite3.Connection, cultivar: str, substrate: str, plan_id: str, payload: Optional[Dict[str, Any]]
+    ) -> Optional[int]:
+        row = conn.execute(
+            "SELECT payload, revision FROM plans WHERE cultivar = ? AND substrate = ? AND plan_id = ?",
+            (cultivar, substrate, plan_id),
+        ).fetchone()
+        previous = json.loads(row["payload"]) if row else {}
+        last = conn.execute(
+            """
+            SELECT MAX(revision) AS revision FROM plan_revisions
+            WHERE cultivar = ? AND substrate = ? AND plan_id = ?
+            """,
+            (cultivar, substrate, plan_id),
+        ).fetchone()["revision"]
+        ops = _json_diff(previous, payload or {})
+        if not ops:
+            return None
+        revision = int(last or 0) + 1
+        conn.execute(
+            """
+            INSERT INTO plan_revisions (cultivar, substrate, plan_id, revision, diff)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (cultivar, substrate, plan_id, revision, json.dumps(ops, separators=(",", ":"))),
+        )
+        return revision
+
+    def save_plan(self, cultivar: str, substrate: str, plan_id: str, payload: Dict[str, Any]) -> int:
+        """Upsert one plan row and append the diff from its previous version.
+
+        Returns the plan's revision number (unchanged when the payload is identical).
+        """
+        with self.transaction() as conn:
+            revision = self._write_plan_revision(conn, cultivar, substrate, plan_id, payload)
+            if revision is None:
+                row = conn.execute(
+                    "SELECT revision FROM plans WHERE cultivar = ? AND substrate = ? AND plan_id = ?",
+                    (cultivar, substrate, plan_id),
+                ).fetchone()
+                return int(row["revision"]) if row else 0
+            conn.execute(
+                """
+                INSERT INTO plans (cultivar, substrate, plan_id, payload, revision, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(cultivar, substrate, plan_id) DO UPDATE SET
+                payload = excluded.payload,
+                revision = excluded.revision,
+                updated_at = CURRENT_TIMESTAMP
+                """,
+                (cultivar, substrate, plan_id, json.dumps(payload), revision),
+            )
+            return revision
+
+    def delete_plan(self, cultivar: str, substrate: str, plan_id: str) -> bool:
+        """Remove a plan row, keeping its history (the deletion is recorded as a revision)."""
+        with self.transaction() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM plans WHERE cultivar = ? AND substrate = ? AND plan_id = ?",
+                (cultivar, substrate, plan_id),
+            ).fetchone()
+            if not exists:
+                return False
+            self._write_plan_revision(conn, cultivar, substrate, plan_id, None)
+            conn.execute(
+                "DELETE FROM plans WHERE cultivar = ? AND substrate = ? AND plan_id = ?",
+                (cultivar, substrate, plan_id),
+            )
+            return True
+
+    def fetch_plan_revisions(self, cultivar: str, substrate: str, plan_id: str) -> List[Dict[str, Any]]:
+        """List a plan's revisions, newest first, with the number of changed fields."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                """
+                SELECT revision, diff, created_at FROM plan_revisions
+                WHERE cultivar = ? AND substrate = ? AND plan_id = ?
+                ORDER BY revision DESC
+                """,
+                (cultivar, substrate, plan_id),
+            )
+            return [
+                {
+                    "revision": int(row["revision"]),
+                    "changes": len(json.loads(row["diff"])),
+                    "createdAt": row["created_at"],
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def fetch_plan_at_revision(
+        self, cultivar: str, substrate: str, plan_id: str, revision: int
+    ) -> Optional[Dict[str, Any]]:
+        """Rebuild a plan as of ``revision`` by replaying its diffs; None if unknown or deleted."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                """
+                SELECT revision, diff FROM plan_revisions
+                WHERE cultivar = ? AND substrate = ? AND plan_id = ? AND revision <= ?
+                ORDER BY revision
+                """,
+                (cultivar, substrate, plan_id, revision),
+            )
+            rows = cursor.fetchall()
+        if not rows or int(rows[-1]["revision"]) != revision:
+            return None
+        doc: Dict[str, Any] = {}
+        for row in rows:
+            doc = _apply_json_diff(doc, json.loads(row["diff"]))
+        return doc or None
 
     # --- Settings Methods ---
 
@@ -324,6 +749,285 @@ class GrowMindDB:
             )
             conn.commit()
 
+    # --- Metric Rollup Methods ---
+
+    def merge_metric_buckets(
+        self,
+        grow_id: str,
+        rows: Sequence[Tuple[str, str, int, float, float, float]],
+        latest_at: Optional[str] = None,
+        latest_phase: Optional[str] = None,
+        *,
+        bins: Sequence[Tuple[str, str, int, int]] = (),
+        replace: bool = False,
+    ) -> None:
+        """Fold (bucket_start, metric, count, sum, min, max) rows into a grow's rollups.
+
+        ``bins`` are (bucket_start, metric, bin, count) histogram increments. With
+        ``replace`` the grow's existing rollups are dropped first, so a full rebuild
+        lands atomically in one transaction.
+        """
+        with self.transaction() as conn:
+            if replace:
+                conn.execute("DELETE FROM metric_buckets WHERE grow_id = ?", (grow_id,))
+                conn.execute("DELETE FROM metric_histogram_bins WHERE grow_id = ?", (grow_id,))
+                conn.execute("DELETE FROM metric_rollup_state WHERE grow_id = ?", (grow_id,))
+            conn.executemany(
+                """
+                INSERT INTO metric_buckets
+                    (grow_id, bucket_start, metric, sample_count, value_sum, value_min, value_max)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(grow_id, bucket_start, metric) DO UPDATE SET
+                sample_count = sample_count + excluded.sample_count,
+                value_sum = value_sum + excluded.value_sum,
+                value_min = MIN(COALESCE(value_min, excluded.value_min), excluded.value_min),
+                value_max = MAX(COALESCE(value_max, excluded.value_max), excluded.value_max)
+                """,
+                [(grow_id, *row) for row in rows],
+            )
+            conn.executemany(
+                """
+                INSERT INTO metric_histogram_bins (grow_id, bucket_start, metric, bin, sample_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(grow_id, bucket_start, metric, bin) DO UPDATE SET
+                sample_count = sample_count + excluded.sample_count
+                """,
+                [(grow_id, *row) for row in bins],
+            )
+            conn.execute(
+                """
+                INSERT INTO metric_rollup_state (grow_id, latest_at, latest_phase, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(grow_id) DO UPDATE SET
+                latest_phase = CASE
+                    WHEN COALESCE(excluded.latest_at, '') >= COALESCE(latest_at, '')
+                    THEN excluded.latest_phase ELSE latest_phase END,
+                latest_at = MAX(COALESCE(latest_at, ''), COALESCE(excluded.latest_at, '')),
+                updated_at = CURRENT_TIMESTAMP
+                """,
+                (grow_id, latest_at, latest_phase),
+            )
+
+    def fetch_metric_buckets(self, grow_id: str, since_bucket: str) -> List[Dict[str, Any]]:
+        """Retrieve a grow's rollup buckets starting at or after ``since_bucket``."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                """
+                SELECT bucket_start, metric, sample_count, value_sum, value_min, value_max
+                FROM metric_buckets
+                WHERE grow_id = ? AND bucket_start >= ?
+                ORDER BY bucket_start
+                """,
+                (grow_id, since_bucket),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def fetch_metric_histograms(
+        self, grow_ids: Sequence[str], since_bucket: str
+    ) -> Dict[str, Dict[int, int]]:
+        """Merge histogram bins across hours (and grows) since ``since_bucket`` in SQL."""
+        if not grow_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in grow_ids)
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT metric, bin, SUM(sample_count) AS sample_count
+                FROM metric_histogram_bins
+                WHERE grow_id IN ({placeholders}) AND bucket_start >= ?
+                GROUP BY metric, bin
+                """,
+                (*grow_ids, since_bucket),
+            )
+            result: Dict[str, Dict[int, int]] = {}
+            for row in cursor.fetchall():
+                result.setdefault(row["metric"], {})[int(row["bin"])] = int(row["sample_count"])
+            return result
+
+    def get_metric_rollup_state(self, grow_id: str) -> Optional[Dict[str, Any]]:
+        """Return the rollup marker for a grow, or None if it was never built."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT latest_at, latest_phase FROM metric_rollup_state WHERE grow_id = ?",
+                (grow_id,),
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def list_metric_rollup_grows(self, since_bucket: Optional[str] = None) -> List[str]:
+        """List grows with rollups, optionally only those with buckets since ``since_bucket``."""
+        with self._get_connection() as conn:
+            if since_bucket is None:
+                cursor = conn.execute("SELECT grow_id FROM metric_rollup_state ORDER BY grow_id")
+            else:
+                cursor = conn.execute(
+                    "SELECT DISTINCT grow_id FROM metric_buckets WHERE bucket_start >= ? ORDER BY grow_id",
+                    (since_bucket,),
+                )
+            return [row["grow_id"] for row in cursor.fetchall()]
+
+    # --- Telemetry Outbox Methods ---
+
+    def enqueue_outbox(self, item_id: str, payload: Dict[str, Any], created_at: str) -> bool:
+        """Queue a payload for delivery; returns False if the id was already queued."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO telemetry_outbox (id, payload, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (item_id, json.dumps(payload), created_at, created_at),
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def fetch_outbox_due(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        """Retrieve undelivered outbox items whose next attempt is due."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                """
+                SELECT id, payload, attempts FROM telemetry_outbox
+                WHERE delivered_at IS NULL AND next_attempt_at <= ?
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                (now, limit),
+            )
+            items = []
+            for row in cursor.fetchall():
+                try:
+                    payload = json.loads(row["payload"])
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON in telemetry outbox item {row['id']}: {e}")
+                    continue
+                items.append({"id": row["id"], "payload": payload, "attempts": int(row["attempts"])})
+            return items
+
+    def next_outbox_attempt(self) -> Optional[str]:
+        """Return the earliest pending retry time, or None if nothing is queued."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) AS due FROM telemetry_outbox WHERE delivered_at IS NULL"
+            ).fetchone()
+            return row["due"] if row else None
+
+    def mark_outbox_delivered(self, item_ids: Sequence[str], delivered_at: str) -> None:
+        """Record delivered ids so replays of the same summary are skipped."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE telemetry_outbox SET delivered_at = ?, last_error = NULL WHERE id = ?",
+                [(delivered_at, item_id) for item_id in item_ids],
+            )
+
+    def mark_outbox_failed(self, retries: Sequence[Tuple[str, str]], error: str) -> None:
+        """Bump attempts and reschedule each (id, next_attempt_at) pair."""
+        with self.transaction() as conn:
+            conn.executemany(
+                """
+                UPDATE telemetry_outbox
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                [(next_attempt_at, error[:500], item_id) for item_id, next_attempt_at in retries],
+            )
+
+    def prune_outbox(self, delivered_before: str) -> int:
+        """Drop delivered items older than the idempotency retention window."""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM telemetry_outbox WHERE delivered_at IS NOT NULL AND delivered_at < ?",
+                (delivered_before,),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+
+    # --- AI Response Cache Methods ---
+
+    def get_ai_response(self, key: str, now: float) -> Optional[str]:
+        """Return a cached response that has not expired, bumping its recency."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT response, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["expires_at"] <= now:
+                conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE ai_response_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?",
+                (now, key),
+            )
+            conn.commit()
+            return row["response"]
+
+    def put_ai_response(
+        self,
+        key: str,
+        model: str,
+        response: str,
+        *,
+        now: float,
+        ttl_seconds: float,
+        max_entries: int,
+        max_bytes: int,
+    ) -> int:
+        """Store a response, then evict expired and least recently used rows over the bounds.
+
+        Returns the number of evicted rows.
+        """
+        size = len(response.encode("utf-8"))
+        with self.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO ai_response_cache (key, model, response, size, created_at, expires_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                model = excluded.model,
+                response = excluded.response,
+                size = excluded.size,
+                created_at = excluded.created_at,
+                expires_at = excluded.expires_at,
+                last_used_at = excluded.last_used_at
+                """,
+                (key, model, response, size, now, now + ttl_seconds, now),
+            )
+            expired = conn.execute("DELETE FROM ai_response_cache WHERE expires_at <= ?", (now,)).rowcount
+            evicted = conn.execute(
+                """
+                DELETE FROM ai_response_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key,
+                            ROW_NUMBER() OVER (ORDER BY last_used_at DESC, created_at DESC) AS position,
+                            SUM(size) OVER (ORDER BY last_used_at DESC, created_at DESC) AS running_bytes
+                        FROM ai_response_cache
+                    )
+                    WHERE position > ? OR (position > 1 AND running_bytes > ?)
+                )
+                """,
+                (max_entries, max_bytes),
+            ).rowcount
+            return expired + evicted
+
+    def ai_cache_summary(self) -> Dict[str, int]:
+        """Entry count, stored bytes and lifetime hits of the response cache."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                """
+                SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(hits), 0) AS hits
+                FROM ai_response_cache
+                """
+            ).fetchone()
+            return {"entries": int(row["entries"]), "bytes": int(row["bytes"]), "hits": int(row["hits"])}
+
+    def clear_ai_responses(self) -> int:
+        """Drop every cached response."""
+        with self._get_connection() as conn:
+            cursor = conn.execute("DELETE FROM ai_response_cache")
+            conn.commit()
+            return cursor.rowcount
 
 # Global instance
 db = GrowMindDB()
@@ -0,0 +1,209 @@
+"""Downscale and re-encode photos before they are stored or sent to Gemini."""
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import functools
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple
+
+try:  # Pillow is optional; without it images pass through untouched.
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depends on the runtime image
+    Image = None  # type: ignore[assignment]
+    ImageOps = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+MAX_EDGE = _env_int("IMAGE_MAX_EDGE", 1536, minimum=64)
+QUALITY = min(100, _env_int("IMAGE_QUALITY", 80))
+OUTPUT_FORMAT = "jpeg" if os.getenv("IMAGE_FORMAT", "webp").strip().lower() in {"jpg", "jpeg"} else "webp"
+WORKERS = _env_int("IMAGE_PREPROCESS_WORKERS", 2)
+CACHE_SIZE = _env_int("IMAGE_CACHE_SIZE", 64, minimum=0)
+
+_FORMAT_MIME = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, int, str, int], Tuple[bytes, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _process_image(data: bytes, mime_type: str, max_edge: int, fmt: str, quality: int) -> Tuple[bytes, str]:
+    """Orient, downscale and re-encode one image without metadata (runs in a worker process)."""
+    with Image.open(io.BytesIO(data)) as source:
+        already_done = (
+            (source.format or "").lower() == fmt
+            and max(source.size) <= max_edge
+            and not source.info.get("exif")
+            and not source.getexif()
+        )
+        if already_done:
+            return data, mime_type
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        output = io.BytesIO()
+        if fmt == "jpeg":
+            image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(output, format="WEBP", quality=quality, method=4)
+    return output.getvalue(), _FORMAT_MIME[fmt]
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers avoid forking a process that already runs threads.
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died so the next submit starts a fresh one.
+
+    A broken executor has already terminated its workers and refuses new work.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+            logger.warning("Image pre-processing worker died; restarting the pool")
+
+
+def _watch(pool: ProcessPoolExecutor, future: Future) -> None:
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_pool(pool)
+
+
+def _cache_key(data: bytes) -> Tuple[str, int, str, int]:
+    return hashlib.sha256(data).hexdigest(), MAX_EDGE, OUTPUT_FORMAT, QUALITY
+
+
+def _cache_get(key: Tuple[str, int, str, int]) -> Optional[Tuple[bytes, str]]:
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+        return hit
+
+
+def _remember(key: Tuple[str, int, str, int], result: Tuple[bytes, str]) -> Tuple[bytes, str]:
+    if CACHE_SIZE <= 0:
+        return result
+    with _cache_lock:
+        _cache[key] = result
+        # Processed output maps to itself so re-submitting it is a hit, not a re-encode.
+        _cache[_cache_key(result[0])] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _submit(images: Sequence[Tuple[bytes, str]]) -> List[Tuple[Optional[Tuple[bytes, str]], Optional[Future], tuple]]:
+    jobs = []
+    for data, mime_type in images:
+        key = _cache_key(data)
+        cached = _cache_get(key)
+        if cached is not None:
+            jobs.append((cached, None, key))
+            continue
+        pool = _executor()
+        try:
+            future = pool.submit(_process_image, data, mime_type, MAX_EDGE, OUTPUT_FORMAT, QUALITY)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            pool = _executor()
+            future = pool.submit(_process_image, data, mime_type, MAX_EDGE, OUTPUT_FORMAT, QUALITY)
+        future.add_done_callback(functools.partial(_watch, pool))
+        jobs.append((None, future, key))
+    return jobs
+
+
+def _settle(key: tuple, original: Tuple[bytes, str], future: Future) -> Tuple[bytes, str]:
+    try:
+        return _remember(key, future.result())
+    except Exception as exc:
+        logger.debug("Image pre-processing failed, sending original: %s", exc)
+        return original
+
+
+async def preprocess_images(images: Sequence[Tuple[bytes, str]]) -> List[Tuple[bytes, str]]:
+    """Return (bytes, mime) pairs ready for upload, processed in the worker pool."""
+    if not images or not available():
+        return list(images)
+    jobs = _submit(images)
+    waiting = [asyncio.wrap_future(future) for _, future, _ in jobs if future is not None]
+    if waiting:
+        # Failures are handled per image in _settle; gather only marks them retrieved.
+        await asyncio.gather(*waiting, return_exceptions=True)
+    return [
+        cached if future is None else _settle(key, original, future)
+        for original, (cached, future, key) in zip(images, jobs)
+    ]
+
+
+def preprocess_images_sync(images: Sequence[Tuple[bytes, str]]) -> List[Tuple[bytes, str]]:
+    """Blocking variant for sync routes, which already run on the threadpool."""
+    if not images or not available():
+        return list(images)
+    jobs = _submit(images)
+    return [
+        cached if future is None else _settle(key, original, future)
+        for original, (cached, future, key) in zip(images, jobs)
+    ]
+
+
+def preprocess_data_uris(values: Sequence[str]) -> List[str]:
+    """Process ``data:image/...;base64,`` strings; anything else is kept as-is."""
+    if not available():
+        return list(values)
+    decoded: List[Tuple[int, Tuple[bytes, str]]] = []
+    for index, value in enumerate(values):
+        header, separator, body = value.partition(",")
+        if not (separator and header.startswith("data:image/") and header.endswith(";base64")):
+            continue
+        try:
+            decoded.append((index, (base64.b64decode(body, validate=True), header[5:-len(";base64")])))
+        except (binascii.Error, ValueError):
+            continue
+    result = list(values)
+    processed = preprocess_images_sync([image for _, image in decoded])
+    for (index, (original, _)), (data, mime_type) in zip(decoded, processed):
+        if data != original:
+            result[index] = f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    return result
+
+
+def reset_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,185 @@
+"""Token-budgeted journal history for AI prompts."""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+TOKEN_BUDGET = _env_int("JOURNAL_CONTEXT_TOKENS", 1500, minimum=50)
+RECENT_ENTRIES = _env_int("JOURNAL_CONTEXT_RECENT", 5, minimum=0)
+RECENT_SHARE = 0.6
+NOTES_CHARS = 400
+CACHE_SIZE = _env_int("JOURNAL_CONTEXT_CACHE_SIZE", 128)
+METRIC_KEYS = (
+    "plantHeight", "temp", "humidity", "ec", "ph", "ppfd", "co2",
+    "rootTemp", "leafTemp", "vpd", "vwc", "soilEc",
+)
+
+_cache: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return math.ceil(len(text) / 4)
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _format_number(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _metrics(entry: Dict[str, Any]) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    for key, value in (entry.get("metrics") or {}).items():
+        if key in METRIC_KEYS and isinstance(value, (int, float)) and math.isfinite(value):
+            values[key] = float(value)
+    return values
+
+
+def _entry_line(entry: Dict[str, Any]) -> str:
+    parts = [str(entry.get("date") or "?")[:10], str(entry.get("phase") or ""), str(entry.get("entryType") or "")]
+    metrics = _metrics(entry)
+    if metrics:
+        parts.append(" ".join(f"{key}={_format_number(value)}" for key, value in metrics.items()))
+    feeding = entry.get("feedingDetails") or {}
+    if feeding:
+        parts.append(
+            "feed " + " ".join(f"{key}={feeding[key]}" for key in ("A", "X", "BZ", "EC", "pH") if feeding.get(key) is not None)
+        )
+    notes = " ".join(str(entry.get("notes") or "").split())
+    if len(notes) > NOTES_CHARS:
+        notes = notes[:NOTES_CHARS].rstrip() + "…"
+    if notes:
+        parts.append(f'"{notes}"')
+    return "- " + " | ".join(part for part in parts if part)
+
+
+def _week_lines(entries: Sequence[Dict[str, Any]]) -> List[str]:
+    """One aggregate line per ISO week, newest week first."""
+    weeks: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        day = _parse_date(entry.get("date"))
+        label = f"{day.isocalendar()[0]}-W{day.isocalendar()[1]:02d}" if day else "undated"
+        week = weeks.setdefault(label, {"count": 0, "phases": [], "types": {}, "metrics": {}})
+        week["count"] += 1
+        phase = entry.get("phase")
+        if phase and phase not in week["phases"]:
+            week["phases"].append(phase)
+        kind = entry.get("entryType") or "Entry"
+        week["types"][kind] = week["types"].get(kind, 0) + 1
+        for key, value in _metrics(entry).items():
+            week["metrics"].setdefault(key, []).append(value)
+
+    lines = []
+    for label in sorted(weeks, reverse=True):
+        week = weeks[label]
+        types = ", ".join(f"{kind}×{count}" for kind, count in sorted(week["types"].items()))
+        stats = " ".join(
+            f"{key}={_format_number(min(values))}/{_format_number(sum(values) / len(values))}/{_format_number(max(values))}"
+            for key, values in week["metrics"].items()
+        )
+        phases = "/".join(week["phases"])
+        lines.append(f"- {label}: {week['count']} entries ({types}); {phases}" + (f"; min/avg/max {stats}" if stats else ""))
+    return lines
+
+
+def build_journal_context(entries: Sequence[Dict[str, Any]], budget: int = TOKEN_BUDGET) -> str:
+    """Compact history under ``budget`` tokens: newest entries verbatim, older ones as weekly aggregates."""
+    ordered = sorted(
+        (entry for entry in entries if isinstance(entry, dict)),
+        key=lambda entry: str(entry.get("date") or ""),
+        reverse=True,
+    )
+    if not ordered:
+        return ""
+    lines: List[str] = []
+    used = 0
+    recent_budget = int(budget * RECENT_SHARE)
+    verbatim = 0
+    for entry in ordered[:RECENT_ENTRIES]:
+        line = _entry_line(entry)
+        cost = estimate_tokens(line) + 1
+        if used + cost > recent_budget:
+            break
+        lines.append(line)
+        used += cost
+        verbatim += 1
+
+    older = ordered[verbatim:]
+    if older:
+        header = "Earlier weeks:"
+        used += estimate_tokens(header) + 1
+        summary: List[str] = []
+        week_lines = _week_lines(older)
+        for line in week_lines:
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            summary.append(line)
+            used += cost
+        omitted = len(week_lines) - len(summary)
+        if summary:
+            lines.append(header)
+            lines.extend(summary)
+        if omitted:
+            lines.append(f"({omitted} older weeks omitted)")
+    return "\n".join(lines)
+
+
+def journal_context(
+    entries: Optional[Sequence[Dict[str, Any]]],
+    grow_id: Optional[str] = None,
+    budget: int = TOKEN_BUDGET,
+) -> str:
+    """Cached :func:`build_journal_context` keyed by (grow, last entry id, budget)."""
+    if not entries:
+        return ""
+    last = max(entries, key=lambda entry: str(entry.get("date") or "") if isinstance(entry, dict) else "")
+    last_id = last.get("id") if isinstance(last, dict) else None
+    if grow_id and last_id:
+        key: Tuple[Any, ...] = (grow_id, last_id, len(entries), budget)
+    else:
+        # Without stable ids, fall back to the content itself.
+        digest = hashlib.sha256(repr(entries).encode("utf-8")).hexdigest()
+        key = ("", digest, len(entries), budget)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+    context = build_journal_context(entries, budget)
+    with _cache_lock:
+        _cache[key] = context
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return context
+
+
+def reset_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
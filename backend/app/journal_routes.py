@@ -1,15 +1,20 @@
 """Journal endpoints mirroring PhotonFlux functionality."""
 from __future__ import annotations
 
+import logging
 import uuid
 from typing import Any, Dict, List, Optional, Literal
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field, field_validator
 
+from .image_pipeline import preprocess_data_uris
 from .sanitization import InputSanitizer
 from .storage import get_collection_key, set_collection_key
 from .enums import JournalEntryType, EntryPriority, validate_enum_value
+from .telemetry import rebuild_grow_aggregates, record_journal_entry
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/journal", tags=["journal"])
 
@@ -178,11 +183,28 @@ def _save_entries(grow_id: str, entries: List[Dict[str, Any]]) -> None:
     set_collection_key(JOURNAL_COLLECTION, f"journal_{validated_id}", entries)
 
 
+def _refresh_aggregates(
+    grow_id: str,
+    *,
+    entry: Optional[Dict[str, Any]] = None,
+    entries: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """Keep telemetry rollups in step with the journal; never fail the write."""
+    validated_id = _validate_grow_id(grow_id)
+    try:
+        if entry is not None:
+            record_journal_entry(validated_id, entry)
+        else:
+            rebuild_grow_aggregates(validated_id, entries)
+    except Exception:
+        logger.exception("Failed to update metric rollups for grow %s", validated_id)
+
+
 def _normalize_entry(payload: JournalEntryPayload) -> Dict[str, Any]:
     """Normalize and validate journal entry."""
     data = payload.model_dump()
     data["id"] = payload.id or str(uuid.uuid4())
-    data["images"] = payload.images or []
+    data["images"] = preprocess_data_uris(payload.images or [])
     data["tags"] = payload.tags or []
     data["metrics"] = payload.metrics.model_dump()
     if payload.feedingDetails:
@@ -216,6 +238,7 @@ def save_journal(grow_id: str, payload: JournalBulkPayload):
         
         normalized = [_normalize_entry(entry) for entry in payload.entries]
         _save_entries(grow_id, normalized)
+        _refresh_aggregates(grow_id, entries=normalized)
         return {"count": len(normalized)}
     except HTTPException:
         raise
@@ -231,6 +254,7 @@ def add_entry(grow_id: str, payload: JournalEntryPayload):
         normalized = _normalize_entry(payload)
         entries.insert(0, normalized)
         _save_entries(grow_id, entries)
+        _refresh_aggregates(grow_id, entry=normalized)
         return JournalEntryResponse(entry=JournalEntryPayload(**normalized))
     except HTTPException:
         raise
@@ -253,6 +277,7 @@ def delete_entry(grow_id: str, entry_id: str):
             raise HTTPException(status_code=404, detail="Entry not found")
         
         _save_entries(grow_id, filtered)
+        _refresh_aggregates(grow_id, entries=filtered)
         return {"deleted": True}
     except HTTPException:
         raise
@@ -32,7 +32,7 @@ from .websocket_routes import router as websocket_router
 from .timeseries_routes import router as timeseries_router
 from .operations_routes import router as operations_router
 from .telemetry import telemetry_worker, shutdown_worker
-from .utils import load_mapping
+from .utils import add_mapping_listener, get_mapping, load_mapping, thaw
 from .sanitization import InputSanitizer
 
 warnings.filterwarnings(
@@ -308,7 +308,46 @@ def _set_mapping_override(payload: MappingOverridePayload) -> Dict[str, Any]:
     return overrides
 
 
-MAPPING = _apply_mapping_overrides(BASE_MAPPING, _load_mapping_overrides())
+def _build_role_index(mapping: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    index: Dict[str, Dict[str, Any]] = {}
+    for category in mapping.values():
+        if not isinstance(category, dict):
+            continue
+        for section in ("inputs", "targets"):
+            items = category.get(section)
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                role = item.get("role")
+                if role is not None:
+                    index.setdefault(role, item)
+    return index
+
+
+def _refresh_mapping(overrides: Dict[str, Any]) -> None:
+    global MAPPING, _ROLE_INDEX
+    mapping = _apply_mapping_overrides(BASE_MAPPING, overrides)
+    _ROLE_INDEX = _build_role_index(mapping)
+    MAPPING = mapping
+
+
+def _on_mapping_reload(mapping: Any) -> None:
+    global BASE_MAPPING
+    BASE_MAPPING = thaw(mapping)
+    _refresh_mapping(_load_mapping_overrides())
+    logger.info("mapping.json changed on disk; rebuilt mapping and role index")
+
+
+def _mapping() -> Dict[str, Any]:
+    """Current merged mapping; touching the shared cache picks up file edits."""
+    get_mapping()
+    return MAPPING
+
+
+MAPPING: Dict[str, Any] = {}
+_ROLE_INDEX: Dict[str, Dict[str, Any]] = {}
+_refresh_mapping(_load_mapping_overrides())
+add_mapping_listener(_on_mapping_reload)
 
 _UNAVAILABLE_STATES = frozenset({"unavailable", "unknown", "none", ""})
 
@@ -416,17 +455,8 @@ def _safe_float(value: Optional[str]) -> Optional[float]:
 
 
 def _find_role_meta(role: str) -> Optional[Dict[str, Any]]:
-    for category in MAPPING.values():
-        if not isinstance(category, dict):
-            continue
-        for section in ("inputs", "targets"):
-            items = category.get(section)
-            if not isinstance(items, list):
-                continue
-            for item in items:
-                if item.get("role") == role:
-                    return item
-    return None
+    _mapping()
+    return _ROLE_INDEX.get(role)
 
 
 def _resolve_role_value(state_map: Dict[str, Dict[str, Any]], role: str) -> Optional[float]:
@@ -474,7 +504,8 @@ def _coerce_bool(value: Any) -> bool:
 
 
 def _build_lighting_engine(state_map: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
-    lighting_def = MAPPING.get("lighting_spectrum", {})
+    mapping = _mapping()
+    lighting_def = mapping.get("lighting_spectrum", {})
     current = {}
     for target in lighting_def.get("targets", []):
         role = target.get("role")
@@ -486,7 +517,7 @@ def _build_lighting_engine(state_map: Dict[str, Dict[str, Any]]) -> Dict[str, An
     autopilot_state = state_map.get(autopilot_eid, {}).get("state", "off") if autopilot_eid else "off"
 
     target_spectrum = {}
-    target_def = MAPPING.get("lighting_targets", {})
+    target_def = mapping.get("lighting_targets", {})
     for target in target_def.get("targets", []):
         role = target.get("role")
         eid = target.get("entity_id")
@@ -501,8 +532,9 @@ def _build_lighting_engine(state_map: Dict[str, Dict[str, Any]]) -> Dict[str, An
 
 
 def _check_sensor_health(state_map: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    mapping = _mapping()
     issues: List[str] = []
-    for category, definition in MAPPING.items():
+    for category, definition in mapping.items():
         for section_name in ("inputs", "targets"):
             section_data = definition.get(section_name)
             if not isinstance(section_data, list): continue
@@ -520,7 +552,7 @@ def _check_sensor_health(state_map: Dict[str, Dict[str, Any]]) -> Dict[str, Any]
                     issues.append(f"{entity_id}: {state_val}")
 
     alarm_entities: List[str] = []
-    system_alerts = MAPPING.get("system_alerts", {})
+    system_alerts = mapping.get("system_alerts", {})
     if isinstance(system_alerts, dict):
         for target in system_alerts.get("targets", []):
             eid = target.get("entity_id")
@@ -886,7 +918,7 @@ async def health_check():
 async def get_configuration(request: Request) -> Response:
     state_map = await _get_states_map()
     response: Dict[str, Any] = {}
-    for category, definition in MAPPING.items():
+    for category, definition in _mapping().items():
         if not isinstance(definition, dict): continue
         category_payload: Dict[str, Any] = {
             "label": definition.get("label", category.title()),
@@ -1023,11 +1055,10 @@ async def update_configuration(payload: UpdatePayload):
 
 @app.post("/api/config/mapping")
 async def update_mapping(payload: MappingOverridePayload) -> Dict[str, Any]:
-    global MAPPING
     if payload.entity_id:
         await _validate_entity_exists(payload.entity_id)
     overrides = _set_mapping_override(payload)
-    MAPPING = _apply_mapping_overrides(BASE_MAPPING, overrides)
+    _refresh_mapping(overrides)
     return {"status": "ok"}
 
 
@@ -1038,10 +1069,9 @@ async def read_mapping_overrides() -> Dict[str, Any]:
 
 @app.post("/api/config/mapping/import")
 async def import_mapping(payload: MappingImportPayload) -> Dict[str, Any]:
-    global MAPPING
     overrides = payload.overrides if isinstance(payload.overrides, dict) else {}
     db.set_setting(MAPPING_OVERRIDES_KEY, overrides)
-    MAPPING = _apply_mapping_overrides(BASE_MAPPING, overrides)
+    _refresh_mapping(overrides)
     return {"status": "ok"}
 
 
@@ -1056,7 +1086,7 @@ async def read_system_info() -> Dict[str, Any]:
 
 
 def _find_input(category: str, role: str) -> Dict[str, Any]:
-    category_def = MAPPING.get(category)
+    category_def = _mapping().get(category)
     if not category_def:
         raise HTTPException(status_code=404, detail=f"Unknown category '{category}'")
     for item in category_def.get("inputs", []):
@@ -1,17 +1,68 @@
 """Nutrient calculator and inventory endpoints."""
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Literal, Mapping, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, ConfigDict, Field
 
-from nutrient_engine import NutrientCalculator
-from .plan_routes import CultivarLiteral, SubstrateLiteral, get_active_plan_for, get_active_plan_id_for, get_plan_by_id_for
+from nutrient_engine import NutrientCalculator, solve_doses
+from .database import InsufficientStockError, db
+from .plan_routes import (
+    CultivarLiteral,
+    NutrientProfilePayload,
+    SubstrateLiteral,
+    resolve_plan_for,
+)
+from .utils import thaw
 
 router = APIRouter(prefix="/api/nutrients", tags=["nutrients"])
 
-_ENGINE_CACHE: Dict[str, NutrientCalculator] = {}
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+ENGINE_CACHE_SIZE = _env_int("NUTRIENT_ENGINE_CACHE_SIZE", 32)
+BATCH_MAX_ITEMS = _env_int("NUTRIENT_BATCH_MAX_ITEMS", 200)
+_ENGINE_CACHE: "OrderedDict[str, NutrientCalculator]" = OrderedDict()
+_ENGINE_CACHE_LOCK = threading.Lock()
+
+
+def _engine_cache_key(
+    substrate: Optional[str],
+    entries: Optional[List[Dict[str, Any]]],
+    plan_adjustments: Optional[Dict[str, Any]],
+    water_profile: Optional[Dict[str, Any]],
+    osmosis_share: Optional[float],
+) -> str:
+    """Content hash of everything that shapes an engine, so equal plans share one."""
+    raw = json.dumps(
+        {
+            "substrate": substrate,
+            "entries": entries,
+            "adjustments": plan_adjustments,
+            "water": water_profile,
+            "osmosis": osmosis_share,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
 def _get_engine(
@@ -21,31 +72,60 @@ def _get_engine(
     plan_adjustments: Optional[Dict[str, Dict[str, float]]] = None,
     water_profile: Optional[Dict[str, float]] = None,
     osmosis_share: Optional[float] = None,
-    cache_key: Optional[str] = None,
 ) -> NutrientCalculator:
-    cache_key = cache_key or substrate or "__default__"
     entries = None
     if plan_entries and isinstance(plan_entries.get("plan"), list):
         entries = plan_entries.get("plan")
+    else:
+        # Without a plan payload the engine falls back to the substrate template
+        plan_adjustments = water_profile = osmosis_share = None
 
-    if entries is not None:
-        engine = NutrientCalculator(
-            substrate=substrate,
-            plan_entries=entries,
-            plan_adjustments=plan_adjustments,
-            water_profile=water_profile,
-            osmosis_share=osmosis_share,
-        )
-        _ENGINE_CACHE[cache_key] = engine
-        return engine
-
-    engine = _ENGINE_CACHE.get(cache_key)
-    if engine is None:
-        engine = NutrientCalculator(substrate=substrate)
-        _ENGINE_CACHE[cache_key] = engine
+    key = _engine_cache_key(substrate, entries, plan_adjustments, water_profile, osmosis_share)
+    with _ENGINE_CACHE_LOCK:
+        engine = _ENGINE_CACHE.get(key)
+        if engine is not None:
+            _ENGINE_CACHE.move_to_end(key)
+            return engine
+
+    engine = NutrientCalculator(
+        substrate=substrate,
+        plan_entries=entries,
+        plan_adjustments=plan_adjustments,
+        water_profile=water_profile,
+        osmosis_share=osmosis_share,
+    )
+    with _ENGINE_CACHE_LOCK:
+        engine = _ENGINE_CACHE.setdefault(key, engine)
+        _ENGINE_CACHE.move_to_end(key)
+        while len(_ENGINE_CACHE) > ENGINE_CACHE_SIZE:
+            _ENGINE_CACHE.popitem(last=False)
     return engine
 
 
+def _resolve_plan_payload(
+    cultivar: Optional[str], substrate: Optional[str], plan_id: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    if not (cultivar and substrate):
+        return None
+    return resolve_plan_for(cultivar, substrate, plan_id)[1]
+
+
+def _engine_for_plan(substrate: Optional[str], plan_payload: Optional[Mapping[str, Any]]) -> NutrientCalculator:
+    if isinstance(plan_payload, Mapping):
+        # Default plans are shared read-only structures; hash and build from a plain copy
+        plan_payload = thaw(plan_payload)
+    plan_adjustments = plan_payload.get("observationAdjustments") if isinstance(plan_payload, dict) else None
+    water_profile = plan_payload.get("waterProfile") if isinstance(plan_payload, dict) else None
+    osmosis_share = plan_payload.get("osmosisShare") if isinstance(plan_payload, dict) else None
+    return _get_engine(
+        substrate,
+        plan_entries=plan_payload,
+        plan_adjustments=plan_adjustments,
+        water_profile=water_profile,
+        osmosis_share=osmosis_share,
+    )
+
+
 class MixRequest(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
@@ -57,6 +137,46 @@ class MixRequest(BaseModel):
     observations: Optional[Dict[str, str]] = None
 
 
+class BatchMixItem(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    week_key: str = Field(..., alias="current_week")
+    liters: float = Field(..., alias="reservoir_liters", gt=0)
+    observations: Optional[Dict[str, str]] = None
+
+
+class BatchMixRequest(BaseModel):
+    cultivar: Optional[CultivarLiteral] = None
+    substrate: Optional[SubstrateLiteral] = None
+    plan_id: Optional[str] = None
+    items: List[BatchMixItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class BatchTankItem(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    label: Optional[str] = Field(None, max_length=64)
+    week_key: str = Field(..., alias="current_week")
+    liters: float = Field(..., alias="reservoir_liters", gt=0)
+    cultivar: Optional[CultivarLiteral] = None
+    substrate: Optional[SubstrateLiteral] = None
+    plan_id: Optional[str] = None
+    observations: Optional[Dict[str, str]] = None
+
+
+class BatchConfirmRequest(BaseModel):
+    tanks: List[BatchTankItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class DoseSolveRequest(BaseModel):
+    target: NutrientProfilePayload
+    waterProfile: Optional[NutrientProfilePayload] = None
+    osmosisShare: Optional[float] = Field(None, ge=0, le=1)
+    stage: Literal["veg", "flower", "ripen"] = "veg"
+    weights: Optional[Dict[str, float]] = None
+    maxDose: float = Field(5.0, gt=0, le=50)
+
+
 class InventoryConsumePayload(BaseModel):
     consumption: Dict[str, float]
     substrate: Optional[SubstrateLiteral] = None
@@ -75,26 +195,8 @@ def read_plan(
     substrate: Optional[SubstrateLiteral] = None,
     plan_id: Optional[str] = Query(None),
 ) -> Dict[str, Any]:
-    plan_payload = None
-    cache_key = substrate or "__default__"
-    if cultivar and substrate:
-        if plan_id:
-            plan_payload = get_plan_by_id_for(cultivar, substrate, plan_id)
-        else:
-            plan_payload = get_active_plan_for(cultivar, substrate)
-            plan_id = get_active_plan_id_for(cultivar, substrate)
-        cache_key = f"{cultivar}:{substrate}:{plan_id or 'default'}"
-    plan_adjustments = plan_payload.get("observationAdjustments") if isinstance(plan_payload, dict) else None
-    water_profile = plan_payload.get("waterProfile") if isinstance(plan_payload, dict) else None
-    osmosis_share = plan_payload.get("osmosisShare") if isinstance(plan_payload, dict) else None
-    engine = _get_engine(
-        substrate,
-        plan_entries=plan_payload,
-        plan_adjustments=plan_adjustments,
-        water_profile=water_profile,
-        osmosis_share=osmosis_share,
-        cache_key=cache_key,
-    )
+    plan_payload = _resolve_plan_payload(cultivar, substrate, plan_id)
+    engine = _engine_for_plan(substrate, plan_payload)
     try:
         result = engine.preview_plan(current_week, reservoir_liters)
         return result
@@ -106,29 +208,26 @@ def read_plan(
         raise HTTPException(status_code=500, detail=f"Nutrient plan error: {str(exc)}") from exc
 
 
+@router.get("/plan/curve")
+def read_plan_curve(
+    cultivar: Optional[CultivarLiteral] = None,
+    substrate: Optional[SubstrateLiteral] = None,
+    plan_id: Optional[str] = Query(None),
+) -> Dict[str, Any]:
+    plan_payload = _resolve_plan_payload(cultivar, substrate, plan_id)
+    engine = _engine_for_plan(substrate, plan_payload)
+    try:
+        return {"curve": engine.ppm_curve()}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(exc)}") from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Nutrient plan error: {str(exc)}") from exc
+
+
 @router.post("/plan")
 def preview_plan(payload: MixRequest) -> Dict[str, Any]:
-    plan_payload = None
-    cache_key = payload.substrate or "__default__"
-    if payload.cultivar and payload.substrate:
-        if payload.plan_id:
-            plan_payload = get_plan_by_id_for(payload.cultivar, payload.substrate, payload.plan_id)
-            cache_key = f"{payload.cultivar}:{payload.substrate}:{payload.plan_id}"
-        else:
-            plan_payload = get_active_plan_for(payload.cultivar, payload.substrate)
-            plan_id = get_active_plan_id_for(payload.cultivar, payload.substrate)
-            cache_key = f"{payload.cultivar}:{payload.substrate}:{plan_id}"
-    plan_adjustments = plan_payload.get("observationAdjustments") if isinstance(plan_payload, dict) else None
-    water_profile = plan_payload.get("waterProfile") if isinstance(plan_payload, dict) else None
-    osmosis_share = plan_payload.get("osmosisShare") if isinstance(plan_payload, dict) else None
-    engine = _get_engine(
-        payload.substrate,
-        plan_entries=plan_payload,
-        plan_adjustments=plan_adjustments,
-        water_profile=water_profile,
-        osmosis_share=osmosis_share,
-        cache_key=cache_key,
-    )
+    plan_payload = _resolve_plan_payload(payload.cultivar, payload.substrate, payload.plan_id)
+    engine = _engine_for_plan(payload.substrate, plan_payload)
     try:
         result = engine.preview_plan(payload.week_key, payload.liters, payload.observations)
         return result
@@ -140,29 +239,77 @@ def preview_plan(payload: MixRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"Nutrient plan error: {str(exc)}") from exc
 
 
+@router.post("/plan/batch")
+def preview_plan_batch(payload: BatchMixRequest) -> Dict[str, Any]:
+    plan_payload = _resolve_plan_payload(payload.cultivar, payload.substrate, payload.plan_id)
+    engine = _engine_for_plan(payload.substrate, plan_payload)
+    try:
+        results = engine.preview_batch([(item.week_key, item.liters, item.observations) for item in payload.items])
+        return {"results": results}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(exc)}") from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Nutrient plan error: {str(exc)}") from exc
+
+
+@router.post("/confirm/batch")
+def confirm_mix_batch(payload: BatchConfirmRequest) -> Dict[str, Any]:
+    engines: Dict[tuple, NutrientCalculator] = {}
+    results: List[Dict[str, Any]] = []
+    batches = []
+    initial: Dict[str, float] = {}
+    try:
+        for index, tank in enumerate(payload.tanks):
+            plan_key = (tank.cultivar, tank.substrate, tank.plan_id)
+            engine = engines.get(plan_key)
+            if engine is None:
+                plan_payload = _resolve_plan_payload(tank.cultivar, tank.substrate, tank.plan_id)
+                engine = engines[plan_key] = _engine_for_plan(tank.substrate, plan_payload)
+            result = engine.preview_plan(tank.week_key, tank.liters, tank.observations)
+            consumption = engine.tank_consumption(result)
+            initial.update(engine.inventory_defaults(list(consumption)))
+            batches.append((f"mix:{tank.label or index}:{tank.week_key}", consumption))
+            results.append({**result, "label": tank.label})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(exc)}") from exc
+    except KeyError as exc:
+        raise HTTPException(status_code=400, detail=f"Unknown phase/stage: {str(exc)}") from exc
+
+    try:
+        db.consume_inventory_batch(batches, initial=initial, require_available=True)
+    except InsufficientStockError as exc:
+        raise HTTPException(
+            status_code=409, detail={"message": str(exc), "shortages": exc.shortages}
+        ) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Mix tank error: {str(exc)}") from exc
+
+    engine = _get_engine(None)
+    status = engine.get_stock_status()
+    alerts = engine.check_refill_needed(status)
+    return {"results": results, "inventory": status, "alerts": alerts, "refill_needed": alerts}
+
+
+@router.post("/solve")
+def solve_plan_doses(payload: DoseSolveRequest) -> Dict[str, Any]:
+    target = payload.target.model_dump()
+    if all(value is None for value in target.values()):
+        raise HTTPException(status_code=400, detail="Target profile must set at least one element")
+    water = payload.waterProfile.model_dump(exclude_none=True) if payload.waterProfile else None
+    return solve_doses(
+        target,
+        stage=payload.stage,
+        water_profile=water,
+        osmosis_share=payload.osmosisShare or 0.0,
+        weights=payload.weights,
+        max_dose=payload.maxDose,
+    )
+
+
 @router.post("/confirm")
 def confirm_mix(payload: MixRequest) -> Dict[str, Any]:
-    plan_payload = None
-    cache_key = payload.substrate or "__default__"
-    if payload.cultivar and payload.substrate:
-        if payload.plan_id:
-            plan_payload = get_plan_by_id_for(payload.cultivar, payload.substrate, payload.plan_id)
-            cache_key = f"{payload.cultivar}:{payload.substrate}:{payload.plan_id}"
-        else:
-            plan_payload = get_active_plan_for(payload.cultivar, payload.substrate)
-            plan_id = get_active_plan_id_for(payload.cultivar, payload.substrate)
-            cache_key = f"{payload.cultivar}:{payload.substrate}:{plan_id}"
-    plan_adjustments = plan_payload.get("observationAdjustments") if isinstance(plan_payload, dict) else None
-    water_profile = plan_payload.get("waterProfile") if isinstance(plan_payload, dict) else None
-    osmosis_share = plan_payload.get("osmosisShare") if isinstance(plan_payload, dict) else None
-    engine = _get_engine(
-        payload.substrate,
-        plan_entries=plan_payload,
-        plan_adjustments=plan_adjustments,
-        water_profile=water_profile,
-        osmosis_share=osmosis_share,
-        cache_key=cache_key,
-    )
+    plan_payload = _resolve_plan_payload(payload.cultivar, payload.substrate, payload.plan_id)
+    engine = _engine_for_plan(payload.substrate, plan_payload)
     try:
         result = engine.mix_tank(payload.week_key, payload.liters, payload.observations)
         return result
@@ -189,11 +336,45 @@ def read_inventory() -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"Inventory error: {str(exc)}") from exc
 
 
+@router.get("/inventory/forecast")
+def read_inventory_forecast(
+    reservoir_liters: float = Query(..., gt=0),
+    mix_interval_days: float = Query(7.0, gt=0, le=60),
+    cultivar: Optional[CultivarLiteral] = None,
+    substrate: Optional[SubstrateLiteral] = None,
+    plan_id: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None, max_length=40),
+) -> Dict[str, Any]:
+    plan_payload = _resolve_plan_payload(cultivar, substrate, plan_id)
+    raw_start = start_date or (plan_payload.get("startDate") if isinstance(plan_payload, dict) else None)
+    start: Optional[date] = None
+    if raw_start:
+        try:
+            start = date.fromisoformat(str(raw_start)[:10])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid start date: {raw_start}") from exc
+    engine = _engine_for_plan(substrate, plan_payload)
+    try:
+        return engine.forecast_depletion(reservoir_liters, mix_interval_days=mix_interval_days, start=start)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(exc)}") from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Forecast error: {str(exc)}") from exc
+
+
+@router.get("/inventory/events")
+def read_inventory_events(
+    component: Optional[str] = Query(None, max_length=64),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Dict[str, Any]:
+    return {"events": db.fetch_inventory_events(component, limit)}
+
+
 @router.post("/inventory/consume")
 def consume_inventory(payload: InventoryConsumePayload) -> Dict[str, Any]:
     engine = _get_engine(payload.substrate)
     try:
-        engine.consume_mix(payload.consumption)
+        engine.consume_mix(payload.consumption, reference="manual")
         status = engine.get_stock_status()
         alerts = engine.check_refill_needed()
         return {
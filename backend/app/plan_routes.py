@@ -2,16 +2,23 @@
 from __future__ import annotations
 
 import math
+import os
+import threading
 import uuid
+from bisect import bisect_right
+from collections import OrderedDict
 from copy import deepcopy
+from datetime import date, timedelta
+from itertools import accumulate
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, Iterator, List, Literal, Mapping, Optional, Sequence
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 
-from .storage import get_collection_key, set_collection_key
-from .utils import load_mapping
+from .database import db
+from .storage import delete_collection_key, get_collection_key, set_collection_key
+from .utils import freeze, mapping_index, thaw
 
 router = APIRouter(prefix="/api/plans", tags=["plans"])
 
@@ -45,10 +52,23 @@ DEFAULT_OBSERVATION_ADJUSTMENTS: Dict[str, Dict[str, float]] = {
     "claw": {"mild": -6.0, "strong": -8.0},
 }
 
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
 PLANS_COLLECTION = "plans"
 CUSTOM_PLANS_KEY = "customPlans"
 ACTIVE_PLAN_KEY = "activePlanIds"
 DEFAULT_OVERRIDE_KEY = "defaultPlanOverrides"
+STORE_VERSION_KEY = "storeVersion"
+TIMELINE_CACHE_SIZE = _env_int("PLAN_TIMELINE_CACHE_SIZE", 256)
 EDITABLE_DEFAULT_CULTIVARS: set[str] = {"wedding_cake", "blue_dream", "amnesia_haze"}
 
 
@@ -105,6 +125,25 @@ class PlanMutationPayload(BaseModel):
     plan: ManagedPlanPayload
 
 
+class TimelineGrowPayload(BaseModel):
+    id: str = Field(..., max_length=128)
+    cultivar: CultivarLiteral
+    substrate: SubstrateLiteral
+    startDate: Optional[str] = Field(None, max_length=40)
+    planId: Optional[str] = Field(None, max_length=128)
+
+
+class TimelineRequest(BaseModel):
+    grows: List[TimelineGrowPayload] = Field(..., max_length=200)
+    date: Optional[str] = Field(None, max_length=40)
+
+
+class PlanRollbackPayload(BaseModel):
+    cultivar: CultivarLiteral
+    substrate: SubstrateLiteral
+    revision: int = Field(..., ge=1)
+
+
 class ActivePlanPayload(BaseModel):
     cultivar: CultivarLiteral
     substrate: SubstrateLiteral
@@ -115,17 +154,52 @@ def _round2(value: float) -> float:
     return float(Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
 
 
-def _clone_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return [deepcopy(entry) for entry in entries]
+def _clone_entries(entries: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    return [thaw(entry) for entry in entries]
+
 
+class _LazyPlanTable(Mapping):
+    """Read-only mapping whose values are built on first access and shared frozen afterwards.
 
-BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
+    Callers that need to mutate a value take a copy with ``thaw``.
+    """
+
+    def __init__(self, keys: Sequence[str], build: Callable[[str], Dict[str, Any]]) -> None:
+        self._keys = tuple(keys)
+        self._build = build
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values.get(key)
+        if value is not None:
+            return value
+        if key not in self._keys:
+            raise KeyError(key)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = freeze(self._build(key))
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def materialized(self) -> int:
+        return len(self._values)
+
+
+_BASE_PLAN_SOURCES: Dict[SubstrateLiteral, Dict[str, Any]] = {
     "coco": {
         "id": "default",
         "name": "Default Plan",
         "description": "PhotonFlux baseline schedule for coco.",
         "substrateInfo": "Coco",
-        "plan": _clone_entries([
+        "plan": [
             {"phase": "Early Veg", "A": 0.8, "X": 0.8, "BZ": 0.00, "pH": "5.7–5.9", "EC": "1.7", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "durationDays": 4},
             {"phase": "Mid Veg", "A": 1.0, "X": 1.0, "BZ": 0.00, "pH": "5.7–5.9", "EC": "1.9", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "Silicate": 4, "SilicateUnit": "per_plant", "notes": ["silicate_mid_veg_note"], "durationDays": 5},
             {"phase": "Late Veg", "A": 1.2, "X": 1.2, "BZ": 0.00, "pH": "5.7–5.9", "EC": "2.2", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "durationDays": 6},
@@ -139,8 +213,8 @@ BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
             {"phase": "W8", "A": 0.7, "X": 1.1, "BZ": 0.8, "pH": "5.7–5.9", "EC": "2.7", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "W9", "A": 0.5, "X": 0.8, "BZ": 1.00, "pH": "5.7–5.9", "EC": "2.5", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 10},
             {"phase": "W10", "A": 0.00, "X": 0.5, "BZ": 1.30, "pH": "5.7–5.9", "EC": "2.2", "Tide": 0.00, "Helix": 0.00, "Ligand": 0.00, "durationDays": 10},
-        ]),
-        "waterProfile": deepcopy(DEFAULT_WATER_PROFILE),
+        ],
+        "waterProfile": DEFAULT_WATER_PROFILE,
         "osmosisShare": DEFAULT_OSMOSIS_SHARES["coco"],
         "isDefault": True,
     },
@@ -149,7 +223,7 @@ BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
         "name": "Default Plan",
         "description": "PhotonFlux baseline schedule for soil.",
         "substrateInfo": "Erde",
-        "plan": _clone_entries([
+        "plan": [
             {"phase": "Early Veg", "A": 0.7, "X": 0.25, "BZ": 0.00, "pH": "5.8–6.2", "EC": "1.7", "Tide": 0.20, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "Mid Veg", "A": 0.9, "X": 0.28, "BZ": 0.00, "pH": "5.8–6.2", "EC": "1.9", "Tide": 0.20, "Helix": 0.02, "Ligand": 0.02, "Silicate": 4, "SilicateUnit": "per_plant", "notes": ["silicate_mid_veg_note"], "durationDays": 7},
             {"phase": "Late Veg", "A": 1.1, "X": 0.31, "BZ": 0.00, "pH": "5.8–6.2", "EC": "2.2", "Tide": 0.20, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
@@ -163,8 +237,8 @@ BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
             {"phase": "W8", "A": 0.80, "X": 0.52, "BZ": 0.09, "pH": "5.8–6.2", "EC": "2.6", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "W9", "A": 0.58, "X": 0.45, "BZ": 0.06, "pH": "5.8–6.2", "EC": "1.6", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "W10", "A": 0.00, "X": 0.36, "BZ": 0.00, "pH": "5.8–6.2", "EC": "1.0", "Tide": 0.00, "Helix": 0.00, "Ligand": 0.00, "durationDays": 7},
-        ]),
-        "waterProfile": deepcopy(DEFAULT_WATER_PROFILE),
+        ],
+        "waterProfile": DEFAULT_WATER_PROFILE,
         "osmosisShare": DEFAULT_OSMOSIS_SHARES["soil"],
         "isDefault": True,
     },
@@ -173,7 +247,7 @@ BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
         "name": "Default Plan",
         "description": "PhotonFlux baseline schedule for rockwool.",
         "substrateInfo": "Steinwolle",
-        "plan": _clone_entries([
+        "plan": [
             {"phase": "Early Veg", "A": 0.7, "X": 0.25, "BZ": 0.00, "pH": "5.6–5.8", "EC": "1.7", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "Mid Veg", "A": 0.9, "X": 0.28, "BZ": 0.00, "pH": "5.6–5.8", "EC": "1.9", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "Silicate": 4, "SilicateUnit": "per_plant", "notes": ["silicate_mid_veg_note"], "durationDays": 7},
             {"phase": "Late Veg", "A": 1.1, "X": 0.31, "BZ": 0.00, "pH": "5.6–5.8", "EC": "2.2", "Tide": 0.30, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
@@ -187,8 +261,8 @@ BASE_PLAN_TEMPLATES: Dict[SubstrateLiteral, Dict[str, Any]] = {
             {"phase": "W8", "A": 0.85, "X": 0.52, "BZ": 0.07, "pH": "5.6–5.8", "EC": "2.6", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "W9", "A": 0.63, "X": 0.45, "BZ": 0.06, "pH": "5.6–5.8", "EC": "1.6", "Tide": 0.00, "Helix": 0.02, "Ligand": 0.02, "durationDays": 7},
             {"phase": "W10", "A": 0.00, "X": 0.45, "BZ": 0.00, "pH": "5.6–5.8", "EC": "1.0", "Tide": 0.00, "Helix": 0.00, "Ligand": 0.00, "durationDays": 7},
-        ]),
-        "waterProfile": deepcopy(DEFAULT_WATER_PROFILE),
+        ],
+        "waterProfile": DEFAULT_WATER_PROFILE,
         "osmosisShare": DEFAULT_OSMOSIS_SHARES["rockwool"],
         "isDefault": True,
     },
@@ -237,17 +311,15 @@ def _clone_plan_template(template: Dict[str, Any], overrides: Optional[Dict[str,
     return result
 
 
-def _create_cultivar_plan(overrides: Optional[Dict[SubstrateLiteral, Dict[str, Any]]] = None) -> Dict[SubstrateLiteral, Dict[str, Any]]:
-    overrides = overrides or {}
-    return {
-        "coco": _clone_plan_template(BASE_PLAN_TEMPLATES["coco"], overrides.get("coco")),
-        "soil": _clone_plan_template(BASE_PLAN_TEMPLATES["soil"], overrides.get("soil")),
-        "rockwool": _clone_plan_template(BASE_PLAN_TEMPLATES["rockwool"], overrides.get("rockwool")),
-    }
+BASE_PLAN_TEMPLATES: Mapping[SubstrateLiteral, Mapping[str, Any]] = _LazyPlanTable(
+    list(_BASE_PLAN_SOURCES), lambda substrate: _BASE_PLAN_SOURCES[substrate]
+)
 
 
-DEFAULT_PLAN: Dict[CultivarLiteral, Dict[SubstrateLiteral, Dict[str, Any]]] = {
-    "wedding_cake": _create_cultivar_plan({
+# Per cultivar/substrate overrides of the base templates; "scale" multiplies the
+# veg/bloom/ripen doses and is only applied when the plan is first requested.
+_DEFAULT_PLAN_SPECS: Dict[CultivarLiteral, Dict[SubstrateLiteral, Dict[str, Any]]] = {
+    "wedding_cake": {
         "coco": {
             "description": "PhotonFlux baseline schedule for Wedding Cake on coco.",
             "cultivarInfo": "Wedding Cake",
@@ -263,35 +335,50 @@ DEFAULT_PLAN: Dict[CultivarLiteral, Dict[SubstrateLiteral, Dict[str, Any]]] = {
             "cultivarInfo": "Wedding Cake",
             "substrateInfo": "Steinwolle",
         },
-    }),
-    "blue_dream": _create_cultivar_plan({
+    },
+    "blue_dream": {
         "coco": {
             "description": "Balanced feed plan tuned for Blue Dream in coco with a slight bloom emphasis.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["coco"], {"veg": 0.95, "bloom": 1.05, "ripen": 1}),
+            "scale": {"veg": 0.95, "bloom": 1.05, "ripen": 1},
         },
         "soil": {
             "description": "Balanced feed plan tuned for Blue Dream in soil with a slight bloom emphasis.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["soil"], {"veg": 0.95, "bloom": 1.05, "ripen": 1}),
+            "scale": {"veg": 0.95, "bloom": 1.05, "ripen": 1},
         },
         "rockwool": {
             "description": "Balanced feed plan tuned for Blue Dream in rockwool with a slight bloom emphasis.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["rockwool"], {"veg": 0.95, "bloom": 1.05, "ripen": 1}),
+            "scale": {"veg": 0.95, "bloom": 1.05, "ripen": 1},
         },
-    }),
-    "amnesia_haze": _create_cultivar_plan({
+    },
+    "amnesia_haze": {
         "coco": {
             "description": "Gentle feed schedule crafted for Amnesia Haze in coco to support long flowering.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["coco"], {"veg": 0.9, "bloom": 0.94, "ripen": 0.85}),
+            "scale": {"veg": 0.9, "bloom": 0.94, "ripen": 0.85},
         },
         "soil": {
             "description": "Gentle feed schedule crafted for Amnesia Haze in soil to support long flowering.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["soil"], {"veg": 0.9, "bloom": 0.94, "ripen": 0.85}),
+            "scale": {"veg": 0.9, "bloom": 0.94, "ripen": 0.85},
         },
         "rockwool": {
             "description": "Gentle feed schedule crafted for Amnesia Haze in rockwool to support long flowering.",
-            "plan": _scale_plan_entries(BASE_PLAN_TEMPLATES["rockwool"], {"veg": 0.9, "bloom": 0.94, "ripen": 0.85}),
+            "scale": {"veg": 0.9, "bloom": 0.94, "ripen": 0.85},
         },
-    }),
+    },
+}
+
+
+def _build_default_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> Dict[str, Any]:
+    template = thaw(BASE_PLAN_TEMPLATES[substrate])
+    overrides = dict(_DEFAULT_PLAN_SPECS[cultivar][substrate])
+    scale = overrides.pop("scale", None)
+    if scale:
+        overrides["plan"] = _scale_plan_entries(template, scale)
+    return _clone_plan_template(template, overrides)
+
+
+DEFAULT_PLAN: Dict[CultivarLiteral, Mapping[SubstrateLiteral, Mapping[str, Any]]] = {
+    cultivar: _LazyPlanTable(list(specs), lambda substrate, cultivar=cultivar: _build_default_plan(cultivar, substrate))
+    for cultivar, specs in _DEFAULT_PLAN_SPECS.items()
 }
 
 
@@ -362,14 +449,14 @@ def _configured_base_water_profile() -> Dict[str, float]:
     return _merge_water_profile(DEFAULT_WATER_PROFILE, raw_profile)
 
 
+_WATER_PROFILE_CONFIG = mapping_index(lambda mapping: thaw(mapping.get("water_profiles") or {}))
+
+
 def _load_water_profile_config() -> Dict[str, Any]:
     try:
-        mapping = load_mapping()
+        return _WATER_PROFILE_CONFIG()
     except Exception:
         return {}
-    if not isinstance(mapping, dict):
-        return {}
-    return mapping.get("water_profiles") or {}
 
 
 def _configured_water_profile_presets(
@@ -418,18 +505,111 @@ def _ensure_list(value: Any) -> List[Dict[str, Any]]:
     return []
 
 
-def _load_store_payload() -> Dict[str, Any]:
+def _split_combo_key(combo_key: str) -> Optional[tuple[str, str]]:
+    cultivar, _, substrate = combo_key.rpartition("_")
+    if not cultivar or not substrate:
+        return None
+    return cultivar, substrate
+
+
+def _migrate_legacy_plans() -> None:
+    """Move plans from the old single-blob collection keys into per-plan rows."""
+    legacy_custom = get_collection_key(PLANS_COLLECTION, CUSTOM_PLANS_KEY)
+    legacy_overrides = get_collection_key(PLANS_COLLECTION, DEFAULT_OVERRIDE_KEY)
+    if legacy_custom is None and legacy_overrides is None:
+        return
+    for combo_key, plans in _ensure_dict(legacy_custom).items():
+        combo = _split_combo_key(combo_key)
+        if combo is None:
+            continue
+        for plan in _ensure_list(plans):
+            if plan.get("id"):
+                db.save_plan(combo[0], combo[1], str(plan["id"]), plan)
+    for combo_key, plan in _ensure_dict(legacy_overrides).items():
+        combo = _split_combo_key(combo_key)
+        if combo is not None and isinstance(plan, dict):
+            db.save_plan(combo[0], combo[1], "default", plan)
+    delete_collection_key(PLANS_COLLECTION, CUSTOM_PLANS_KEY)
+    delete_collection_key(PLANS_COLLECTION, DEFAULT_OVERRIDE_KEY)
+
+
+def _read_store_payload() -> Dict[str, Any]:
+    _migrate_legacy_plans()
+    custom_plans: Dict[str, List[Dict[str, Any]]] = {}
+    overrides: Dict[str, Dict[str, Any]] = {}
+    for row in db.fetch_plans():
+        combo_key = f"{row['cultivar']}_{row['substrate']}"
+        if row["planId"] == "default":
+            overrides[combo_key] = row["payload"]
+        else:
+            custom_plans.setdefault(combo_key, []).append(row["payload"])
     return {
-        CUSTOM_PLANS_KEY: _ensure_dict(get_collection_key(PLANS_COLLECTION, CUSTOM_PLANS_KEY, {})),
+        CUSTOM_PLANS_KEY: custom_plans,
         ACTIVE_PLAN_KEY: _ensure_dict(get_collection_key(PLANS_COLLECTION, ACTIVE_PLAN_KEY, {})),
-        DEFAULT_OVERRIDE_KEY: _ensure_dict(get_collection_key(PLANS_COLLECTION, DEFAULT_OVERRIDE_KEY, {})),
+        DEFAULT_OVERRIDE_KEY: overrides,
     }
 
 
-def _save_store_payload(payload: Dict[str, Any]) -> None:
-    set_collection_key(PLANS_COLLECTION, CUSTOM_PLANS_KEY, payload.get(CUSTOM_PLANS_KEY, {}))
-    set_collection_key(PLANS_COLLECTION, ACTIVE_PLAN_KEY, payload.get(ACTIVE_PLAN_KEY, {}))
-    set_collection_key(PLANS_COLLECTION, DEFAULT_OVERRIDE_KEY, payload.get(DEFAULT_OVERRIDE_KEY, {}))
+class _PlanStore:
+    """Decoded plan store pinned to one version stamp; treat ``payload`` as read-only."""
+
+    def __init__(self, version: str, payload: Dict[str, Any]) -> None:
+        self.version = version
+        self.payload = payload
+        self._custom_plans: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def custom_plans(self, cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> List[Dict[str, Any]]:
+        combo_key = _combo_key(cultivar, substrate)
+        with self._lock:
+            plans = self._custom_plans.get(combo_key)
+            if plans is None:
+                raw_plans = _ensure_list(self.payload[CUSTOM_PLANS_KEY].get(combo_key))
+                plans = [
+                    _normalize_plan(ManagedPlanPayload(**plan), substrate, enforce_id=plan.get("id"))
+                    for plan in raw_plans
+                ]
+                self._custom_plans[combo_key] = plans
+            return plans
+
+    def active_plan_id(self, cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> str:
+        return self.payload[ACTIVE_PLAN_KEY].get(_combo_key(cultivar, substrate), "default")
+
+
+_store_lock = threading.Lock()
+_store_cache: Optional[_PlanStore] = None
+
+
+def _plan_store() -> _PlanStore:
+    """Cached plan store; reloaded only when the persisted version stamp moves."""
+    global _store_cache
+    version = str(get_collection_key(PLANS_COLLECTION, STORE_VERSION_KEY, "0"))
+    with _store_lock:
+        cached = _store_cache
+    if cached is not None and cached.version == version:
+        return cached
+    store = _PlanStore(version, _read_store_payload())
+    with _store_lock:
+        _store_cache = store
+    return store
+
+
+def _bump_store_version() -> None:
+    global _store_cache
+    set_collection_key(PLANS_COLLECTION, STORE_VERSION_KEY, uuid.uuid4().hex)
+    with _store_lock:
+        _store_cache = None
+
+
+def _save_plan_row(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str, plan: Dict[str, Any]) -> int:
+    revision = db.save_plan(cultivar, substrate, plan_id, plan)
+    _bump_store_version()
+    return revision
+
+
+def _save_active_plan_ids(active_ids: Dict[str, Any]) -> None:
+    set_collection_key(PLANS_COLLECTION, ACTIVE_PLAN_KEY, active_ids)
+    _bump_store_version()
 
 
 def _sanitize_notes(notes: Optional[List[str]]) -> Optional[List[str]]:
@@ -458,8 +638,8 @@ def _sanitize_date(value: Optional[str]) -> Optional[str]:
     try:
         parts = cleaned.split("T", 1)[0]
         year, month, day = parts.split("-", 2)
-        normalized = f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
-        return normalized
+        # Going through date() rejects impossible days such as 2026-02-30.
+        return date(int(year), int(month), int(day)).isoformat()
     except (ValueError, TypeError):
         return None
 
@@ -550,12 +730,14 @@ def _normalize_plan(plan_payload: ManagedPlanPayload, substrate: SubstrateLitera
     }
 
 
-def _get_default_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> Dict[str, Any]:
+def _get_default_plan(
+    cultivar: CultivarLiteral, substrate: SubstrateLiteral, store: Optional[_PlanStore] = None
+) -> Dict[str, Any]:
     cultivar_plans = DEFAULT_PLAN.get(cultivar)
     if not cultivar_plans:
         raise HTTPException(status_code=404, detail=f"Unknown cultivar '{cultivar}'")
-    template = deepcopy(cultivar_plans[substrate])
-    overrides = _load_store_payload()[DEFAULT_OVERRIDE_KEY]
+    template = thaw(cultivar_plans[substrate])
+    overrides = (store or _plan_store()).payload[DEFAULT_OVERRIDE_KEY]
     if cultivar in EDITABLE_DEFAULT_CULTIVARS:
         override = overrides.get(_combo_key(cultivar, substrate))
         if override:
@@ -563,68 +745,76 @@ def _get_default_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral) ->
     return template
 
 
-def _list_custom_plans(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> List[Dict[str, Any]]:
-    store = _load_store_payload()
-    combo_key = _combo_key(cultivar, substrate)
-    plans = _ensure_list(store[CUSTOM_PLANS_KEY].get(combo_key))
-    return [_normalize_plan(ManagedPlanPayload(**plan), substrate, enforce_id=plan.get("id")) for plan in plans]
+def _list_custom_plans(
+    cultivar: CultivarLiteral, substrate: SubstrateLiteral, store: Optional[_PlanStore] = None
+) -> List[Dict[str, Any]]:
+    return deepcopy((store or _plan_store()).custom_plans(cultivar, substrate))
 
 
 def _save_custom_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan: Dict[str, Any]) -> Dict[str, Any]:
-    payload = _load_store_payload()
-    combo_key = _combo_key(cultivar, substrate)
-    custom_plans = _ensure_list(payload[CUSTOM_PLANS_KEY].get(combo_key))
-    idx = next((i for i, existing in enumerate(custom_plans) if existing.get("id") == plan["id"]), -1)
-    if idx >= 0:
-        custom_plans[idx] = plan
-    else:
-        custom_plans.append(plan)
-    payload[CUSTOM_PLANS_KEY][combo_key] = custom_plans
-    _save_store_payload(payload)
+    _save_plan_row(cultivar, substrate, plan["id"], plan)
     return plan
 
 
 def _delete_custom_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str) -> bool:
-    payload = _load_store_payload()
-    combo_key = _combo_key(cultivar, substrate)
-    custom_plans = _ensure_list(payload[CUSTOM_PLANS_KEY].get(combo_key))
-    filtered = [plan for plan in custom_plans if plan.get("id") != plan_id]
-    if len(filtered) == len(custom_plans):
+    if not db.delete_plan(cultivar, substrate, plan_id):
         return False
-    payload[CUSTOM_PLANS_KEY][combo_key] = filtered
-    active_ids = payload[ACTIVE_PLAN_KEY]
+    combo_key = _combo_key(cultivar, substrate)
+    active_ids = deepcopy(_plan_store().payload[ACTIVE_PLAN_KEY])
     if active_ids.get(combo_key) == plan_id:
         active_ids[combo_key] = "default"
-    _save_store_payload(payload)
+    _save_active_plan_ids(active_ids)
     return True
 
 
 def _get_active_plan_id(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> str:
-    payload = _load_store_payload()
-    return payload[ACTIVE_PLAN_KEY].get(_combo_key(cultivar, substrate), "default")
+    return _plan_store().active_plan_id(cultivar, substrate)
 
 
 def _set_active_plan_id(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str) -> None:
-    payload = _load_store_payload()
-    payload[ACTIVE_PLAN_KEY][_combo_key(cultivar, substrate)] = plan_id
-    _save_store_payload(payload)
+    active_ids = deepcopy(_plan_store().payload[ACTIVE_PLAN_KEY])
+    active_ids[_combo_key(cultivar, substrate)] = plan_id
+    _save_active_plan_ids(active_ids)
 
 
 def _get_available_plans(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> List[Dict[str, Any]]:
-    default_plan = _get_default_plan(cultivar, substrate)
-    custom_plans = _list_custom_plans(cultivar, substrate)
+    store = _plan_store()
+    default_plan = _get_default_plan(cultivar, substrate, store)
+    custom_plans = _list_custom_plans(cultivar, substrate, store)
     return [default_plan, *custom_plans]
 
 
+def _find_plan(
+    cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str, store: _PlanStore
+) -> Optional[Dict[str, Any]]:
+    if plan_id == "default":
+        return _get_default_plan(cultivar, substrate, store)
+    for plan in store.custom_plans(cultivar, substrate):
+        if plan["id"] == plan_id:
+            return deepcopy(plan)
+    return None
+
+
+def resolve_plan_for(
+    cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: Optional[str] = None
+) -> tuple[str, Dict[str, Any]]:
+    """Resolve (plan id, plan) against a single store snapshot; ``None`` means the active plan."""
+    store = _plan_store()
+    if plan_id:
+        plan = _find_plan(cultivar, substrate, plan_id, store)
+        if plan is None:
+            raise HTTPException(status_code=404, detail=f"Plan '{plan_id}' not found for combo")
+        return plan_id, plan
+    active_id = store.active_plan_id(cultivar, substrate)
+    plan = _find_plan(cultivar, substrate, active_id, store)
+    if plan is None:
+        _set_active_plan_id(cultivar, substrate, "default")
+        return "default", _get_default_plan(cultivar, substrate)
+    return active_id, plan
+
+
 def _get_active_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> Dict[str, Any]:
-    active_id = _get_active_plan_id(cultivar, substrate)
-    if active_id == "default":
-        return _get_default_plan(cultivar, substrate)
-    for plan in _list_custom_plans(cultivar, substrate):
-        if plan["id"] == active_id:
-            return plan
-    _set_active_plan_id(cultivar, substrate, "default")
-    return _get_default_plan(cultivar, substrate)
+    return resolve_plan_for(cultivar, substrate)[1]
 
 
 def get_active_plan_id_for(cultivar: CultivarLiteral, substrate: SubstrateLiteral) -> str:
@@ -639,12 +829,7 @@ def get_active_plan_for(cultivar: CultivarLiteral, substrate: SubstrateLiteral)
 
 def get_plan_by_id_for(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str) -> Dict[str, Any]:
     """Resolve a specific plan by id for other modules (default or custom)."""
-    if plan_id == "default":
-        return _get_default_plan(cultivar, substrate)
-    for plan in _list_custom_plans(cultivar, substrate):
-        if plan.get("id") == plan_id:
-            return plan
-    raise HTTPException(status_code=404, detail=f"Plan '{plan_id}' not found for combo")
+    return resolve_plan_for(cultivar, substrate, plan_id)[1]
 
 
 @router.get("/default")
@@ -664,20 +849,21 @@ def read_available_plans(cultivar: CultivarLiteral = Query(...), substrate: Subs
 
 @router.get("/active")
 def read_active_plan(cultivar: CultivarLiteral = Query(...), substrate: SubstrateLiteral = Query(...)):
-    active_id = _get_active_plan_id(cultivar, substrate)
-    return {"planId": active_id, "plan": _get_active_plan(cultivar, substrate)}
+    active_id, plan = resolve_plan_for(cultivar, substrate)
+    return {"planId": active_id, "plan": plan}
 
 
 @router.post("/active")
 def set_active_plan(payload: ActivePlanPayload):
     """Set the active nutrient plan for a cultivar-substrate combo with validation."""
-    available_ids = {plan["id"] for plan in _get_available_plans(payload.cultivar, payload.substrate)}
+    available_plans = _get_available_plans(payload.cultivar, payload.substrate)
+    available_ids = {plan["id"] for plan in available_plans}
     if payload.planId not in available_ids:
         raise HTTPException(status_code=404, detail=f"Plan '{payload.planId}' not found for combo")
     
     # Get and validate the selected plan
     selected_plan = None
-    for plan in _get_available_plans(payload.cultivar, payload.substrate):
+    for plan in available_plans:
         if plan["id"] == payload.planId:
             selected_plan = plan
             break
@@ -708,9 +894,7 @@ def upsert_plan(payload: PlanMutationPayload):
     if plan_id == "default":
         if payload.cultivar not in EDITABLE_DEFAULT_CULTIVARS:
             raise HTTPException(status_code=400, detail="Default plan is read-only for this cultivar")
-        store_payload = _load_store_payload()
-        store_payload[DEFAULT_OVERRIDE_KEY][_combo_key(payload.cultivar, payload.substrate)] = normalized
-        _save_store_payload(store_payload)
+        _save_plan_row(payload.cultivar, payload.substrate, "default", normalized)
         return normalized
     saved = _save_custom_plan(payload.cultivar, payload.substrate, normalized)
     return saved
@@ -729,14 +913,120 @@ def delete_plan(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id:
     if plan_id == "default":
         if cultivar not in EDITABLE_DEFAULT_CULTIVARS:
             raise HTTPException(status_code=400, detail="Default plan is read-only for this cultivar")
-        payload = _load_store_payload()
-        combo_key = _combo_key(cultivar, substrate)
-        overrides = payload[DEFAULT_OVERRIDE_KEY]
-        if combo_key in overrides:
-            del overrides[combo_key]
-            _save_store_payload(payload)
+        if db.delete_plan(cultivar, substrate, "default"):
+            _bump_store_version()
         return {"deleted": True}
     deleted = _delete_custom_plan(cultivar, substrate, plan_id)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Plan '{plan_id}' not found")
     return {"deleted": True}
+
+
+@router.get("/custom/{plan_id}/revisions")
+def read_plan_revisions(cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: str):
+    return {"planId": plan_id, "revisions": db.fetch_plan_revisions(cultivar, substrate, plan_id)}
+
+
+@router.post("/custom/{plan_id}/rollback")
+def rollback_plan(plan_id: str, payload: PlanRollbackPayload):
+    if plan_id == "default" and payload.cultivar not in EDITABLE_DEFAULT_CULTIVARS:
+        raise HTTPException(status_code=400, detail="Default plan is read-only for this cultivar")
+    restored = db.fetch_plan_at_revision(payload.cultivar, payload.substrate, plan_id, payload.revision)
+    if restored is None:
+        raise HTTPException(status_code=404, detail=f"Revision {payload.revision} of plan '{plan_id}' not found")
+    revision = _save_plan_row(payload.cultivar, payload.substrate, plan_id, restored)
+    return {"planId": plan_id, "revision": revision, "plan": restored}
+
+
+class PlanTimeline:
+    """A plan's phases laid out from a start date as cumulative day offsets."""
+
+    def __init__(self, start: date, entries: Sequence[Mapping[str, Any]]) -> None:
+        self.start = start
+        self.phases = [str(entry.get("phase") or "") for entry in entries]
+        self.ends = list(accumulate(_sanitize_duration(entry.get("durationDays")) for entry in entries))
+
+    def resolve(self, day: date) -> Dict[str, Any]:
+        offset = (day - self.start).days
+        if not self.phases:
+            return {"status": "empty"}
+        if offset < 0:
+            return {
+                "status": "pending",
+                "phase": None,
+                "nextPhase": self.phases[0],
+                "nextTransition": self.start.isoformat(),
+            }
+        index = bisect_right(self.ends, offset)
+        if index >= len(self.ends):
+            return {
+                "status": "finished",
+                "phase": None,
+                "dayOfGrow": offset + 1,
+                "finishedOn": (self.start + timedelta(days=self.ends[-1])).isoformat(),
+            }
+        phase_start = self.ends[index - 1] if index else 0
+        return {
+            "status": "active",
+            "phase": self.phases[index],
+            "phaseIndex": index,
+            "dayOfGrow": offset + 1,
+            "dayInPhase": offset - phase_start + 1,
+            "phaseDays": self.ends[index] - phase_start,
+            "nextPhase": self.phases[index + 1] if index + 1 < len(self.phases) else None,
+            "nextTransition": (self.start + timedelta(days=self.ends[index])).isoformat(),
+        }
+
+
+_timeline_lock = threading.Lock()
+_timeline_cache: "OrderedDict[tuple, PlanTimeline]" = OrderedDict()
+
+
+def _timeline_for(
+    store: _PlanStore, cultivar: CultivarLiteral, substrate: SubstrateLiteral, plan_id: Optional[str], start: Optional[str]
+) -> tuple[str, Optional[PlanTimeline]]:
+    """Compiled timeline for a grow, cached per store version, plan and start date."""
+    plan_id = plan_id or store.active_plan_id(cultivar, substrate)
+    key = (store.version, cultivar, substrate, plan_id, start)
+    with _timeline_lock:
+        timeline = _timeline_cache.get(key)
+        if timeline is not None:
+            _timeline_cache.move_to_end(key)
+            return plan_id, timeline
+
+    plan = _find_plan(cultivar, substrate, plan_id, store)
+    if plan is None:
+        plan_id, plan = "default", _get_default_plan(cultivar, substrate, store)
+    # Stored plans may predate date validation, so their start is re-checked too.
+    start_date = _sanitize_date(start) or _sanitize_date(plan.get("startDate"))
+    if not start_date:
+        return plan_id, None
+    timeline = PlanTimeline(date.fromisoformat(start_date), plan.get("plan") or [])
+    with _timeline_lock:
+        _timeline_cache[key] = timeline
+        while len(_timeline_cache) > TIMELINE_CACHE_SIZE:
+            _timeline_cache.popitem(last=False)
+    return plan_id, timeline
+
+
+@router.post("/timeline")
+def resolve_timelines(payload: TimelineRequest):
+    """Resolve current phase, day in phase and next transition for many grows at once."""
+    day = date.today()
+    if payload.date:
+        parsed = _sanitize_date(payload.date)
+        if not parsed:
+            raise HTTPException(status_code=400, detail=f"Invalid date '{payload.date}'")
+        day = date.fromisoformat(parsed)
+    store = _plan_store()
+    results = []
+    for grow in payload.grows:
+        plan_id, timeline = _timeline_for(store, grow.cultivar, grow.substrate, grow.planId, grow.startDate)
+        entry: Dict[str, Any] = {"growId": grow.id, "planId": plan_id}
+        if timeline is None:
+            entry["status"] = "unscheduled"
+        else:
+            entry["startDate"] = timeline.start.isoformat()
+            entry.update(timeline.resolve(day))
+        results.append(entry)
+    return {"date": day.isoformat(), "grows": results}
@@ -0,0 +1,133 @@
+"""Mergeable fixed-bin histogram sketches for telemetry metrics."""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class BinSpec:
+    """Equal-width bins over [low, high); values outside land in under/overflow bins."""
+
+    low: float
+    high: float
+    bins: int
+
+    @property
+    def width(self) -> float:
+        return (self.high - self.low) / self.bins
+
+    @property
+    def underflow(self) -> int:
+        return -1
+
+    @property
+    def overflow(self) -> int:
+        return self.bins
+
+    def index(self, value: float) -> int:
+        if value < self.low:
+            return self.underflow
+        if value >= self.high:
+            return self.overflow
+        return min(self.bins - 1, int((value - self.low) / self.width))
+
+    def edges(self, idx: int) -> Tuple[float, float]:
+        start = self.low + idx * self.width
+        return start, start + self.width
+
+
+METRIC_BINS: Dict[str, BinSpec] = {
+    "vpd": BinSpec(0.0, 3.0, 60),
+    "ec": BinSpec(0.0, 6.0, 60),
+    "vwc": BinSpec(0.0, 100.0, 100),
+}
+
+
+class Histogram:
+    """Sparse bin counts for one metric; merging is element-wise addition."""
+
+    def __init__(self, spec: BinSpec, counts: Optional[Dict[int, int]] = None) -> None:
+        self.spec = spec
+        self.counts: Dict[int, int] = dict(counts or {})
+
+    @classmethod
+    def from_values(cls, spec: BinSpec, values: Iterable[float]) -> Histogram:
+        histogram = cls(spec)
+        for value in values:
+            histogram.add(value)
+        return histogram
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if not math.isfinite(value):
+            return
+        idx = self.spec.index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + count
+
+    def merge(self, other: Histogram) -> Histogram:
+        if other.spec != self.spec:
+            raise ValueError("Cannot merge histograms with different bin specs")
+        for idx, count in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + count
+        return self
+
+    def _bin_range(self, idx: int, minimum: Optional[float], maximum: Optional[float]) -> Tuple[float, float]:
+        if idx == self.spec.underflow:
+            lo = minimum if minimum is not None else self.spec.low
+            return lo, self.spec.low
+        if idx == self.spec.overflow:
+            hi = maximum if maximum is not None else self.spec.high
+            return self.spec.high, hi
+        lo, hi = self.spec.edges(idx)
+        if minimum is not None:
+            lo = max(lo, min(minimum, hi))
+        if maximum is not None:
+            hi = min(hi, max(maximum, lo))
+        return lo, hi
+
+    def quantile(
+        self, q: float, *, minimum: Optional[float] = None, maximum: Optional[float] = None
+    ) -> Optional[float]:
+        """Estimate the q-quantile by linear interpolation inside the matching bin.
+
+        ``minimum``/``maximum`` (exact, from the rollups) tighten the outer bins.
+        """
+        total = self.total
+        if total <= 0:
+            return None
+        target = max(0.0, min(1.0, q)) * total
+        seen = 0
+        for idx in sorted(self.counts):
+            count = self.counts[idx]
+            if count <= 0:
+                continue
+            if seen + count >= target:
+                lo, hi = self._bin_range(idx, minimum, maximum)
+                fraction = (target - seen) / count
+                return lo + (hi - lo) * fraction
+            seen += count
+        return maximum if maximum is not None else self.spec.high
+
+    def fraction_outside(self, low: float, high: float) -> float:
+        """Share of samples below ``low`` or above ``high``, pro-rated within edge bins."""
+        total = self.total
+        if total <= 0:
+            return 0.0
+        outside = 0.0
+        for idx, count in self.counts.items():
+            if idx == self.spec.underflow:
+                outside += count if low > self.spec.low else 0
+                continue
+            if idx == self.spec.overflow:
+                outside += count if high < self.spec.high else 0
+                continue
+            lo, hi = self.spec.edges(idx)
+            below = max(0.0, min(hi, low) - lo)
+            above = max(0.0, hi - max(lo, high))
+            outside += count * min(1.0, (below + above) / self.spec.width)
+        return outside / total
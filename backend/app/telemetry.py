@@ -3,14 +3,21 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import gzip
+import hashlib
+import json
 import logging
+import math
 import os
+import random
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import httpx
 
-from .storage import get_collection, set_collection
+from .database import db
+from .sketches import METRIC_BINS, Histogram
+from .storage import get_collection, get_collection_key, set_collection
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +39,32 @@ DEFAULT_ENDPOINT = os.getenv("TELEMETRY_API_URL", "https://api.growmind.cloud/te
 DEFAULT_GROW_ID = os.getenv("TELEMETRY_GROW_ID", "default")
 WINDOW_HOURS = _env_int("TELEMETRY_WINDOW_HOURS", 24)
 INTERVAL_HOURS = _env_int("TELEMETRY_INTERVAL_HOURS", 24)
+BATCH_SIZE = _env_int("TELEMETRY_BATCH_SIZE", 50)
+BACKOFF_INITIAL_SECONDS = _env_int("TELEMETRY_BACKOFF_INITIAL", 60)
+BACKOFF_MAX_SECONDS = _env_int("TELEMETRY_BACKOFF_MAX", 6 * 3600)
+DELIVERED_RETENTION_DAYS = _env_int("TELEMETRY_DELIVERED_RETENTION_DAYS", 30)
+SUMMARY_CONCURRENCY = _env_int("TELEMETRY_SUMMARY_CONCURRENCY", 4)
 SENSOR_KEYS = ("vpd", "ec", "vwc")
+QUANTILES = {"p5": 0.05, "p50": 0.5, "p95": 0.95}
+
+
+def _env_band(name: str, default: Tuple[float, float]) -> Tuple[float, float]:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        low, high = (float(part) for part in raw.split(",", 1))
+    except (TypeError, ValueError):
+        return default
+    return (low, high) if low < high else default
+
+
+# Target bands used for the time-out-of-band report, e.g. TELEMETRY_BAND_VPD="0.8,1.5"
+METRIC_BANDS: Dict[str, Tuple[float, float]] = {
+    "vpd": _env_band("TELEMETRY_BAND_VPD", (0.8, 1.5)),
+    "ec": _env_band("TELEMETRY_BAND_EC", (1.2, 3.0)),
+    "vwc": _env_band("TELEMETRY_BAND_VWC", (30.0, 70.0)),
+}
 JOURNAL_COLLECTION = "photonfluxJournal"
 
 
@@ -57,6 +89,7 @@ def _ensure_settings(raw: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     return {
         "enabled": bool(base.get("enabled", False)),
         "lastSent": base.get("lastSent"),
+        "lastSentByGrow": dict(base.get("lastSentByGrow") or {}),
         "endpoint": base.get("endpoint") or DEFAULT_ENDPOINT,
         "windowHours": base.get("windowHours", WINDOW_HOURS),
     }
@@ -84,9 +117,11 @@ def set_enabled(enabled: bool) -> Dict[str, Any]:
     return _save_settings(current)
 
 
-def record_last_sent(timestamp: datetime) -> Dict[str, Any]:
+def record_last_sent(timestamp: datetime, grow_ids: Optional[List[str]] = None) -> Dict[str, Any]:
     current = get_settings()
     current["lastSent"] = timestamp.isoformat()
+    for grow_id in grow_ids or []:
+        current["lastSentByGrow"][grow_id] = timestamp.isoformat()
     return _save_settings(current)
 
 
@@ -94,91 +129,392 @@ def _journal_key(grow_id: str) -> str:
     return f"journal_{grow_id}"
 
 
-def _load_recent_journal_entries(grow_id: str, window: timedelta) -> List[Dict[str, Any]]:
-    store = get_collection(JOURNAL_COLLECTION)
-    entries: List[Dict[str, Any]] = store.get(_journal_key(grow_id), [])
-    if not entries:
-        return []
-    cutoff = _now() - window
-    recent: List[Dict[str, Any]] = []
-    for entry in entries:
-        raw_date = entry.get("date")
-        parsed_date = _parse_iso(raw_date)
-        if not parsed_date or parsed_date < cutoff:
-            continue
-        entry_copy = dict(entry)
-        entry_copy["_parsed_date"] = parsed_date
-        recent.append(entry_copy)
-    return recent
+def _load_journal_entries(grow_id: str) -> List[Dict[str, Any]]:
+    entries = get_collection_key(JOURNAL_COLLECTION, _journal_key(grow_id), [])
+    return entries if isinstance(entries, list) else []
 
 
-def _average(values: List[float]) -> Optional[float]:
-    if not values:
+def _entry_timestamp(entry: Dict[str, Any]) -> Optional[datetime]:
+    parsed = _parse_iso(entry.get("date"))
+    if parsed is None:
         return None
-    return round(sum(values) / len(values), 3)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
 
 
-def collect_daily_summary(grow_id: str = DEFAULT_GROW_ID) -> Optional[Dict[str, Any]]:
-    window = timedelta(hours=WINDOW_HOURS)
-    entries = _load_recent_journal_entries(grow_id, window)
-    if not entries:
-        return None
-    metrics_bucket: Dict[str, List[float]] = {key: [] for key in SENSOR_KEYS}
+def _bucket_key(timestamp: datetime) -> str:
+    return timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:00:00Z")
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    return timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+BucketRow = Tuple[str, str, int, float, float, float]
+BinRow = Tuple[str, str, int, int]
+
+
+class _Rollup(NamedTuple):
+    rows: List[BucketRow]
+    bins: List[BinRow]
+    latest_at: Optional[str]
+    latest_phase: Optional[str]
+
+
+def _aggregate_entries(entries: List[Dict[str, Any]]) -> _Rollup:
+    """Fold journal entries into hourly (count, sum, min, max) rows and histogram bins per metric."""
+    buckets: Dict[Tuple[str, str], List[float]] = {}
+    bins: Dict[Tuple[str, str, int], int] = {}
+    latest: Optional[datetime] = None
     latest_phase: Optional[str] = None
-    latest_timestamp: Optional[datetime] = None
     for entry in entries:
-        parsed_date: datetime = entry["_parsed_date"]
-        if not latest_timestamp or parsed_date > latest_timestamp:
-            latest_timestamp = parsed_date
+        if not isinstance(entry, dict):
+            continue
+        timestamp = _entry_timestamp(entry)
+        if timestamp is None:
+            continue
+        if latest is None or timestamp > latest:
+            latest = timestamp
             latest_phase = entry.get("phase")
         metrics = entry.get("metrics") or {}
+        bucket = _bucket_key(timestamp)
         for key in SENSOR_KEYS:
             value = metrics.get(key)
-            if isinstance(value, (int, float)):
-                metrics_bucket[key].append(float(value))
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            value = float(value)
+            if not math.isfinite(value):
+                continue
+            agg = buckets.get((bucket, key))
+            if agg is None:
+                buckets[(bucket, key)] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = min(agg[2], value)
+                agg[3] = max(agg[3], value)
+            bin_key = (bucket, key, METRIC_BINS[key].index(value))
+            bins[bin_key] = bins.get(bin_key, 0) + 1
+    rows = [(bucket, key, int(c), s, lo, hi) for (bucket, key), (c, s, lo, hi) in buckets.items()]
+    bin_rows = [(bucket, key, idx, count) for (bucket, key, idx), count in bins.items()]
+    return _Rollup(rows, bin_rows, _format_timestamp(latest) if latest else None, latest_phase)
+
+
+def record_journal_entry(grow_id: str, entry: Dict[str, Any]) -> None:
+    """Fold a newly added journal entry into the grow's hourly rollups."""
+    if db.get_metric_rollup_state(grow_id) is None:
+        rebuild_grow_aggregates(grow_id)
+        return
+    rollup = _aggregate_entries([entry])
+    db.merge_metric_buckets(grow_id, rollup.rows, rollup.latest_at, rollup.latest_phase, bins=rollup.bins)
+
+
+def rebuild_grow_aggregates(grow_id: str, entries: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Recompute a grow's rollups from its journal (after bulk saves and deletes)."""
+    if entries is None:
+        entries = _load_journal_entries(grow_id)
+    rollup = _aggregate_entries(entries)
+    db.merge_metric_buckets(
+        grow_id, rollup.rows, rollup.latest_at, rollup.latest_phase, bins=rollup.bins, replace=True
+    )
+
+
+def window_sketches(grow_ids: List[str], window: Optional[timedelta] = None) -> Dict[str, Histogram]:
+    """Histograms per metric merged across every hour of the window and all given grows."""
+    cutoff = _now() - (window or timedelta(hours=WINDOW_HOURS))
+    merged = db.fetch_metric_histograms(grow_ids, _bucket_key(cutoff))
+    return {
+        metric: Histogram(METRIC_BINS[metric], counts)
+        for metric, counts in merged.items()
+        if metric in METRIC_BINS
+    }
+
+
+def _band_report(histogram: Histogram, band: Tuple[float, float], hours: List[Tuple[float, float]]) -> Dict[str, Any]:
+    """Share of samples outside ``band`` and the number of hourly buckets (min, max) that left it.
+
+    Samples are irregular journal readings, so their share is not a share of time;
+    time is only reported at hourly resolution.
+    """
+    low, high = band
+    return {
+        "band": list(band),
+        "sampleFraction": round(histogram.fraction_outside(low, high), 3),
+        "excursionHours": sum(1 for minimum, maximum in hours if minimum < low or maximum > high),
+        "hoursWithData": len(hours),
+    }
+
+
+def _average(total: float, count: int) -> Optional[float]:
+    if count <= 0:
+        return None
+    return round(total / count, 3)
+
+
+def collect_daily_summary(grow_id: str = DEFAULT_GROW_ID) -> Optional[Dict[str, Any]]:
+    """Summarize the last window from hourly rollups; O(buckets), not O(journal)."""
+    state = db.get_metric_rollup_state(grow_id)
+    if state is None:
+        # Journals written before rollups existed are backfilled once.
+        rebuild_grow_aggregates(grow_id)
+        state = db.get_metric_rollup_state(grow_id)
+    cutoff = _now() - timedelta(hours=WINDOW_HOURS)
+    buckets = db.fetch_metric_buckets(grow_id, _bucket_key(cutoff))
+    if not buckets:
+        return None
+    totals: Dict[str, List[Any]] = {}
+    extremes: Dict[str, List[Tuple[float, float]]] = {}
+    for bucket in buckets:
+        if bucket["value_min"] is not None and bucket["value_max"] is not None:
+            extremes.setdefault(bucket["metric"], []).append((bucket["value_min"], bucket["value_max"]))
+        agg = totals.setdefault(bucket["metric"], [0, 0.0, None, None])
+        agg[0] += int(bucket["sample_count"])
+        agg[1] += float(bucket["value_sum"])
+        if bucket["value_min"] is not None:
+            agg[2] = bucket["value_min"] if agg[2] is None else min(agg[2], bucket["value_min"])
+        if bucket["value_max"] is not None:
+            agg[3] = bucket["value_max"] if agg[3] is None else max(agg[3], bucket["value_max"])
     averages: Dict[str, float] = {}
-    for key, values in metrics_bucket.items():
-        avg = _average(values)
+    for key in SENSOR_KEYS:
+        count, total, _, _ = totals.get(key, (0, 0.0, None, None))
+        avg = _average(total, int(count))
         if avg is not None:
             averages[key] = avg
     if not averages:
         return None
+    sketches = window_sketches([grow_id])
+    quantiles: Dict[str, Dict[str, float]] = {}
+    out_of_band: Dict[str, Dict[str, Any]] = {}
+    for key, histogram in sketches.items():
+        if key not in averages or histogram.total <= 0:
+            continue
+        _, _, minimum, maximum = totals[key]
+        quantiles[key] = {
+            label: round(histogram.quantile(q, minimum=minimum, maximum=maximum), 3)
+            for label, q in QUANTILES.items()
+        }
+        out_of_band[key] = _band_report(histogram, METRIC_BANDS[key], extremes.get(key, []))
     return {
         "timestamp": _now().isoformat(),
         "growId": grow_id,
-        "phase": latest_phase,
+        "phase": (state or {}).get("latest_phase"),
         "metrics": averages,
-        "sampleCount": max((len(v) for v in metrics_bucket.values() if v), default=0),
+        "quantiles": quantiles,
+        "outOfBand": out_of_band,
+        "sampleCount": max((int(agg[0]) for agg in totals.values() if agg[0]), default=0),
         "windowHours": WINDOW_HOURS,
     }
 
 
-async def send_daily_payload(force: bool = False) -> bool:
+def discover_active_grows() -> List[str]:
+    """Grows with rollup samples inside the summary window.
+
+    Journals that predate rollups are backfilled first, so they are discovered too.
+    """
+    prefix = _journal_key("")
+    known = set(db.list_metric_rollup_grows())
+    for key in db.list_collection_keys(JOURNAL_COLLECTION):
+        grow_id = key[len(prefix):] if key.startswith(prefix) else ""
+        if grow_id and grow_id not in known:
+            rebuild_grow_aggregates(grow_id)
+    cutoff = _now() - timedelta(hours=WINDOW_HOURS)
+    return db.list_metric_rollup_grows(_bucket_key(cutoff))
+
+
+def _grow_last_sent(settings: Dict[str, Any], grow_id: str) -> Optional[datetime]:
+    last_sent = (settings.get("lastSentByGrow") or {}).get(grow_id)
+    if last_sent is None and grow_id == DEFAULT_GROW_ID:
+        # Settings written before per-grow schedules tracked only the default grow.
+        last_sent = settings.get("lastSent")
+    return _parse_iso(last_sent)
+
+
+def _due_grows(settings: Dict[str, Any], grow_ids: List[str], force: bool) -> List[str]:
+    if force:
+        return list(grow_ids)
+    interval = timedelta(hours=INTERVAL_HOURS)
+    now = _now()
+    due = []
+    for grow_id in grow_ids:
+        last_sent = _grow_last_sent(settings, grow_id)
+        if last_sent is None or now - last_sent >= interval:
+            due.append(grow_id)
+    return due
+
+
+async def collect_summaries(grow_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Summarize grows concurrently in worker threads, bounded by SUMMARY_CONCURRENCY."""
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def _one(grow_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(collect_daily_summary, grow_id)
+            except Exception:
+                logger.exception("telemetry: failed to summarize grow %s", grow_id)
+                return None
+
+    results = await asyncio.gather(*(_one(grow_id) for grow_id in grow_ids))
+    return {grow_id: summary for grow_id, summary in zip(grow_ids, results) if summary}
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class QueuedSummary(NamedTuple):
+    id: str
+    queued: bool  # False when an identical summary was already in the outbox
+
+
+class SendResult(NamedTuple):
+    sent: bool
+    queued: int
+    deduplicated: int
+
+
+def _outbox_id(payload: Dict[str, Any], forced: bool = False) -> str:
+    """Stable id per grow and summary hour, so a recomputed summary is not re-queued.
+
+    Forced sends are explicit user requests and get the exact summary time in the
+    id, so they are never swallowed by a scheduled summary from the same hour.
+    """
+    stamp = _parse_iso(payload.get("timestamp")) or _now()
+    raw = f"{payload.get('growId')}|{_bucket_key(stamp)}|{payload.get('windowHours')}"
+    if forced:
+        raw += f"|forced|{_format_timestamp(stamp)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def enqueue_summary(payload: Dict[str, Any], forced: bool = False) -> QueuedSummary:
+    """Persist a summary in the outbox; it survives restarts until delivered."""
+    item_id = _outbox_id(payload, forced)
+    queued = db.enqueue_outbox(item_id, {**payload, "id": item_id}, _format_timestamp(_now()))
+    if not queued:
+        logger.debug("telemetry: summary %s already queued", item_id)
+    return QueuedSummary(item_id, queued)
+
+
+def _backoff_seconds(attempts: int) -> float:
+    base = min(BACKOFF_MAX_SECONDS, BACKOFF_INITIAL_SECONDS * (2 ** max(0, attempts)))
+    return base + random.uniform(0.0, base * 0.1)
+
+
+def _encode_batch(items: List[Dict[str, Any]]) -> bytes:
+    body = json.dumps({"items": [item["payload"] for item in items]}, separators=(",", ":"))
+    return gzip.compress(body.encode("utf-8"))
+
+
+async def flush_outbox(endpoint: str, *, client: Optional[httpx.AsyncClient] = None) -> int:
+    """Deliver due outbox items in gzip batches; returns the number delivered.
+
+    Failed batches are rescheduled with exponential backoff per item. Delivered
+    ids stay recorded for the retention window so receivers can deduplicate via
+    the ``Idempotency-Key`` header and the per-item ``id``.
+    """
+    http = client or _get_http_client()
+    delivered = 0
+    while True:
+        now = _now()
+        items = await asyncio.to_thread(db.fetch_outbox_due, _format_timestamp(now), BATCH_SIZE)
+        if not items:
+            break
+        ids = [item["id"] for item in items]
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Idempotency-Key": hashlib.sha256("|".join(ids).encode("utf-8")).hexdigest(),
+        }
+        try:
+            response = await http.post(endpoint, content=_encode_batch(items), headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            logger.warning("telemetry: batch of %d failed: %s", len(items), exc)
+            await asyncio.to_thread(
+                db.mark_outbox_failed,
+                [
+                    (item["id"], _format_timestamp(now + timedelta(seconds=_backoff_seconds(item["attempts"]))))
+                    for item in items
+                ],
+                str(exc) or exc.__class__.__name__,
+            )
+            break
+        await asyncio.to_thread(db.mark_outbox_delivered, ids, _format_timestamp(now))
+        delivered += len(items)
+        if len(items) < BATCH_SIZE:
+            break
+    if delivered:
+        await asyncio.to_thread(
+            db.prune_outbox, _format_timestamp(_now() - timedelta(days=DELIVERED_RETENTION_DAYS))
+        )
+        logger.info("telemetry: delivered %d queued payload(s) to %s", delivered, endpoint)
+    return delivered
+
+
+def _next_outbox_delay() -> Optional[float]:
+    due = _parse_iso(db.next_outbox_attempt())
+    if due is None:
+        return None
+    return max(0.0, (due - _now()).total_seconds())
+
+
+async def send_daily_payload(force: bool = False, grow_id: Optional[str] = None) -> SendResult:
     settings = get_settings()
     if not settings.get("enabled") and not force:
-        return False
-    last_sent = _parse_iso(settings.get("lastSent"))
-    if not force and last_sent is not None:
-        if _now() - last_sent < timedelta(hours=INTERVAL_HOURS):
-            return False
-    payload = collect_daily_summary()
-    if not payload:
-        logger.info("telemetry: no recent samples available, skipping send")
-        return False
+        return SendResult(False, 0, 0)
     endpoint = settings.get("endpoint") or DEFAULT_ENDPOINT
     if not endpoint:
         logger.warning("telemetry: endpoint missing, skipping send")
-        return False
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(endpoint, json=payload)
-            response.raise_for_status()
-    except httpx.HTTPError as exc:
-        logger.exception("telemetry: failed to send payload: %s", exc)
-        return False
-    record_last_sent(_now())
-    logger.info("telemetry: payload sent to %s", endpoint)
-    return True
+        return SendResult(False, 0, 0)
+    grow_ids = [grow_id] if grow_id else await asyncio.to_thread(discover_active_grows)
+    due = _due_grows(settings, grow_ids, force)
+    queued = deduplicated = 0
+    if due:
+        summaries = await collect_summaries(due)
+        for summary in summaries.values():
+            result = await asyncio.to_thread(enqueue_summary, summary, force)
+            if result.queued:
+                queued += 1
+            else:
+                deduplicated += 1
+        if summaries:
+            await asyncio.to_thread(record_last_sent, _now(), list(summaries))
+        else:
+            logger.info("telemetry: no recent samples available, skipping summary")
+    delivered = await flush_outbox(endpoint)
+    return SendResult(delivered > 0, queued, deduplicated)
+
+
+def _next_summary_delay(settings: Dict[str, Any], grow_ids: List[str]) -> float:
+    """Seconds until the next grow is due; each grow keeps its own schedule."""
+    if not grow_ids:
+        return 600  # Look for newly active grows in 10 minutes
+    interval = INTERVAL_HOURS * 3600
+    now = _now()
+    delays = []
+    for grow_id in grow_ids:
+        last_sent = _grow_last_sent(settings, grow_id)
+        if last_sent is None:
+            delays.append(60)  # Try soon if never sent
+            continue
+        remaining = interval - (now - last_sent).total_seconds()
+        # Should have sent but failed (error or no data): retry in 10 minutes
+        delays.append(remaining if remaining > 0 else 600)
+    return min(delays)
 
 
 async def telemetry_worker(stop_event: Optional[asyncio.Event] = None) -> None:
@@ -194,17 +530,15 @@ async def telemetry_worker(stop_event: Optional[asyncio.Event] = None) -> None:
         if not settings.get("enabled"):
             delay = 3600  # Check once per hour if user opted in
         else:
-            last_sent = _parse_iso(settings.get("lastSent"))
-            if last_sent:
-                elapsed = (_now() - last_sent).total_seconds()
-                remaining = (INTERVAL_HOURS * 3600) - elapsed
-                if remaining > 0:
-                    delay = remaining
-                else:
-                    # Should have sent but failed (error or no data)
-                    delay = 600  # Retry in 10 minutes
-            else:
-                delay = 60  # Try soon if never sent
+            try:
+                grow_ids = await asyncio.to_thread(discover_active_grows)
+                delay = _next_summary_delay(settings, grow_ids)
+                retry_delay = await asyncio.to_thread(_next_outbox_delay)
+                if retry_delay is not None:
+                    delay = min(delay, retry_delay)
+            except Exception as exc:
+                logger.exception("telemetry: failed to schedule next run: %s", exc)
+                delay = 600
 
         # Clamp delay to sane bounds
         delay = max(10, min(delay, INTERVAL_HOURS * 3600))
@@ -221,3 +555,4 @@ async def shutdown_worker(task: Optional[asyncio.Task[Any]]) -> None:
     task.cancel()
     with contextlib.suppress(asyncio.CancelledError):
         await task
+    await close_http_client()
@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 import logging
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from .sanitization import InputSanitizer
 from .telemetry import get_settings, set_enabled, send_daily_payload
 
 logger = logging.getLogger(__name__)
@@ -19,6 +21,7 @@ class TelemetrySettingsPayload(BaseModel):
 
 class TelemetryTriggerPayload(BaseModel):
     force: bool = False
+    growId: Optional[str] = None
 
 
 @router.get("/settings")
@@ -37,7 +40,8 @@ async def trigger_send(payload: TelemetryTriggerPayload | None = None) -> dict:
     """Trigger telemetry data send with comprehensive error handling."""
     force = payload.force if payload else False
     try:
-        sent = await send_daily_payload(force=force)
+        grow_id = InputSanitizer.sanitize_identifier(payload.growId) if payload and payload.growId else None
+        result = await send_daily_payload(force=force, grow_id=grow_id)
     except HTTPException:
         raise
     except ValueError as exc:
@@ -53,4 +57,4 @@ async def trigger_send(payload: TelemetryTriggerPayload | None = None) -> dict:
         # Unexpected errors
         logger.exception("Unexpected error during telemetry send")
         raise HTTPException(status_code=500, detail="Telemetry send failed") from exc
-    return {"sent": sent}
+    return {"sent": result.sent, "queued": result.queued, "deduplicated": result.deduplicated}
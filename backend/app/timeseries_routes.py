@@ -1,10 +1,14 @@
 """Time-series data endpoints backed by InfluxDB."""
 from __future__ import annotations
 
+import asyncio
 import csv
 import io
 import os
-from typing import Any, Dict, List, Optional
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import quote
 
 import httpx
@@ -14,10 +18,109 @@ from pydantic import BaseModel, Field
 router = APIRouter(prefix="/api/timeseries", tags=["timeseries"])
 
 
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+TAIL_CACHE_MAX_ENTRIES = _env_int("TIMESERIES_TAIL_CACHE_SIZE", 32)
+TAIL_REFRESH_SECONDS = _env_int("TIMESERIES_TAIL_REFRESH_SECONDS", 5, minimum=0)
+
+
 class TimeSeriesQuery(BaseModel):
     entity_ids: List[str] = Field(..., min_items=1, max_items=20)
     range_hours: int = Field(168, ge=1, le=720)
     interval_minutes: int = Field(15, ge=1, le=1440)
+    since: Optional[str] = Field(None, max_length=64)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _floor_time(value: datetime, interval_minutes: int) -> datetime:
+    """Align a timestamp to the start of its aggregateWindow bucket."""
+    step = interval_minutes * 60
+    epoch = int(value.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % step, tz=timezone.utc)
+
+
+class _SeriesTail:
+    """Cached aggregated series for one (entities, interval) query shape.
+
+    Points are kept sorted per entity alongside their parsed timestamps so that
+    merging a refresh and slicing a window are bisect lookups, not rescans.
+    """
+
+    def __init__(self, range_hours: int) -> None:
+        self.range_hours = range_hours
+        self.fetched_at: Optional[datetime] = None
+        self._times: Dict[str, List[datetime]] = {}
+        self._points: Dict[str, List[Dict[str, Any]]] = {}
+
+    def merge(self, series: Dict[str, List[Dict[str, Any]]], replace_from: Optional[datetime]) -> None:
+        if replace_from is not None:
+            for entity_id, times in self._times.items():
+                idx = bisect_right(times, replace_from)
+                del times[idx:]
+                del self._points[entity_id][idx:]
+        for entity_id, points in series.items():
+            times = self._times.setdefault(entity_id, [])
+            stored = self._points.setdefault(entity_id, [])
+            for point in points:
+                parsed = _parse_time(point.get("t"))
+                if parsed is None:
+                    continue
+                if times and parsed <= times[-1]:
+                    continue
+                times.append(parsed)
+                stored.append(point)
+
+    def trim(self, oldest: datetime) -> None:
+        for entity_id, times in self._times.items():
+            idx = bisect_left(times, oldest)
+            if idx:
+                del times[:idx]
+                del self._points[entity_id][:idx]
+
+    def slice(
+        self, entity_ids: List[str], start: datetime, *, exclusive: bool = False
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for entity_id in entity_ids:
+            times = self._times.get(entity_id)
+            if not times:
+                continue
+            idx = bisect_right(times, start) if exclusive else bisect_left(times, start)
+            if idx < len(times):
+                result[entity_id] = self._points[entity_id][idx:]
+        return result
+
+
+_TAIL_CACHE: "OrderedDict[Tuple[Tuple[str, ...], int], _SeriesTail]" = OrderedDict()
+_tail_locks: Dict[Tuple[Tuple[str, ...], int], asyncio.Lock] = {}
 
 
 def _influx_settings() -> Optional[Dict[str, str]]:
@@ -35,11 +138,18 @@ def _influx_settings() -> Optional[Dict[str, str]]:
     }
 
 
-def _build_flux(entity_ids: List[str], range_hours: int, interval_minutes: int, bucket: str) -> str:
+def _build_flux(
+    entity_ids: List[str],
+    range_hours: int,
+    interval_minutes: int,
+    bucket: str,
+    start: Optional[datetime] = None,
+) -> str:
     entity_list = ",".join([f'"{eid}"' for eid in entity_ids])
+    range_start = _format_time(start) if start is not None else f"-{range_hours}h"
     return (
         f"from(bucket: \"{bucket}\")"
-        f" |> range(start: -{range_hours}h)"
+        f" |> range(start: {range_start})"
         " |> filter(fn: (r) => r._measurement == \"state\")"
         " |> filter(fn: (r) => r._field == \"value\")"
         f" |> filter(fn: (r) => contains(value: r.entity_id, set: [{entity_list}]))"
@@ -77,17 +187,14 @@ def _parse_influx_csv(payload: str) -> Dict[str, List[Dict[str, Any]]]:
     return series
 
 
-@router.post("/query")
-async def query_timeseries(payload: TimeSeriesQuery) -> Dict[str, Any]:
-    settings = _influx_settings()
-    if not settings:
-        raise HTTPException(status_code=501, detail="InfluxDB not configured")
-    flux = _build_flux(
-        payload.entity_ids,
-        payload.range_hours,
-        payload.interval_minutes,
-        settings["bucket"],
-    )
+async def _fetch_series(
+    settings: Dict[str, str],
+    entity_ids: List[str],
+    range_hours: int,
+    interval_minutes: int,
+    start: Optional[datetime] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    flux = _build_flux(entity_ids, range_hours, interval_minutes, settings["bucket"], start)
     url = f"{settings['url']}/api/v2/query?org={quote(settings['org'])}"
     headers = {
         "Authorization": f"Token {settings['token']}",
@@ -100,9 +207,81 @@ async def query_timeseries(payload: TimeSeriesQuery) -> Dict[str, Any]:
     if not response.is_success:
         detail = response.text
         raise HTTPException(status_code=502, detail=f"Influx query failed: {detail}")
-    series = _parse_influx_csv(response.text)
+    return _parse_influx_csv(response.text)
+
+
+async def _refresh_tail(
+    settings: Dict[str, str],
+    entity_ids: List[str],
+    range_hours: int,
+    interval_minutes: int,
+) -> _SeriesTail:
+    """Return the cached tail for this query shape, fetching only what is new.
+
+    A cold or too-short cache triggers one full-window query. Otherwise Influx is
+    asked only for buckets ending after the last refresh; the last (possibly
+    partial) bucket is re-read so its aggregate stays correct.
+    """
+    key = (tuple(sorted(entity_ids)), interval_minutes)
+    lock = _tail_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        now = _now()
+        tail = _TAIL_CACHE.get(key)
+        if tail is None or tail.range_hours < range_hours or tail.fetched_at is None:
+            tail = _SeriesTail(range_hours)
+            series = await _fetch_series(settings, list(key[0]), range_hours, interval_minutes)
+            tail.merge(series, None)
+            tail.fetched_at = now
+        elif (now - tail.fetched_at).total_seconds() >= TAIL_REFRESH_SECONDS:
+            refetch_start = _floor_time(tail.fetched_at, interval_minutes)
+            series = await _fetch_series(
+                settings, list(key[0]), tail.range_hours, interval_minutes, start=refetch_start
+            )
+            tail.merge(series, refetch_start)
+            tail.fetched_at = now
+        tail.trim(now - timedelta(hours=tail.range_hours))
+        _TAIL_CACHE[key] = tail
+        _TAIL_CACHE.move_to_end(key)
+        while len(_TAIL_CACHE) > TAIL_CACHE_MAX_ENTRIES:
+            evicted, _ = _TAIL_CACHE.popitem(last=False)
+            _tail_locks.pop(evicted, None)
+        return tail
+
+
+@router.post("/query")
+async def query_timeseries(payload: TimeSeriesQuery) -> Dict[str, Any]:
+    """Query aggregated series, optionally returning only buckets after ``since``.
+
+    Incremental responses carry ``replace_from``: clients drop local points after
+    it (the previously partial bucket) and append the returned points. The
+    returned ``watermark`` is the value to send as ``since`` on the next poll.
+    """
+    settings = _influx_settings()
+    if not settings:
+        raise HTTPException(status_code=501, detail="InfluxDB not configured")
+    since: Optional[datetime] = None
+    if payload.since:
+        since = _parse_time(payload.since)
+        if since is None:
+            raise HTTPException(status_code=400, detail="Invalid 'since' timestamp")
+    tail = await _refresh_tail(
+        settings,
+        payload.entity_ids,
+        payload.range_hours,
+        payload.interval_minutes,
+    )
+    window_start = (tail.fetched_at or _now()) - timedelta(hours=payload.range_hours)
+    replace_from: Optional[datetime] = None
+    if since is not None:
+        replace_from = max(_floor_time(since, payload.interval_minutes), window_start)
+        series = tail.slice(payload.entity_ids, replace_from, exclusive=True)
+    else:
+        series = tail.slice(payload.entity_ids, window_start)
     return {
         "series": series,
         "range_hours": payload.range_hours,
         "interval_minutes": payload.interval_minutes,
+        "incremental": since is not None,
+        "replace_from": _format_time(replace_from) if replace_from is not None else None,
+        "watermark": _format_time(tail.fetched_at or _now()),
     }
@@ -0,0 +1,145 @@
+"""Streaming multipart/form-data reader for binary uploads."""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_PARAM_RE = re.compile(r';\s*([A-Za-z0-9_*-]+)="?([^";]*)"?')
+MAX_HEADER_BYTES = 16 * 1024
+
+
+@dataclass
+class UploadedFile:
+    name: str
+    filename: str
+    content_type: str
+    data: bytes
+
+
+@dataclass
+class MultipartForm:
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: List[UploadedFile] = field(default_factory=list)
+
+
+def multipart_boundary(content_type: Optional[str]) -> bytes:
+    if not content_type or not content_type.lower().startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+    match = _BOUNDARY_RE.search(content_type)
+    if not match:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+    return match.group(1).strip().encode("latin-1")
+
+
+def _parse_part_headers(raw: bytes) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    for line in raw.decode("utf-8", errors="replace").split("\r\n"):
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def read_multipart(
+    chunks: AsyncIterable[bytes],
+    boundary: bytes,
+    *,
+    max_file_bytes: int,
+    max_files: int,
+    max_field_bytes: int = 256 * 1024,
+    field_limits: Optional[Dict[str, int]] = None,
+) -> MultipartForm:
+    """Parse a multipart body as it streams in, enforcing limits per part.
+
+    Oversized parts are rejected (413) as soon as they cross the limit, so a
+    large upload never has to be buffered in full before it is refused.
+    ``field_limits`` overrides ``max_field_bytes`` for named non-file fields.
+    """
+    delimiter = b"\r\n--" + boundary
+    form = MultipartForm()
+    # Prefix CRLF so the opening boundary matches the same delimiter as the rest.
+    buffer = bytearray(b"\r\n")
+    state = "preamble"
+    headers: Dict[str, str] = {}
+    body = bytearray()
+    limit = max_field_bytes
+
+    def part_params(part_headers: Dict[str, str]) -> Dict[str, str]:
+        disposition = part_headers.get("content-disposition", "")
+        return {key.lower(): value for key, value in _PARAM_RE.findall(disposition)}
+
+    def finish_part() -> None:
+        params = part_params(headers)
+        name = params.get("name", "")
+        if "filename" in params:
+            form.files.append(
+                UploadedFile(
+                    name=name,
+                    filename=params["filename"],
+                    content_type=headers.get("content-type", "application/octet-stream").lower(),
+                    data=bytes(body),
+                )
+            )
+        else:
+            form.fields[name] = body.decode("utf-8", errors="replace")
+
+    def limit_for(part_headers: Dict[str, str]) -> int:
+        params = part_params(part_headers)
+        if "filename" in params:
+            return max_file_bytes
+        return (field_limits or {}).get(params.get("name", ""), max_field_bytes)
+
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            if state == "preamble":
+                index = buffer.find(delimiter)
+                if index < 0:
+                    del buffer[: max(0, len(buffer) - len(delimiter))]
+                    break
+                del buffer[: index + len(delimiter)]
+                state = "after_boundary"
+            if state == "after_boundary":
+                if len(buffer) < 2:
+                    break
+                if buffer[:2] == b"--":
+                    return form
+                if buffer[:2] != b"\r\n":
+                    raise HTTPException(status_code=400, detail="Malformed multipart body")
+                del buffer[:2]
+                state = "headers"
+            if state == "headers":
+                index = buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    if len(buffer) > MAX_HEADER_BYTES:
+                        raise HTTPException(status_code=400, detail="Multipart headers too large")
+                    break
+                headers = _parse_part_headers(bytes(buffer[:index]))
+                del buffer[: index + 4]
+                body = bytearray()
+                limit = limit_for(headers)
+                if "filename=" in headers.get("content-disposition", "") and len(form.files) >= max_files:
+                    raise HTTPException(status_code=400, detail="Too many files uploaded")
+                state = "body"
+            if state == "body":
+                index = buffer.find(delimiter)
+                if index < 0:
+                    # Keep a tail that could still be the start of the delimiter.
+                    flush = len(buffer) - len(delimiter) + 1
+                    if flush > 0:
+                        body += buffer[:flush]
+                        del buffer[:flush]
+                    if len(body) > limit:
+                        raise HTTPException(status_code=413, detail="Uploaded part exceeds size limit")
+                    break
+                body += buffer[:index]
+                del buffer[: index + len(delimiter)]
+                if len(body) > limit:
+                    raise HTTPException(status_code=413, detail="Uploaded part exceeds size limit")
+                finish_part()
+                state = "after_boundary"
+    raise HTTPException(status_code=400, detail="Incomplete multipart body")
@@ -2,7 +2,10 @@ from pathlib import Path
 import json
 import logging
 import os
-from typing import Any, Dict
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar
 
 logger = logging.getLogger(__name__)
 
@@ -65,24 +68,43 @@ def resolve_mapping_path() -> Path:
     raise RuntimeError(error_msg)
 
 
-def load_mapping() -> Dict[str, Any]:
-    """Load mapping.json from disk with error handling.
-    
-    Returns:
-        Dict with mapping configuration
-        
-    Raises:
-        RuntimeError: If file not found or invalid JSON
-    """
+def _env_float(name: str, default: float, minimum: float = 0.0) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+# How often the cached mapping re-stats the file to notice edits.
+MAPPING_RELOAD_CHECK_SECONDS = _env_float("MAPPING_RELOAD_CHECK_SECONDS", 1.0)
+
+T = TypeVar("T")
+
+_mapping_lock = threading.RLock()
+_mapping_state: Dict[str, Any] = {
+    "env": None,
+    "path": None,
+    "signature": None,
+    "frozen": None,
+    "version": 0,
+    "checked_at": 0.0,
+}
+_mapping_listeners: List[Callable[[Mapping[str, Any]], None]] = []
+
+
+def _read_mapping_file(path: Path) -> Dict[str, Any]:
     try:
-        path = resolve_mapping_path()
         with path.open("r", encoding="utf-8") as f:
             mapping = json.load(f)
-        
+
         # Validate structure
         if not isinstance(mapping, dict):
             raise ValueError(f"Invalid mapping.json: root must be object, got {type(mapping).__name__}")
-        
+
         logger.info("Successfully loaded mapping.json from %s with %d keys", path, len(mapping))
         return mapping
     except json.JSONDecodeError as e:
@@ -90,3 +112,130 @@ def load_mapping() -> Dict[str, Any]:
     except Exception as e:
         raise RuntimeError(f"Failed to load mapping.json: {e}") from e
 
+
+def _file_signature(path: Path) -> Tuple[int, int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+def freeze(value: Any) -> Any:
+    """Return a read-only deep copy (mapping proxies and tuples) of a JSON-like value."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Return a mutable deep copy of a (possibly frozen) mapping value."""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _current_mapping() -> Tuple[Mapping[str, Any], int]:
+    notify: Optional[Mapping[str, Any]] = None
+    with _mapping_lock:
+        state = _mapping_state
+        frozen = state["frozen"]
+        env = os.getenv("MAPPING_PATH")
+        now = time.monotonic()
+        if (
+            frozen is not None
+            and env == state["env"]
+            and now - state["checked_at"] < MAPPING_RELOAD_CHECK_SECONDS
+        ):
+            return frozen, state["version"]
+
+        try:
+            path = state["path"] if state["path"] is not None and env == state["env"] else resolve_mapping_path()
+            signature = _file_signature(path)
+        except (OSError, RuntimeError):
+            if frozen is None:
+                raise RuntimeError("Failed to load mapping.json: file not found") from None
+            # Keep serving the last good mapping while the file is being replaced
+            logger.warning("mapping.json is temporarily unavailable; keeping cached copy")
+            state["checked_at"] = now
+            return frozen, state["version"]
+
+        state["checked_at"] = now
+        if frozen is not None and path == state["path"] and signature == state["signature"]:
+            return frozen, state["version"]
+
+        try:
+            mapping = _read_mapping_file(path)
+        except RuntimeError:
+            if frozen is None:
+                raise
+            logger.exception("Reloading mapping.json failed; keeping cached copy")
+            return frozen, state["version"]
+
+        frozen = freeze(mapping)
+        state.update(env=env, path=path, signature=signature, frozen=frozen)
+        state["version"] += 1
+        version = state["version"]
+        # The first load is not a change; listeners only hear about reloads
+        if version > 1:
+            notify = frozen
+        listeners = list(_mapping_listeners)
+
+    if notify is not None:
+        for listener in listeners:
+            try:
+                listener(notify)
+            except Exception:
+                logger.exception("mapping.json change listener failed")
+    return frozen, version
+
+
+def get_mapping() -> Mapping[str, Any]:
+    """Shared read-only view of mapping.json, reloaded when the file's mtime/inode changes.
+
+    Raises:
+        RuntimeError: If the file cannot be loaded and nothing is cached yet
+    """
+    return _current_mapping()[0]
+
+
+def add_mapping_listener(listener: Callable[[Mapping[str, Any]], None]) -> None:
+    """Call ``listener`` with the new frozen mapping after every reload."""
+    with _mapping_lock:
+        if listener not in _mapping_listeners:
+            _mapping_listeners.append(listener)
+
+
+def mapping_index(builder: Callable[[Mapping[str, Any]], T]) -> Callable[[], T]:
+    """Memoize an index derived from mapping.json; rebuilt once per file change."""
+    lock = threading.Lock()
+    cache: Dict[str, Any] = {"version": None, "value": None}
+
+    def accessor() -> T:
+        mapping, version = _current_mapping()
+        with lock:
+            if cache["version"] != version:
+                cache["value"] = builder(mapping)
+                cache["version"] = version
+            return cache["value"]
+
+    return accessor
+
+
+def reset_mapping_cache() -> None:
+    """Forget the cached mapping so the next access reads the file again."""
+    with _mapping_lock:
+        _mapping_state.update(env=None, path=None, signature=None, frozen=None, checked_at=0.0)
+
+
+def load_mapping() -> Dict[str, Any]:
+    """Return a mutable copy of the cached mapping.json.
+
+    Returns:
+        Dict with mapping configuration
+
+    Raises:
+        RuntimeError: If file not found or invalid JSON
+    """
+    return thaw(get_mapping())
@@ -1,19 +1,31 @@
 """Advanced nutrient calculator with PPM profiles and SQLite persistence."""
 from __future__ import annotations
 
+import hashlib
+import itertools
 import json
 import logging
 import math
 import os
 import re
+import threading
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from datetime import date, timedelta
+from functools import cached_property
 from decimal import Decimal, ROUND_HALF_UP
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Tuple
+
+try:  # NumPy is optional; the matrix falls back to flat float arrays without it
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the deployment image
+    np = None
 
 from app.database import db
 from app.plan_routes import BASE_PLAN_TEMPLATES
-from app.utils import load_mapping
+from app.utils import add_mapping_listener, freeze, mapping_index, thaw
 
 logger = logging.getLogger(__name__)
 
@@ -74,17 +86,238 @@ REQUIRED_NUTRIENT_KEYS = ["N", "P", "K", "Ca", "Mg", "S", "Na", "Fe", "B", "Mo",
 def _round2(value: float) -> float:
     return float(Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
 
-def _add_ppm(target: Dict[str, float], profile: Dict[str, float], multiplier: float) -> None:
-    if multiplier <= 0:
-        return
+def _profile_vector(profile: Dict[str, float]) -> List[float]:
+    return [float(profile.get(key) or 0.0) for key in REQUIRED_NUTRIENT_KEYS]
+
+
+# Rows: A, X in veg (PROF_B), X in flower/ripen (PROF_C), BZ
+PROFILE_VECTORS = (
+    _profile_vector(PROF_A),
+    _profile_vector(PROF_B),
+    _profile_vector(PROF_C),
+    _profile_vector(PROF_BURST),
+)
+
+
+class PpmMatrix:
+    """Phase x nutrient PPM per unit dose factor for one compiled plan.
+
+    Each row is the plan's A/X/BZ doses projected onto the salt profiles, so a
+    preview is a row lookup scaled by the dose factor plus the water baseline.
+    """
+
+    def __init__(
+        self,
+        phases: Sequence[str],
+        weights: Sequence[Sequence[float]],
+        water: Sequence[float],
+    ) -> None:
+        self.phases = tuple(phases)
+        self.index = {phase: row for row, phase in enumerate(self.phases)}
+        width = len(REQUIRED_NUTRIENT_KEYS)
+        if np is not None:
+            self._rows = np.asarray(weights, dtype=float).reshape(-1, len(PROFILE_VECTORS)) @ np.asarray(
+                PROFILE_VECTORS, dtype=float
+            )
+            self._water = np.asarray(water, dtype=float)
+        else:
+            rows = array("d", [0.0]) * (width * len(self.phases))
+            for row, phase_weights in enumerate(weights):
+                offset = row * width
+                for weight, vector in zip(phase_weights, PROFILE_VECTORS):
+                    if not weight:
+                        continue
+                    for col in range(width):
+                        rows[offset + col] += weight * vector[col]
+            self._rows = rows
+            self._water = array("d", water)
+
+    def _row_values(self, row: int, dose_factor: float) -> List[float]:
+        dose = max(0.0, dose_factor)
+        if np is not None:
+            return (self._rows[row] * dose + self._water).tolist()
+        width = len(REQUIRED_NUTRIENT_KEYS)
+        offset = row * width
+        return [self._rows[offset + col] * dose + self._water[col] for col in range(width)]
+
+    def ppm(self, phase: str, dose_factor: float = 1.0) -> Dict[str, float]:
+        row = self.index.get(phase)
+        if row is None:
+            return {}
+        values = self._row_values(row, dose_factor)
+        return {key: round(value, 2) for key, value in zip(REQUIRED_NUTRIENT_KEYS, values)}
+
+    def curve(self, dose_factor: float = 1.0) -> List[Dict[str, float]]:
+        return [self.ppm(phase, dose_factor) for phase in self.phases]
+
+
+DOSE_KEYS = ("A", "X", "BZ")
+
+
+def _solve_linear(matrix: List[List[float]], rhs: List[float]) -> Optional[List[float]]:
+    """Gaussian elimination with partial pivoting; None when the system is singular."""
+    size = len(rhs)
+    aug = [list(row) + [value] for row, value in zip(matrix, rhs)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(aug[r][col]))
+        if abs(aug[pivot][col]) < 1e-12:
+            return None
+        aug[col], aug[pivot] = aug[pivot], aug[col]
+        for r in range(col + 1, size):
+            factor = aug[r][col] / aug[col][col]
+            for c in range(col, size + 1):
+                aug[r][c] -= factor * aug[col][c]
+    solution = [0.0] * size
+    for r in range(size - 1, -1, -1):
+        tail = sum(aug[r][c] * solution[c] for c in range(r + 1, size))
+        solution[r] = (aug[r][size] - tail) / aug[r][r]
+    return solution
+
+
+def solve_doses(
+    target: Dict[str, Optional[float]],
+    *,
+    stage: str = "veg",
+    water_profile: Optional[Dict[str, float]] = None,
+    osmosis_share: float = 0.0,
+    weights: Optional[Dict[str, float]] = None,
+    max_dose: float = 5.0,
+) -> Dict[str, Any]:
+    """Find A/X/BZ grams per liter in [0, max_dose] closest to a target PPM profile.
+
+    Minimizes the weighted squared error over the elements present in
+    ``target`` (default weight 1/target^2, i.e. relative error). With three
+    box-bounded variables the exact optimum is found by enumerating which
+    bounds are active and solving the reduced normal equations for the rest.
+    """
+    x_profile = PROF_B if stage == "veg" else PROF_C
+    vectors = [PROF_A, x_profile, PROF_BURST]
+    # Ripening mixes skip part A, so its dose is pinned to zero
+    upper = [0.0 if stage == "ripen" else max_dose, max_dose, max_dose]
+
+    base_factor = max(0.0, 1.0 - osmosis_share)
+    water = {key: float((water_profile or {}).get(key) or 0.0) * base_factor for key in REQUIRED_NUTRIENT_KEYS}
+
+    rows = []
     for key in REQUIRED_NUTRIENT_KEYS:
-        if key in profile:
-            target[key] = target.get(key, 0.0) + (profile[key] or 0.0) * multiplier
+        value = target.get(key)
+        if value is None:
+            continue
+        value = float(value)
+        weight = (weights or {}).get(key)
+        if weight is None:
+            weight = 1.0 / max(abs(value), 1.0) ** 2
+        if weight <= 0:
+            continue
+        rows.append((key, weight, [float(vector.get(key) or 0.0) for vector in vectors], value - water[key]))
+
+    size = len(DOSE_KEYS)
+    gram = [[sum(w * v[i] * v[j] for _, w, v, _ in rows) for j in range(size)] for i in range(size)]
+    rhs = [sum(w * v[i] * t for _, w, v, t in rows) for i in range(size)]
+
+    def objective(doses: List[float]) -> float:
+        return sum(w * (sum(c * d for c, d in zip(v, doses)) - t) ** 2 for _, w, v, t in rows)
+
+    best = [0.0] * size
+    best_error = objective(best)
+    # Each variable is free, at its lower bound or at its upper bound
+    for states in itertools.product((0, 1, 2), repeat=size):
+        doses = [upper[i] if state == 2 else 0.0 for i, state in enumerate(states)]
+        free = [i for i, state in enumerate(states) if state == 0]
+        if free:
+            reduced = [[gram[i][j] for j in free] for i in free]
+            reduced_rhs = [
+                rhs[i] - sum(gram[i][j] * doses[j] for j in range(size) if j not in free) for i in free
+            ]
+            solution = _solve_linear(reduced, reduced_rhs)
+            if solution is None:
+                continue
+            if any(value < -1e-9 or value > upper[i] + 1e-9 for i, value in zip(free, solution)):
+                continue
+            for i, value in zip(free, solution):
+                doses[i] = min(upper[i], max(0.0, value))
+        error = objective(doses)
+        if error < best_error - 1e-12:
+            best, best_error = doses, error
+
+    ppm = {key: water[key] for key in REQUIRED_NUTRIENT_KEYS}
+    for dose, vector in zip(best, vectors):
+        for key in REQUIRED_NUTRIENT_KEYS:
+            ppm[key] += dose * float(vector.get(key) or 0.0)
+
+    return {
+        "doses": {key: round(dose, 3) for key, dose in zip(DOSE_KEYS, best)},
+        "ppm": {key: round(value, 2) for key, value in ppm.items()},
+        "residuals": {
+            key: round(ppm[key] - float(target[key]), 2)
+            for key in REQUIRED_NUTRIENT_KEYS
+            if target.get(key) is not None
+        },
+        "weightedError": round(best_error, 6),
+    }
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, value)
+
+
+CONSUMPTION_CACHE_SIZE = _env_int("NUTRIENT_CONSUMPTION_CACHE_SIZE", 512)
+# Keyed by phase content rather than engine, so a plan edit only recomputes the phases it touched
+_CONSUMPTION_CACHE: "OrderedDict[Tuple[str, float], Dict[str, float]]" = OrderedDict()
+_CONSUMPTION_CACHE_LOCK = threading.Lock()
+
 
 # ---------------------------------------------------------------------------
 # NutrientCalculator Class
 # ---------------------------------------------------------------------------
 
+def _build_inventory_config(mapping: Mapping[str, Any]) -> Mapping[str, Mapping[str, Any]]:
+    inventory = thaw(mapping.get("inventory") or {})
+    items = {}
+    for group in ("nutrients", "additives"):
+        for key, meta in (inventory.get(group) or {}).items():
+            if isinstance(meta, dict):
+                items[key] = {**meta, "group": group}
+    # Shared by every engine, so hand out a read-only view
+    return freeze(items)
+
+
+_INVENTORY_CONFIG = mapping_index(_build_inventory_config)
+
+
+def _seed_inventory_items(config: Mapping[str, Mapping[str, Any]]) -> None:
+    """Seed inventory rows from mapping.json defaults if not already present."""
+    seed_data = {}
+    for key, meta in config.items():
+        # Check for environment variable overrides (e.g. INVENTORY_START_part_a)
+        env_key = f"INVENTORY_START_{key}"
+        val = os.getenv(env_key)
+        if val is not None:
+            try:
+                seed_data[key] = float(val)
+            except ValueError:
+                seed_data[key] = float(meta.get("full_size") or 0.0)
+        else:
+            seed_data[key] = float(meta.get("full_size") or 0.0)
+
+    db.ensure_inventory_items(seed_data)
+
+
+def _on_mapping_reload(mapping: Mapping[str, Any]) -> None:
+    # Warm engines never re-run __init__, so components added by an edit are seeded here
+    _seed_inventory_items(_INVENTORY_CONFIG())
+
+
+add_mapping_listener(_on_mapping_reload)
+
+
 class NutrientCalculator:
     def __init__(
         self,
@@ -100,7 +333,6 @@ class NutrientCalculator:
         self._plan_adjustments = plan_adjustments or {}
         self._water_profile = self._normalize_water_profile(water_profile)
         self._osmosis_share = self._normalize_osmosis_share(osmosis_share)
-        self._inventory_config = self._load_inventory_config()
         self._seed_inventory()
 
     def _normalize_water_profile(self, profile: Optional[Dict[str, float]]) -> Dict[str, float]:
@@ -147,32 +379,14 @@ class NutrientCalculator:
             entries[phase] = entry
         return entries
 
-    def _load_inventory_config(self) -> Dict[str, Dict[str, Any]]:
-        mapping = load_mapping()
-        inventory = mapping.get("inventory") or {}
-        items = {}
-        for group in ("nutrients", "additives"):
-            for key, meta in (inventory.get(group) or {}).items():
-                if isinstance(meta, dict):
-                    items[key] = {**meta, "group": group}
-        return items
+    @property
+    def _inventory_config(self) -> Mapping[str, Mapping[str, Any]]:
+        # Shared read-only index; re-read on every access so warm engines follow mapping.json edits
+        return _INVENTORY_CONFIG()
 
     def _seed_inventory(self):
         """Seed inventory table from mapping.json defaults if not already present."""
-        seed_data = {}
-        for key, meta in self._inventory_config.items():
-            # Check for environment variable overrides (e.g. INVENTORY_START_part_a)
-            env_key = f"INVENTORY_START_{key}"
-            val = os.getenv(env_key)
-            if val is not None:
-                try:
-                    seed_data[key] = float(val)
-                except ValueError:
-                    seed_data[key] = float(meta.get("full_size") or 0.0)
-            else:
-                seed_data[key] = float(meta.get("full_size") or 0.0)
-
-        db.ensure_inventory_items(seed_data)
+        _seed_inventory_items(self._inventory_config)
 
     def _normalize_phase(self, phase: str) -> str:
         raw = str(phase or "").strip()
@@ -205,67 +419,234 @@ class NutrientCalculator:
             "ppm": self._calculate_ppm(phase, 1.0) # Base PPM per L
         }
 
+    def preview_batch(
+        self, items: Sequence[Tuple[str, float, Optional[Dict[str, str]]]]
+    ) -> List[Dict[str, Any]]:
+        """Preview many (week_key, liters, observations) mixes against this plan, in order.
+
+        Per-phase doses, top dress and PPM rows are shared across the batch, so
+        each item only scales precomputed rows by its liters and adjustment.
+        """
+        phases: Dict[str, Tuple[Dict[str, Tuple[float, bool]], List[Dict[str, Any]], Dict[str, float]]] = {}
+        adjustments: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        results = []
+        for index, (week_key, liters, observations) in enumerate(items):
+            phase = self._normalize_phase(week_key)
+            cached = phases.get(phase)
+            if cached is None:
+                doses = self._dose_table.get(phase)
+                if doses is None:
+                    raise ValueError(f"Unknown phase '{phase}' (item {index})")
+                cached = (doses, self._build_top_dress(self._plan_entries[phase]), self._calculate_ppm(phase, 1.0))
+                phases[phase] = cached
+            doses, top_dress, ppm = cached
+
+            obs_key = tuple(sorted((observations or {}).items()))
+            adjustment = adjustments.get(obs_key)
+            if adjustment is None:
+                adjustment = adjustments[obs_key] = self._calculate_observation_adjustment(observations)
+
+            mix = self._scale_mix(doses, liters, adjustment)
+            results.append({
+                "mix": {k: v for k, v in mix.items() if k not in {"shield"}},
+                "top_dress": [dict(item) for item in top_dress],
+                "ppm": dict(ppm),
+            })
+        return results
+
+    @cached_property
+    def _dose_table(self) -> Dict[str, Dict[str, Tuple[float, bool]]]:
+        """Per-liter dose per component and phase; the flag marks doses scaled by observations."""
+        last_flower_week = self._last_flower_week()
+        table: Dict[str, Dict[str, Tuple[float, bool]]] = {}
+        for phase, entry in self._plan_entries.items():
+            stage = self._resolve_stage(phase)
+            x_per_l = float(entry.get("X") or 0.0)
+            doses = {
+                "part_a": (float(entry.get("A") or 0.0) if stage != "ripen" else 0.0, True),
+                "part_b": (x_per_l if stage == "veg" else 0.0, True),
+                "part_c": (x_per_l if stage != "veg" else 0.0, True),
+                "burst": (float(entry.get("BZ") or 0.0), True),
+                "kelp": (float(entry.get("Tide") or 0.0), False),
+                "amino": (float(entry.get("Helix") or 0.0), False),
+                "fulvic": (float(entry.get("Ligand") or 0.0), False),
+            }
+            if last_flower_week and phase == last_flower_week:
+                doses["quench"] = (0.3, False)
+            table[phase] = doses
+        return table
+
+    @cached_property
+    def _phase_content_keys(self) -> Dict[str, str]:
+        """Hash per phase of everything its consumption depends on: dose row, top dress and water inputs."""
+        keys = {}
+        for phase, entry in self._plan_entries.items():
+            raw = json.dumps(
+                {
+                    "doses": self._dose_table[phase],
+                    "topDress": [
+                        (item.get("key"), item.get("unit"), item.get("amount"))
+                        for item in self._build_top_dress(entry)
+                    ],
+                    "substrate": self.substrate,
+                    "water": self._water_profile,
+                    "osmosis": self._osmosis_share,
+                },
+                sort_keys=True,
+                separators=(",", ":"),
+                default=str,
+            )
+            keys[phase] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return keys
+
+    def _phase_consumption(self, phase: str, liters: float) -> Dict[str, float]:
+        """Grams drawn from inventory by one unadjusted tank of ``phase`` (tank mix plus gram top dress)."""
+        key = (self._phase_content_keys[phase], liters)
+        with _CONSUMPTION_CACHE_LOCK:
+            cached = _CONSUMPTION_CACHE.get(key)
+            if cached is not None:
+                _CONSUMPTION_CACHE.move_to_end(key)
+                return dict(cached)
+        consumption = self._scale_mix(self._dose_table[phase], liters, 1.0)
+        for item in self._build_top_dress(self._plan_entries[phase]):
+            if item.get("unit") == "g":
+                component = item.get("key", "")
+                consumption[component] = consumption.get(component, 0.0) + float(item.get("amount") or 0.0)
+        with _CONSUMPTION_CACHE_LOCK:
+            _CONSUMPTION_CACHE[key] = consumption
+            while len(_CONSUMPTION_CACHE) > CONSUMPTION_CACHE_SIZE:
+                _CONSUMPTION_CACHE.popitem(last=False)
+        return dict(consumption)
+
+    def forecast_depletion(
+        self,
+        liters: float,
+        *,
+        mix_interval_days: float = 7.0,
+        start: Optional[date] = None,
+        today: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """Simulate the remaining season's tank mixes against current stock.
+
+        Phases run back to back from ``start`` for their ``durationDays``; a tank
+        is mixed at each phase start and every ``mix_interval_days`` after it.
+        Mixes dated before ``today`` are treated as already consumed.
+        """
+        today = today or date.today()
+        start = start or today
+        interval = max(mix_interval_days, 0.1)
+        config = self._inventory_config
+        levels = db.fetch_inventory()
+        remaining = {key: float(levels.get(key, {}).get("grams", 0.0)) for key in config}
+        projected = {key: 0.0 for key in config}
+        depletion: Dict[str, Optional[date]] = {key: None for key in config}
+
+        phases = []
+        offset = 0
+        for phase, entry in self._plan_entries.items():
+            try:
+                duration = max(1, int(entry.get("durationDays") or 7))
+            except (TypeError, ValueError):
+                duration = 7
+            phase_start = start + timedelta(days=offset)
+            consumption = self._phase_consumption(phase, liters)
+            mixes = 0
+            step = 0
+            while step * interval < duration:
+                mix_day = phase_start + timedelta(days=int(step * interval))
+                step += 1
+                if mix_day < today:
+                    continue
+                mixes += 1
+                for key, used in consumption.items():
+                    if key not in config or used <= 0:
+                        continue
+                    projected[key] += used
+                    if depletion[key] is None and remaining[key] < used:
+                        depletion[key] = mix_day
+                    remaining[key] = max(0.0, remaining[key] - used)
+            phases.append({
+                "phase": phase,
+                "start": phase_start.isoformat(),
+                "days": duration,
+                "mixes": mixes,
+                "consumption": {k: v for k, v in consumption.items() if k in config},
+            })
+            offset += duration
+
+        products = {}
+        for key, meta in config.items():
+            products[key] = {
+                "name": meta.get("name", key),
+                "unit": meta.get("unit", "g"),
+                "current": _round2(float(levels.get(key, {}).get("grams", 0.0))),
+                "projectedUse": _round2(projected[key]),
+                "remaining": _round2(remaining[key]),
+                "depletionDate": depletion[key].isoformat() if depletion[key] else None,
+            }
+        return {
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=offset)).isoformat(),
+            "liters": liters,
+            "mixIntervalDays": interval,
+            "phases": phases,
+            "products": products,
+        }
+
+    @staticmethod
+    def _scale_mix(doses: Dict[str, Tuple[float, bool]], liters: float, adjustment: float) -> Dict[str, float]:
+        return {
+            key: _round2((per_liter * adjustment if adjusted else per_liter) * liters)
+            for key, (per_liter, adjusted) in doses.items()
+        }
+
     def _calculate_mix_raw(
         self,
         phase: str,
         liters: float,
         observations: Optional[Dict[str, str]] = None,
     ) -> tuple[Dict[str, float], List[Dict[str, Any]]]:
-        entry = self._plan_entries.get(phase)
-        if not entry:
+        doses = self._dose_table.get(phase)
+        if doses is None:
             raise ValueError(f"Unknown phase '{phase}'")
 
-        stage = self._resolve_stage(phase)
         adjustment = self._calculate_observation_adjustment(observations)
-        a_per_l = float(entry.get("A") or 0.0) * adjustment
-        x_per_l = float(entry.get("X") or 0.0) * adjustment
-        bz_per_l = float(entry.get("BZ") or 0.0) * adjustment
-
-        mix = {
-            "part_a": _round2(a_per_l * liters) if stage != "ripen" else 0.0,
-            "part_b": _round2(x_per_l * liters) if stage == "veg" else 0.0,
-            "part_c": _round2(x_per_l * liters) if stage != "veg" else 0.0,
-            "burst": _round2(bz_per_l * liters),
-            "kelp": _round2(float(entry.get("Tide") or 0.0) * liters),
-            "amino": _round2(float(entry.get("Helix") or 0.0) * liters),
-            "fulvic": _round2(float(entry.get("Ligand") or 0.0) * liters),
-        }
-
-        last_flower_week = self._last_flower_week()
-        if last_flower_week and phase == last_flower_week:
-            mix["quench"] = _round2(0.3 * liters)
-
-        top_dress = self._build_top_dress(entry)
+        mix = self._scale_mix(doses, liters, adjustment)
+        top_dress = self._build_top_dress(self._plan_entries[phase])
         return mix, top_dress
 
-    def _calculate_ppm(self, phase: str, dose_factor: float) -> Dict[str, float]:
-        entry = self._plan_entries.get(phase)
-        if not entry: return {}
-
-        stage = self._resolve_stage(phase)
-        ppm = {k: 0.0 for k in REQUIRED_NUTRIENT_KEYS}
+    @cached_property
+    def _ppm_matrix(self) -> PpmMatrix:
+        weights = []
+        for phase, entry in self._plan_entries.items():
+            a = max(0.0, float(entry.get("A") or 0.0))
+            x = max(0.0, float(entry.get("X") or 0.0))
+            bz = max(0.0, float(entry.get("BZ") or 0.0))
+            veg = self._resolve_stage(phase) == "veg"
+            weights.append((a, x if veg else 0.0, 0.0 if veg else x, bz))
+
+        water = [0.0] * len(REQUIRED_NUTRIENT_KEYS)
+        base_factor = max(0.0, 1.0 - self._osmosis_share)
+        if self._water_profile and base_factor > 0:
+            water = [
+                float(self._water_profile.get(key, 0.0)) * base_factor for key in REQUIRED_NUTRIENT_KEYS
+            ]
+        return PpmMatrix(list(self._plan_entries.keys()), weights, water)
 
-        _add_ppm(ppm, PROF_A, float(entry.get("A") or 0.0) * dose_factor)
-        if stage == "veg":
-            _add_ppm(ppm, PROF_B, float(entry.get("X") or 0.0) * dose_factor)
-        else:
-            _add_ppm(ppm, PROF_C, float(entry.get("X") or 0.0) * dose_factor)
+    def _calculate_ppm(self, phase: str, dose_factor: float) -> Dict[str, float]:
+        return self._ppm_matrix.ppm(phase, dose_factor)
 
-        _add_ppm(ppm, PROF_BURST, float(entry.get("BZ") or 0.0) * dose_factor)
-        if self._water_profile:
-            base_factor = max(0.0, 1.0 - self._osmosis_share)
-            if base_factor > 0:
-                for key in REQUIRED_NUTRIENT_KEYS:
-                    if key in self._water_profile:
-                        ppm[key] = ppm.get(key, 0.0) + self._water_profile[key] * base_factor
-        return {k: round(v, 2) for k, v in ppm.items()}
+    def ppm_curve(self, dose_factor: float = 1.0) -> List[Dict[str, Any]]:
+        """PPM for every phase of the plan in schedule order."""
+        matrix = self._ppm_matrix
+        return [
+            {"phase": phase, "stage": self._resolve_stage(phase), "ppm": ppm}
+            for phase, ppm in zip(matrix.phases, matrix.curve(dose_factor))
+        ]
 
     def mix_tank(self, week_key: str, liters: float, observations: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         result = self.preview_plan(week_key, liters, observations)
-        self.consume_mix(result["mix"])
-        for item in result.get("top_dress") or []:
-            if item.get("unit") == "g":
-                self.consume_mix({item.get("key", ""): float(item.get("amount") or 0.0)})
+        self.consume_mix(self.tank_consumption(result), reference=f"mix:{self._normalize_phase(week_key)}")
 
         inventory = self.get_stock_status()
         alerts = self.check_refill_needed()
@@ -322,19 +703,23 @@ class NutrientCalculator:
                 continue
         return max(0.0, 1.0 + adjustment / 100.0)
 
-    def consume_mix(self, mix: Dict[str, float]):
-        current = db.fetch_inventory()
-        for key, used in mix.items():
-            if key not in self._inventory_config:
-                continue
-            if key in current:
-                new_level = max(0.0, current[key]["grams"] - used)
-                db.update_inventory(key, new_level)
-            else:
-                # Key didn't exist in current, treat full_size as default if available
-                meta = self._inventory_config.get(key, {})
-                full = float(meta.get("full_size") or 0.0)
-                db.update_inventory(key, 0.0, full)
+    def tank_consumption(self, preview: Dict[str, Any]) -> Dict[str, float]:
+        """Inventory drawn by a previewed tank: the mix plus any top dress dosed in grams."""
+        config = self._inventory_config
+        consumption = {key: float(used) for key, used in preview["mix"].items() if key in config}
+        for item in preview.get("top_dress") or []:
+            key = item.get("key", "")
+            if item.get("unit") == "g" and key in config:
+                consumption[key] = consumption.get(key, 0.0) + float(item.get("amount") or 0.0)
+        return consumption
+
+    def inventory_defaults(self, components: Sequence[str]) -> Dict[str, float]:
+        config = self._inventory_config
+        return {key: float(config[key].get("full_size") or 0.0) for key in components if key in config}
+
+    def consume_mix(self, mix: Dict[str, float], reference: Optional[str] = None) -> None:
+        consumption = {key: float(used) for key, used in mix.items() if key in self._inventory_config}
+        db.consume_inventory(consumption, initial=self.inventory_defaults(list(consumption)), reference=reference)
 
     def set_inventory_level(self, component: str, grams: float) -> None:
         meta = self._inventory_config.get(component)
@@ -350,14 +735,15 @@ class NutrientCalculator:
             current = levels.get(key, {}).get("grams", 0.0)
             full = float(meta.get("full_size") or 1.0)
             status[key] = {
-                **meta,
+                **thaw(meta),
                 "current": _round2(current),
                 "percent": _round2((current / full) * 100.0)
             }
         return status
 
-    def check_refill_needed(self) -> List[Dict[str, Any]]:
-        status = self.get_stock_status()
+    def check_refill_needed(self, status: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        if status is None:
+            status = self.get_stock_status()
         alerts = []
         for key, info in status.items():
             threshold = info.get("threshold_warn")
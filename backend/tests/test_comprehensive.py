@@ -283,3 +283,1386 @@ class TestSecureLogging:
         
         assert api_key not in caplog.text
         assert "[REDACTED]" in caplog.text
+
+
+class TestTimeSeriesTail:
+    """Test incremental tail caching for time-series queries."""
+
+    def test_merge_replaces_partial_bucket(self):
+        from datetime import datetime, timezone
+        from app.timeseries_routes import _SeriesTail, _floor_time, _parse_time
+
+        tail = _SeriesTail(range_hours=24)
+        tail.merge({"sensor.vpd": [
+            {"t": "2026-02-06T10:15:00Z", "v": 1.0},
+            {"t": "2026-02-06T10:22:31.5Z", "v": 1.1},
+        ]}, None)
+
+        replace_from = _floor_time(_parse_time("2026-02-06T10:22:31Z"), 15)
+        assert replace_from == datetime(2026, 2, 6, 10, 15, tzinfo=timezone.utc)
+        tail.merge({"sensor.vpd": [
+            {"t": "2026-02-06T10:30:00Z", "v": 1.2},
+            {"t": "2026-02-06T10:37:00Z", "v": 1.3},
+        ]}, replace_from)
+
+        points = tail.slice(["sensor.vpd"], replace_from, exclusive=True)["sensor.vpd"]
+        assert [p["v"] for p in points] == [1.2, 1.3]
+        full = tail.slice(["sensor.vpd"], datetime(2026, 2, 6, tzinfo=timezone.utc))["sensor.vpd"]
+        assert [p["v"] for p in full] == [1.0, 1.2, 1.3]
+
+    def test_trim_and_flux_start(self):
+        from datetime import datetime, timezone
+        from app.timeseries_routes import _SeriesTail, _build_flux
+
+        tail = _SeriesTail(range_hours=1)
+        tail.merge({"sensor.ec": [
+            {"t": "2026-02-06T08:00:00Z", "v": 2.0},
+            {"t": "2026-02-06T10:00:00Z", "v": 2.1},
+        ]}, None)
+        tail.trim(datetime(2026, 2, 6, 9, tzinfo=timezone.utc))
+        assert tail.slice(["sensor.ec"], datetime(2026, 2, 6, tzinfo=timezone.utc))["sensor.ec"] == [
+            {"t": "2026-02-06T10:00:00Z", "v": 2.1}
+        ]
+
+        flux = _build_flux(["sensor.ec"], 24, 15, "ha", datetime(2026, 2, 6, 9, tzinfo=timezone.utc))
+        assert "range(start: 2026-02-06T09:00:00Z)" in flux
+
+
+class TestTelemetryRollups:
+    """Test hourly metric rollups maintained on journal writes."""
+
+    def _entry(self, when, **metrics):
+        from app.journal_routes import JournalEntryPayload
+        return JournalEntryPayload(
+            date=when.isoformat(),
+            phase="W3",
+            entryType="Observation",
+            priority="Medium",
+            metrics=metrics,
+        )
+
+    def test_summary_reads_rollups(self):
+        from datetime import datetime, timedelta, timezone
+        import uuid
+        from app.journal_routes import add_entry, delete_entry
+        from app import telemetry
+
+        grow_id = f"rollup_{uuid.uuid4().hex[:8]}"
+        now = datetime.now(timezone.utc)
+        add_entry(grow_id, self._entry(now - timedelta(hours=1), vpd=1.0, ec=2.0))
+        added = add_entry(grow_id, self._entry(now - timedelta(minutes=5), vpd=1.4))
+        add_entry(grow_id, self._entry(now - timedelta(days=3), vpd=9.0))
+
+        summary = telemetry.collect_daily_summary(grow_id)
+        assert summary["metrics"] == {"vpd": 1.2, "ec": 2.0}
+        assert summary["sampleCount"] == 2
+        assert summary["phase"] == "W3"
+
+        delete_entry(grow_id, added.entry.id)
+        summary = telemetry.collect_daily_summary(grow_id)
+        assert summary["metrics"] == {"vpd": 1.0, "ec": 2.0}
+
+    def test_backfills_existing_journal(self):
+        from datetime import datetime, timezone
+        from app import telemetry
+        import uuid
+        from app.storage import set_collection_key
+
+        grow_id = f"legacy_{uuid.uuid4().hex[:8]}"
+        set_collection_key("photonfluxJournal", f"journal_{grow_id}", [
+            {"date": datetime.now(timezone.utc).isoformat(), "phase": "W1", "metrics": {"vwc": 40.0}},
+        ])
+        summary = telemetry.collect_daily_summary(grow_id)
+        assert summary["metrics"] == {"vwc": 40.0}
+        assert telemetry.db.get_metric_rollup_state(grow_id) is not None
+
+
+class TestTelemetryOutbox:
+    """Test durable outbox delivery against a local stand-in endpoint."""
+
+    def _reset_outbox(self):
+        from app.database import db as shared_db
+        with shared_db.transaction() as conn:
+            conn.execute("DELETE FROM telemetry_outbox")
+
+    def test_forced_sends_are_queued_and_dedupe_is_reported(self, monkeypatch):
+        import asyncio
+        from app import telemetry
+
+        self._reset_outbox()
+        stamps = iter(["2026-02-06T10:05:00+00:00", "2026-02-06T10:20:00+00:00", "2026-02-06T10:20:00+00:00"])
+
+        async def summaries(grow_ids):
+            return {grow_id: {"growId": grow_id, "timestamp": next(stamps), "windowHours": 24} for grow_id in grow_ids}
+
+        async def flush(endpoint):
+            return 0
+
+        monkeypatch.setattr(telemetry, "get_settings", lambda: {"enabled": True, "endpoint": "http://stand-in"})
+        monkeypatch.setattr(telemetry, "collect_summaries", summaries)
+        monkeypatch.setattr(telemetry, "record_last_sent", lambda *args: None)
+        monkeypatch.setattr(telemetry, "flush_outbox", flush)
+
+        scheduled = telemetry.enqueue_summary({"growId": "g1", "timestamp": "2026-02-06T10:00:00+00:00", "windowHours": 24})
+        first = asyncio.run(telemetry.send_daily_payload(force=True, grow_id="g1"))
+        second = asyncio.run(telemetry.send_daily_payload(force=True, grow_id="g1"))
+        repeat = asyncio.run(telemetry.send_daily_payload(force=True, grow_id="g1"))
+        # Neither the scheduled summary nor an earlier forced one swallows a forced send in the same hour.
+        assert scheduled.queued
+        assert (first.queued, second.queued) == (1, 1)
+        assert (repeat.queued, repeat.deduplicated) == (0, 1)
+        assert len(telemetry.db.fetch_outbox_due("9999-01-01T00:00:00.000000Z", 10)) == 3
+
+    def test_batches_are_gzipped_and_retried(self):
+        import asyncio
+        import gzip
+        import json
+        import httpx
+        from app import telemetry
+
+        self._reset_outbox()
+        received = []
+        fail = {"remaining": 1}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if fail["remaining"]:
+                fail["remaining"] -= 1
+                return httpx.Response(503)
+            assert request.headers["content-encoding"] == "gzip"
+            received.append(json.loads(gzip.decompress(request.content)))
+            return httpx.Response(200)
+
+        first = telemetry.enqueue_summary({"growId": "g1", "timestamp": "2026-02-06T10:05:00+00:00", "windowHours": 24})
+        telemetry.enqueue_summary({"growId": "g2", "timestamp": "2026-02-06T10:05:00+00:00", "windowHours": 24})
+        again = telemetry.enqueue_summary({"growId": "g1", "timestamp": "2026-02-06T10:45:00+00:00", "windowHours": 24})
+        assert first.queued and again == (first.id, False)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                assert await telemetry.flush_outbox("http://stand-in/telemetry", client=client) == 0
+                assert telemetry._next_outbox_delay() > 0
+                # Pretend the backoff has elapsed
+                with telemetry.db.transaction() as conn:
+                    conn.execute("UPDATE telemetry_outbox SET next_attempt_at = '2000-01-01T00:00:00.000000Z'")
+                return await telemetry.flush_outbox("http://stand-in/telemetry", client=client)
+
+        assert asyncio.run(run()) == 2
+        assert len(received) == 1
+        assert {item["growId"] for item in received[0]["items"]} == {"g1", "g2"}
+        assert telemetry._next_outbox_delay() is None
+
+
+class TestTelemetryPerGrow:
+    """Test per-grow discovery and schedules."""
+
+    def test_discovers_and_schedules_each_grow(self):
+        import asyncio
+        import uuid
+        from datetime import datetime, timedelta, timezone
+        from app import telemetry
+        from app.storage import set_collection_key
+
+        now = datetime.now(timezone.utc)
+        grows = [f"multi_{uuid.uuid4().hex[:8]}" for _ in range(3)]
+        for idx, grow_id in enumerate(grows):
+            set_collection_key("photonfluxJournal", f"journal_{grow_id}", [
+                {"date": now.isoformat(), "phase": "W2", "metrics": {"ec": 1.0 + idx}},
+            ])
+
+        active = telemetry.discover_active_grows()
+        assert set(grows) <= set(active)
+
+        summaries = asyncio.run(telemetry.collect_summaries(grows))
+        assert [summaries[g]["metrics"]["ec"] for g in grows] == [1.0, 2.0, 3.0]
+
+        settings = {"lastSentByGrow": {
+            grows[0]: now.isoformat(),
+            grows[1]: (now - timedelta(hours=telemetry.INTERVAL_HOURS + 1)).isoformat(),
+        }}
+        assert telemetry._due_grows(settings, grows, force=False) == grows[1:]
+        assert telemetry._next_summary_delay(settings, grows) == 60
+        assert telemetry._next_summary_delay(settings, grows[:1]) > 3600
+
+
+class TestMetricSketches:
+    """Test mergeable histogram sketches in telemetry summaries."""
+
+    def test_histogram_quantiles_and_merge(self):
+        from app.sketches import BinSpec, Histogram
+
+        spec = BinSpec(0.0, 10.0, 100)
+        first = Histogram.from_values(spec, [i / 10 for i in range(50)])
+        second = Histogram.from_values(spec, [5 + i / 10 for i in range(50)])
+        merged = Histogram(spec).merge(first).merge(second)
+
+        assert merged.total == 100
+        assert abs(merged.quantile(0.5) - 5.0) < 0.11
+        assert abs(merged.quantile(0.95) - 9.5) < 0.11
+        assert abs(merged.fraction_outside(2.0, 8.0) - 0.4) < 0.02
+
+    def test_summary_reports_quantiles_and_band(self):
+        import uuid
+        from datetime import datetime, timedelta, timezone
+        from app import telemetry
+        from app.storage import set_collection_key
+
+        now = datetime.now(timezone.utc)
+        grows = [f"sketch_{uuid.uuid4().hex[:8]}" for _ in range(2)]
+        for offset, grow_id in enumerate(grows):
+            set_collection_key("photonfluxJournal", f"journal_{grow_id}", [
+                {"date": (now - timedelta(minutes=i)).isoformat(), "phase": "W5",
+                 "metrics": {"vpd": 0.5 + offset + i * 0.05}}
+                for i in range(20)
+            ])
+            telemetry.rebuild_grow_aggregates(grow_id)
+
+        summary = telemetry.collect_daily_summary(grows[0])
+        quantiles = summary["quantiles"]["vpd"]
+        assert 0.5 <= quantiles["p5"] <= quantiles["p50"] <= quantiles["p95"] <= 1.45
+        band = summary["outOfBand"]["vpd"]
+        assert 0.0 < band["sampleFraction"] < 1.0
+        # All readings fall within the last 20 minutes: at most two hourly buckets.
+        assert 1 <= band["excursionHours"] <= band["hoursWithData"] <= 2
+
+        fleet = telemetry.window_sketches(grows)
+        assert fleet["vpd"].total == 40
+
+
+class TestNutrientEngineCache:
+    """Test content-hash LRU reuse of NutrientCalculator instances."""
+
+    def test_engines_keyed_by_plan_content(self, monkeypatch):
+        from app import nutrient_routes
+        from app.plan_routes import DEFAULT_PLAN
+
+        nutrient_routes._ENGINE_CACHE.clear()
+        plan = DEFAULT_PLAN["wedding_cake"]["coco"]
+        first = nutrient_routes._engine_for_plan("coco", plan)
+        assert nutrient_routes._engine_for_plan("coco", dict(plan)) is first
+
+        tweaked = {**plan, "osmosisShare": 0.9}
+        assert nutrient_routes._engine_for_plan("coco", tweaked) is not first
+
+        monkeypatch.setattr(nutrient_routes, "ENGINE_CACHE_SIZE", 2)
+        nutrient_routes._engine_for_plan("soil", None)
+        assert len(nutrient_routes._ENGINE_CACHE) == 2
+        assert nutrient_routes._engine_for_plan("coco", plan) is not first
+
+
+class TestMappingCache:
+    """Test the shared mapping.json cache and its hot reload."""
+
+    def test_reload_on_change_rebuilds_indexes_once(self, tmp_path, monkeypatch):
+        import json
+        from app import utils
+
+        path = tmp_path / "mapping.json"
+        path.write_text(json.dumps({"inventory": {"nutrients": {"part_a": {"name": "A"}}}}))
+        monkeypatch.setenv("MAPPING_PATH", str(path))
+        monkeypatch.setattr(utils, "MAPPING_RELOAD_CHECK_SECONDS", 0.0)
+        utils.reset_mapping_cache()
+
+        builds = []
+        seen = []
+        index = utils.mapping_index(lambda mapping: builds.append(1) or sorted(mapping["inventory"]["nutrients"]))
+        mapping = utils.get_mapping()
+        utils.add_mapping_listener(seen.append)
+        try:
+            with pytest.raises(TypeError):
+                mapping["inventory"] = {}
+            assert utils.get_mapping() is mapping
+            assert index() == ["part_a"] and index() == ["part_a"]
+            assert len(builds) == 1
+
+            path.write_text(json.dumps({"inventory": {"nutrients": {"part_b": {"name": "B"}}}}))
+            os.utime(path, ns=(1, 1))
+            assert index() == ["part_b"]
+            assert len(builds) == 2 and len(seen) == 1
+            assert utils.load_mapping()["inventory"]["nutrients"]["part_b"] == {"name": "B"}
+        finally:
+            utils._mapping_listeners.remove(seen.append)
+            monkeypatch.delenv("MAPPING_PATH")
+            utils.reset_mapping_cache()
+            utils.get_mapping()
+
+
+    def test_reload_seeds_new_inventory_for_warm_engines(self, tmp_path, monkeypatch):
+        import json
+        import uuid
+        from app import utils
+        from app.database import db as global_db
+        from nutrient_engine import NutrientCalculator
+
+        engine = NutrientCalculator(substrate="coco")
+        config = engine._inventory_config
+        with pytest.raises(TypeError):
+            config["part_a"]["full_size"] = 1
+        with pytest.raises(TypeError):
+            config["bogus"] = {}
+
+        added = f"refill_{uuid.uuid4().hex[:8]}"
+        mapping = utils.load_mapping()
+        mapping["inventory"]["additives"][added] = {"name": "New", "unit": "g", "full_size": 750}
+        path = tmp_path / "mapping.json"
+        path.write_text(json.dumps(mapping))
+        monkeypatch.setenv("MAPPING_PATH", str(path))
+        monkeypatch.setattr(utils, "MAPPING_RELOAD_CHECK_SECONDS", 0.0)
+        try:
+            assert added in engine._inventory_config
+            assert global_db.fetch_inventory()[added]["grams"] == 750.0
+            assert engine.get_stock_status()[added]["percent"] == 100.0
+        finally:
+            monkeypatch.delenv("MAPPING_PATH")
+            utils.reset_mapping_cache()
+            utils.get_mapping()
+
+
+class TestPpmMatrix:
+    """Test the compiled phase x nutrient PPM matrix."""
+
+    def test_matrix_matches_profile_sum(self):
+        import nutrient_engine
+        from nutrient_engine import NutrientCalculator, REQUIRED_NUTRIENT_KEYS
+
+        engine = NutrientCalculator(substrate="coco", water_profile={"Ca": 40.0, "Mg": 10.0}, osmosis_share=0.25)
+        for phase, entry in engine._plan_entries.items():
+            profile = nutrient_engine.PROF_B if engine._resolve_stage(phase) == "veg" else nutrient_engine.PROF_C
+            ppm = engine._calculate_ppm(phase, 0.5)
+            for key in REQUIRED_NUTRIENT_KEYS:
+                expected = 0.5 * (
+                    float(entry.get("A") or 0.0) * nutrient_engine.PROF_A.get(key, 0.0)
+                    + float(entry.get("X") or 0.0) * profile.get(key, 0.0)
+                    + float(entry.get("BZ") or 0.0) * nutrient_engine.PROF_BURST.get(key, 0.0)
+                )
+                expected += {"Ca": 30.0, "Mg": 7.5}.get(key, 0.0)
+                assert abs(ppm[key] - expected) < 0.011
+        assert engine._calculate_ppm("unknown", 1.0) == {}
+
+    def test_curve_endpoint(self):
+        from app.nutrient_routes import _engine_for_plan, _resolve_plan_payload, read_plan_curve
+
+        curve = read_plan_curve(cultivar="wedding_cake", substrate="coco", plan_id=None)["curve"]
+        engine = _engine_for_plan("coco", _resolve_plan_payload("wedding_cake", "coco", None))
+        assert [point["phase"] for point in curve] == list(engine._plan_entries)
+        for point in curve:
+            assert point["ppm"] == engine.preview_plan(point["phase"], 10.0)["ppm"]
+
+
+class TestNutrientBatchPreview:
+    """Test batched nutrient previews against one plan."""
+
+    def test_batch_matches_single_previews_in_order(self):
+        from fastapi import HTTPException
+        from app.nutrient_routes import BatchMixRequest, preview_plan_batch
+        from nutrient_engine import NutrientCalculator
+
+        engine = NutrientCalculator(substrate="coco")
+        phases = list(engine._plan_entries)
+        items = [
+            {"current_week": phases[-1], "reservoir_liters": 12.5},
+            {"current_week": phases[0], "reservoir_liters": 40, "observations": {"leaf": "dark"}},
+            {"current_week": phases[-1], "reservoir_liters": 3},
+        ]
+        results = preview_plan_batch(BatchMixRequest(substrate="coco", items=items))["results"]
+        assert len(results) == 3
+        for item, result in zip(items, results):
+            single = engine.preview_plan(item["current_week"], item["reservoir_liters"], item.get("observations"))
+            assert result == single
+
+        with pytest.raises(HTTPException) as excinfo:
+            preview_plan_batch(BatchMixRequest(substrate="coco", items=[{"current_week": "W99", "reservoir_liters": 1}]))
+        assert excinfo.value.status_code == 400
+
+
+class TestDoseSolver:
+    """Test the bounded least-squares A/X/BZ solver."""
+
+    def test_recovers_known_doses(self):
+        from nutrient_engine import NutrientCalculator, solve_doses
+
+        engine = NutrientCalculator(
+            substrate="coco",
+            plan_entries=[{"phase": "Mid Veg", "A": 0.8, "X": 0.6, "BZ": 0.1}],
+            water_profile={"Ca": 20.0, "Mg": 5.0},
+            osmosis_share=0.5,
+        )
+        target = engine._calculate_ppm("Mid Veg", 1.0)
+        result = solve_doses(target, stage="veg", water_profile={"Ca": 20.0, "Mg": 5.0}, osmosis_share=0.5)
+        assert result["doses"] == pytest.approx({"A": 0.8, "X": 0.6, "BZ": 0.1}, abs=0.002)
+        assert all(abs(value) < 0.5 for value in result["residuals"].values())
+
+    def test_bounds_and_stage_rules(self):
+        from app.nutrient_routes import DoseSolveRequest, solve_plan_doses
+
+        ripen = solve_plan_doses(DoseSolveRequest(target={"N": 200, "K": 300}, stage="ripen", maxDose=0.5))
+        assert ripen["doses"]["A"] == 0.0
+        assert all(0.0 <= dose <= 0.5 for dose in ripen["doses"].values())
+        assert set(ripen["residuals"]) == {"N", "K"}
+
+        none = solve_plan_doses(DoseSolveRequest(target={"Na": 50}))
+        assert none["doses"] == {"A": 0.0, "X": 0.0, "BZ": 0.0}
+
+
+class TestInventoryForecast:
+    """Test the season-long inventory depletion forecast."""
+
+    def test_forecast_walks_phases_and_flags_depletion(self):
+        from datetime import date
+        from app.database import db as global_db
+        from nutrient_engine import NutrientCalculator
+
+        engine = NutrientCalculator(
+            substrate="coco",
+            plan_entries=[
+                {"phase": "Mid Veg", "A": 1.0, "X": 1.0, "BZ": 0.0, "Tide": 0.0, "durationDays": 6},
+                {"phase": "W1", "A": 1.0, "X": 2.0, "BZ": 0.5, "Tide": 0.0, "durationDays": 4},
+            ],
+        )
+        global_db.update_inventory("part_a", 25.0)
+        global_db.update_inventory("part_c", 1000.0)
+        start = date(2026, 3, 1)
+        forecast = engine.forecast_depletion(10.0, mix_interval_days=2, start=start, today=start)
+
+        assert [phase["mixes"] for phase in forecast["phases"]] == [3, 2]
+        assert forecast["end"] == "2026-03-11"
+        part_a = forecast["products"]["part_a"]
+        assert part_a["projectedUse"] == 50.0
+        # 10 g per tank: the third tank on day 4 can no longer be covered
+        assert part_a["depletionDate"] == "2026-03-05"
+        assert forecast["products"]["part_c"]["depletionDate"] is None
+
+        later = engine.forecast_depletion(10.0, mix_interval_days=2, start=start, today=date(2026, 3, 7))
+        assert [phase["mixes"] for phase in later["phases"]] == [0, 2]
+        assert later["phases"][1]["consumption"] == forecast["phases"][1]["consumption"]
+        # Cached consumption is handed out as copies.
+        engine._phase_consumption("W1", 10.0)["part_a"] = -1.0
+        assert engine._phase_consumption("W1", 10.0)["part_a"] == 10.0
+
+    def test_plan_edit_recomputes_only_the_edited_phase(self, monkeypatch):
+        from datetime import date
+        import nutrient_engine
+        from nutrient_engine import NutrientCalculator
+
+        scaled = []
+        original = NutrientCalculator._scale_mix
+
+        def spy(doses, liters, adjustment):
+            scaled.append(doses["part_a"][0])
+            return original(doses, liters, adjustment)
+
+        monkeypatch.setattr(NutrientCalculator, "_scale_mix", staticmethod(spy))
+        nutrient_engine._CONSUMPTION_CACHE.clear()
+        entries = [
+            {"phase": "Mid Veg", "A": 1.0, "X": 1.0, "durationDays": 7},
+            {"phase": "W1", "A": 1.1, "X": 2.0, "Silicate": 3, "durationDays": 7},
+            {"phase": "W2", "A": 1.2, "X": 2.0, "durationDays": 7},
+        ]
+        start = date(2026, 3, 1)
+        NutrientCalculator(substrate="coco", plan_entries=entries).forecast_depletion(10.0, start=start, today=start)
+        assert sorted(scaled) == [1.0, 1.1, 1.2]
+
+        # A plan edit yields a new engine; only the edited phase misses the shared memo.
+        edited = [dict(entry) for entry in entries]
+        edited[1]["A"] = 1.3
+        scaled.clear()
+        forecast = NutrientCalculator(substrate="coco", plan_entries=edited).forecast_depletion(10.0, start=start, today=start)
+        assert scaled == [1.3]
+        assert forecast["phases"][1]["consumption"]["part_a"] == 13.0
+
+
+class TestInventoryLedger:
+    """Test the append-only inventory ledger and atomic consumption."""
+
+    def test_concurrent_consumption_loses_no_updates(self):
+        import uuid
+        from concurrent.futures import ThreadPoolExecutor
+        from app.database import db as global_db
+
+        component = f"ledger_{uuid.uuid4().hex[:8]}"
+        global_db.update_inventory(component, 100.0, 100.0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: global_db.consume_inventory({component: 2.5}, reference="test"), range(20)))
+
+        assert global_db.fetch_inventory()[component]["grams"] == pytest.approx(50.0)
+        events = global_db.fetch_inventory_events(component, limit=50)
+        assert len(events) == 21
+        assert events[-1]["kind"] == "set" and events[-1]["balanceAfter"] == 100.0
+        consumed = [event for event in events if event["kind"] == "consume"]
+        assert all(event["delta"] == pytest.approx(-2.5) for event in consumed)
+        assert events[0]["balanceAfter"] == pytest.approx(50.0)
+
+        balances = global_db.consume_inventory({component: 80.0})
+        assert balances[component] == 0.0
+        assert global_db.fetch_inventory_events(component, limit=1)[0]["delta"] == pytest.approx(-50.0)
+
+    def test_mix_tank_writes_one_event_per_component(self):
+        from app.database import db as global_db
+        from nutrient_engine import NutrientCalculator
+
+        engine = NutrientCalculator(substrate="coco", plan_entries=[{"phase": "W5", "A": 1.0, "X": 1.0, "BZ": 0.2}])
+        for key in ("part_a", "part_c", "burst"):
+            global_db.update_inventory(key, 1000.0)
+        engine.mix_tank("W5", 10.0)
+        events = global_db.fetch_inventory_events(limit=4)
+        # W5 is the plan's last flower week, so the tank also gets quench
+        assert {event["component"] for event in events} == {"part_a", "part_c", "burst", "quench"}
+        assert all(event["reference"] == "mix:W5" for event in events)
+
+
+class TestBatchConfirm:
+    """Test multi-reservoir mix confirmation."""
+
+    def test_batch_confirm_is_all_or_nothing(self):
+        from fastapi import HTTPException
+        from app.database import db as global_db
+        from app.nutrient_routes import BatchConfirmRequest, confirm_mix_batch
+
+        tanks = [
+            {"label": "room1", "current_week": "Mid Veg", "reservoir_liters": 20, "substrate": "coco"},
+            {"label": "room2", "current_week": "W3", "reservoir_liters": 30, "substrate": "coco"},
+        ]
+        for key in ("part_a", "part_b", "part_c", "burst", "kelp", "quench"):
+            global_db.update_inventory(key, 5000.0)
+
+        response = confirm_mix_batch(BatchConfirmRequest(tanks=tanks))
+        assert [result["label"] for result in response["results"]] == ["room1", "room2"]
+        used_a = sum(result["mix"]["part_a"] for result in response["results"])
+        assert response["inventory"]["part_a"]["current"] == pytest.approx(5000.0 - used_a)
+
+        global_db.update_inventory("part_a", 1.0)
+        before = global_db.fetch_inventory()
+        with pytest.raises(HTTPException) as excinfo:
+            confirm_mix_batch(BatchConfirmRequest(tanks=tanks))
+        assert excinfo.value.status_code == 409
+        assert set(excinfo.value.detail["shortages"]) == {"part_a"}
+        assert global_db.fetch_inventory() == before
+
+
+class TestPlanStoreCache:
+    """Test the versioned in-process plan store cache."""
+
+    def test_reads_reuse_snapshot_until_version_moves(self, monkeypatch):
+        from app import plan_routes
+        from app.storage import set_collection_key
+
+        plan = plan_routes.ManagedPlanPayload(
+            name="Cache Test", plan=[plan_routes.PlanEntryPayload(phase="W1", A=1.0, X=1.0)]
+        )
+        saved = plan_routes.create_plan(
+            plan_routes.PlanMutationPayload(cultivar="blue_dream", substrate="soil", plan=plan)
+        )
+
+        plan_routes.resolve_plan_for("blue_dream", "soil")
+        reads = []
+        original = plan_routes._read_store_payload
+        monkeypatch.setattr(plan_routes, "_read_store_payload", lambda: reads.append(1) or original())
+        for _ in range(3):
+            plan_id, resolved = plan_routes.resolve_plan_for("blue_dream", "soil", saved["id"])
+            assert plan_id == saved["id"] and resolved["name"] == "Cache Test"
+            plan_routes.get_active_plan_for("blue_dream", "soil")
+        assert reads == []
+
+        # A write from another worker only bumps the persisted stamp
+        set_collection_key(plan_routes.PLANS_COLLECTION, plan_routes.STORE_VERSION_KEY, "external")
+        plan_routes.resolve_plan_for("blue_dream", "soil", saved["id"])
+        plan_routes.resolve_plan_for("blue_dream", "soil", saved["id"])
+        assert reads == [1]
+
+        resolved["name"] = "mutated"
+        assert plan_routes.resolve_plan_for("blue_dream", "soil", saved["id"])[1]["name"] == "Cache Test"
+        plan_routes.delete_plan("blue_dream", "soil", saved["id"])
+
+
+class TestPlanRevisions:
+    """Test row-per-plan storage with diff-based revisions."""
+
+    def test_edit_history_and_rollback(self):
+        from app import plan_routes
+        from app.database import db as global_db
+
+        def mutation(name, a_value, plan_id=None):
+            plan = plan_routes.ManagedPlanPayload(
+                id=plan_id,
+                name=name,
+                plan=[
+                    plan_routes.PlanEntryPayload(phase="W1", A=a_value, X=1.0),
+                    plan_routes.PlanEntryPayload(phase="W2", A=1.0, X=1.0),
+                ],
+            )
+            return plan_routes.PlanMutationPayload(cultivar="amnesia_haze", substrate="rockwool", plan=plan)
+
+        created = plan_routes.create_plan(mutation("Rev Plan", 1.0))
+        plan_id = created["id"]
+        plan_routes.upsert_plan(mutation("Rev Plan", 1.4, plan_id))
+        plan_routes.upsert_plan(mutation("Renamed", 1.4, plan_id))
+
+        revisions = plan_routes.read_plan_revisions("amnesia_haze", "rockwool", plan_id)["revisions"]
+        assert [rev["revision"] for rev in revisions] == [3, 2, 1]
+        assert revisions[0]["changes"] == 1 and revisions[1]["changes"] == 1
+
+        result = plan_routes.rollback_plan(
+            plan_id, plan_routes.PlanRollbackPayload(cultivar="amnesia_haze", substrate="rockwool", revision=1)
+        )
+        assert result["revision"] == 4
+        current = plan_routes.get_plan_by_id_for("amnesia_haze", "rockwool", plan_id)
+        assert current["name"] == "Rev Plan" and current["plan"][0]["A"] == 1.0
+
+        plan_routes.delete_plan("amnesia_haze", "rockwool", plan_id)
+        assert global_db.fetch_plan_at_revision("amnesia_haze", "rockwool", plan_id, 5) is None
+        restored = global_db.fetch_plan_at_revision("amnesia_haze", "rockwool", plan_id, 3)
+        assert restored["name"] == "Renamed" and restored["plan"][0]["A"] == 1.4
+
+    def test_legacy_blob_is_migrated(self):
+        import uuid
+        from app import plan_routes
+        from app.storage import get_collection_key, set_collection_key
+
+        plan_id = uuid.uuid4().hex
+        legacy = {"id": plan_id, "name": "Legacy", "plan": [{"phase": "W1", "A": 1.0, "X": 1.0}]}
+        set_collection_key(plan_routes.PLANS_COLLECTION, plan_routes.CUSTOM_PLANS_KEY, {"wedding_cake_soil": [legacy]})
+        plan_routes._bump_store_version()
+
+        plan = plan_routes.get_plan_by_id_for("wedding_cake", "soil", plan_id)
+        assert plan["name"] == "Legacy"
+        assert get_collection_key(plan_routes.PLANS_COLLECTION, plan_routes.CUSTOM_PLANS_KEY) is None
+        plan_routes.delete_plan("wedding_cake", "soil", plan_id)
+
+
+class TestLazyDefaultPlans:
+    """Test lazy, read-only default plan construction."""
+
+    def test_import_builds_no_plans(self):
+        import subprocess
+        import sys
+
+        script = (
+            "from app import plan_routes\n"
+            "def built():\n"
+            "    plans = sum(t.materialized for t in plan_routes.DEFAULT_PLAN.values())\n"
+            "    return plans, plan_routes.BASE_PLAN_TEMPLATES.materialized\n"
+            "print(*built())\n"
+            "plan_routes.DEFAULT_PLAN['blue_dream']['coco']\n"
+            "print(*built())\n"
+        )
+        backend = Path(__file__).resolve().parents[1]
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=backend, capture_output=True, text=True, check=True
+        ).stdout.split()
+        assert output[:2] == ["0", "0"]
+        # Touching one plan builds that plan and its substrate template, nothing else.
+        assert output[2:] == ["1", "1"]
+
+    def test_defaults_are_read_only_and_copied_on_write(self):
+        from app.plan_routes import DEFAULT_PLAN, _get_default_plan
+
+        shared = DEFAULT_PLAN["blue_dream"]["coco"]
+        assert DEFAULT_PLAN["blue_dream"]["coco"] is shared
+        with pytest.raises(TypeError):
+            shared["name"] = "changed"
+
+        copy = _get_default_plan("blue_dream", "coco")
+        copy["plan"][0]["A"] = 99.0
+        assert shared["plan"][0]["A"] != 99.0
+        assert copy["plan"][0]["A"] == 99.0
+        # Blue Dream veg entries are the coco template scaled by 0.95
+        assert shared["plan"][0]["A"] == 0.76
+
+
+class TestPlanTimeline:
+    """Test the date-to-phase timeline resolver."""
+
+    def test_resolves_phases_for_many_grows(self):
+        from app import plan_routes
+
+        grows = [
+            {"id": "g1", "cultivar": "wedding_cake", "substrate": "coco", "startDate": "2026-01-01", "planId": "default"},
+            {"id": "g2", "cultivar": "wedding_cake", "substrate": "coco", "startDate": "2026-03-01", "planId": "default"},
+            {"id": "g3", "cultivar": "wedding_cake", "substrate": "coco", "planId": "default"},
+        ]
+        # Coco default: Early Veg 4 days, Mid Veg 5 days, ...
+        response = plan_routes.resolve_timelines(plan_routes.TimelineRequest(grows=grows, date="2026-01-06"))
+        first, second, third = response["grows"]
+        assert first["status"] == "active" and first["phase"] == "Mid Veg"
+        assert first["dayInPhase"] == 2 and first["phaseDays"] == 5
+        assert first["nextPhase"] == "Late Veg" and first["nextTransition"] == "2026-01-10"
+        assert second["status"] == "pending" and second["nextTransition"] == "2026-03-01"
+        assert third["status"] == "unscheduled"
+
+        finished = plan_routes.resolve_timelines(plan_routes.TimelineRequest(grows=grows[:1], date="2027-01-01"))
+        assert finished["grows"][0]["status"] == "finished"
+
+        store = plan_routes._plan_store()
+        _, timeline = plan_routes._timeline_for(store, "wedding_cake", "coco", "default", "2026-01-01")
+        assert plan_routes._timeline_for(store, "wedding_cake", "coco", "default", "2026-01-01")[1] is timeline
+        assert plan_routes._timeline_for(store, "wedding_cake", "coco", "default", "2026-01-02")[1] is not timeline
+
+    def test_impossible_dates_are_rejected_not_500(self, monkeypatch):
+        import uuid
+        from fastapi import HTTPException
+        from app import plan_routes
+
+        grow = {"id": "g1", "cultivar": "wedding_cake", "substrate": "coco", "startDate": "2026-02-30", "planId": "default"}
+        with pytest.raises(HTTPException) as excinfo:
+            plan_routes.resolve_timelines(plan_routes.TimelineRequest(grows=[grow], date="2026-02-30"))
+        assert excinfo.value.status_code == 400
+
+        response = plan_routes.resolve_timelines(plan_routes.TimelineRequest(grows=[grow], date="2026-03-01"))
+        assert response["grows"][0]["status"] == "unscheduled"
+
+        # A stored plan saved before dates were validated.
+        plan_id = f"legacy-{uuid.uuid4().hex[:8]}"
+        monkeypatch.setattr(plan_routes, "_find_plan", lambda *args: {"id": plan_id, "startDate": "2025-13-01", "plan": []})
+        assert plan_routes._timeline_for(plan_routes._plan_store(), "wedding_cake", "coco", plan_id, None) == (plan_id, None)
+        assert plan_routes._sanitize_date("2026-2-3T10:00") == "2026-02-03"
+
+
+class TestAiResponseCache:
+    """Test the content-hash Gemini response cache."""
+
+    def test_repeated_prompts_hit_cache_unless_bypassed(self, monkeypatch):
+        import asyncio
+        import types as pytypes
+        import uuid
+        from app import ai_cache, ai_routes
+
+        calls = []
+
+        def generate_content(**kwargs):
+            calls.append(kwargs)
+            return pytypes.SimpleNamespace(text='{"stage":"Flowering","confidence":"High","reasoning":"ok"}')
+
+        fake = pytypes.SimpleNamespace(models=pytypes.SimpleNamespace(generate_content=generate_content))
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_routes, "_client", lambda timeout=None: fake)
+        ai_cache.clear()
+
+        phase = f"Phase {uuid.uuid4().hex[:6]}"
+        payload = ai_routes.StagePayload(phase=phase, daysSinceStart=30)
+        first = asyncio.run(ai_routes.analyze_stage(payload))
+        second = asyncio.run(ai_routes.analyze_stage(payload))
+        assert first == second and first["stage"] == "Flowering"
+        assert len(calls) == 1
+
+        asyncio.run(ai_routes.analyze_stage(ai_routes.StagePayload(phase=phase, daysSinceStart=30, bypassCache=True)))
+        asyncio.run(ai_routes.analyze_stage(ai_routes.StagePayload(phase=phase, daysSinceStart=31)))
+        assert len(calls) == 3
+
+        stats = ai_routes.read_cache_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["bypassed"] == 1
+        assert stats["entries"] == 2 and stats["hitRate"] == pytest.approx(1 / 3, abs=1e-3)
+
+    def test_eviction_keeps_most_recently_used(self):
+        from app.database import db as shared_db
+
+        shared_db.clear_ai_responses()
+        bounds = {"ttl_seconds": 60, "max_entries": 2, "max_bytes": 1_000_000}
+        shared_db.put_ai_response("a", "m", "one", now=100.0, **bounds)
+        shared_db.put_ai_response("b", "m", "two", now=101.0, **bounds)
+        assert shared_db.get_ai_response("a", 102.0) == "one"
+        shared_db.put_ai_response("c", "m", "three", now=103.0, **bounds)
+        assert shared_db.get_ai_response("b", 104.0) is None
+        assert shared_db.get_ai_response("a", 104.0) == "one"
+        assert shared_db.get_ai_response("c", 200.0) is None
+
+
+class TestGeminiClientReuse:
+    """Test long-lived Gemini clients and the dedicated call pool."""
+
+    def test_client_shared_across_requests_and_retries(self, monkeypatch):
+        import asyncio
+        import threading
+        import types as pytypes
+        from app import ai_routes
+
+        created = []
+        attempts = []
+
+        class FakeClient:
+            def __init__(self, api_key, http_options):
+                created.append((api_key, http_options.timeout))
+                self.models = pytypes.SimpleNamespace(generate_content=self._generate)
+
+            def _generate(self, **kwargs):
+                attempts.append(threading.current_thread().name)
+                if len(attempts) == 1:
+                    raise ConnectionResetError("dropped")
+                return pytypes.SimpleNamespace(text="fresh answer")
+
+        monkeypatch.setattr(ai_routes.genai, "Client", FakeClient)
+        monkeypatch.setattr(ai_routes, "_clients", {})
+        monkeypatch.setenv("GEMINI_API_KEY", "key-one")
+        monkeypatch.setenv("GEMINI_BACKOFF_INITIAL", "0")
+
+        assert ai_routes._client(30) is ai_routes._client(30)
+        assert ai_routes._client(30) is not ai_routes._client(60)
+        assert len(created) == 2
+
+        text = asyncio.run(
+            ai_routes._generate_text_with_retry("ping", max_tokens=16, temperature=0.0, request_timeout=30, bypass_cache=True)
+        )
+        assert text == "fresh answer"
+        assert len(attempts) == 2 and len(created) == 2
+        # Blocking SDK calls run on the bounded Gemini pool, not the default executor.
+        assert all(name.startswith("gemini") for name in attempts)
+
+        monkeypatch.setenv("GEMINI_API_KEY", "key-two")
+        ai_routes._client(30)
+        assert set(ai_routes._clients) == {("key-two", 30000)}
+
+
+class TestAiScheduler:
+    """Test AI admission control: limits, priorities, coalescing."""
+
+    def test_priority_coalescing_and_queue_limit(self):
+        import asyncio
+        from app.ai_scheduler import AiScheduler, QueueFullError
+
+        async def scenario():
+            scheduler = AiScheduler(max_concurrency=1, max_queue=2)
+            gate = asyncio.Event()
+            order = []
+            calls = {"a": 0}
+
+            async def job(name):
+                if name == "a":
+                    calls["a"] += 1
+                    await gate.wait()
+                order.append(name)
+                return name
+
+            first = asyncio.create_task(scheduler.run(lambda: job("a"), key="a"))
+            await asyncio.sleep(0)
+            duplicate = asyncio.create_task(scheduler.run(lambda: job("a"), key="a"))
+            batch = asyncio.create_task(scheduler.run(lambda: job("b"), key="b", priority="batch"))
+            await asyncio.sleep(0)
+            interactive = asyncio.create_task(scheduler.run(lambda: job("c"), key="c"))
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError) as excinfo:
+                await scheduler.run(lambda: job("d"), key="d")
+            assert excinfo.value.retry_after >= 1
+            assert scheduler.stats()["waiting"] == 2
+
+            gate.set()
+            results = await asyncio.gather(first, duplicate, batch, interactive)
+            stats = scheduler.stats()
+            return results, order, calls, stats
+
+        results, order, calls, stats = asyncio.run(scenario())
+        assert results == ["a", "a", "b", "c"]
+        assert order == ["a", "c", "b"]
+        assert calls["a"] == 1
+        assert stats["coalesced"] == 1 and stats["rejected"] == 1
+        assert stats["active"] == 0 and stats["inflightKeys"] == 0
+
+    def test_full_queue_maps_to_503_with_retry_after(self, monkeypatch):
+        import asyncio
+        from fastapi import HTTPException
+        from app import ai_routes
+        from app.ai_scheduler import QueueFullError
+
+        async def reject(factory, *, key=None, priority="interactive"):
+            raise QueueFullError(7)
+
+        monkeypatch.setattr(ai_routes.scheduler, "run", reject)
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(ai_routes._schedule(lambda: None, "k", "interactive"))
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.headers["Retry-After"] == "7"
+
+
+class TestAiStreaming:
+    """Test SSE streaming of AI responses."""
+
+    def _events(self, response):
+        import asyncio
+        import json
+
+        async def collect():
+            return [chunk async for chunk in response.body_iterator]
+
+        events = []
+        for block in asyncio.run(collect()):
+            name, data = block.strip().split("\n", 1)
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    def test_json_stream_emits_deltas_then_parsed_result(self, monkeypatch):
+        import asyncio
+        import base64
+        import types as pytypes
+        from app import ai_cache, ai_routes
+
+        chunks = ['```json\n{"potentialIssues":[{"issue":"Tip', ' burn","confidence":"High"}],', '"recommendedActions":[],"disclaimer":"}{"}\n```']
+        streams = []
+
+        def generate_content_stream(**kwargs):
+            streams.append(kwargs)
+            for text in chunks:
+                yield pytypes.SimpleNamespace(text=text)
+
+        fake = pytypes.SimpleNamespace(models=pytypes.SimpleNamespace(generate_content_stream=generate_content_stream))
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_routes, "_client", lambda timeout=None: fake)
+        ai_cache.clear()
+
+        image = base64.b64encode(b"stream-test-image").decode()
+        payload = ai_routes.AnalyzeImagePayload(imagesBase64=[image], userNotes="stream")
+        events = self._events(asyncio.run(ai_routes.analyze_image_stream(payload)))
+        names = [name for name, _ in events]
+        assert names == ["start", "delta", "delta", "delta", "result"]
+        assert events[-1][1]["potentialIssues"][0]["issue"] == "Tip burn"
+
+        # The completed answer is cached and shared with the non-streaming endpoint.
+        assert asyncio.run(ai_routes.analyze_image(payload))["disclaimer"] == "}{"
+        again = self._events(asyncio.run(ai_routes.analyze_image_stream(payload)))
+        assert [name for name, _ in again] == ["start", "delta", "result"]
+        assert len(streams) == 1
+
+    def test_slow_stream_does_not_block_event_loop(self, monkeypatch):
+        import asyncio
+        import threading
+        import time
+        import types as pytypes
+        from app import ai_routes
+
+        threads = []
+
+        def generate_content_stream(**kwargs):
+            threads.append(threading.current_thread().name)
+            for index in range(4):
+                time.sleep(0.05)  # blocking read, as the SDK's iter_lines() does
+                yield pytypes.SimpleNamespace(text=str(index))
+
+        fake = pytypes.SimpleNamespace(models=pytypes.SimpleNamespace(generate_content_stream=generate_content_stream))
+        monkeypatch.setattr(ai_routes, "_client", lambda timeout=None: fake)
+
+        async def scenario():
+            ticks = 0
+            done = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not done.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            task = asyncio.create_task(ticker())
+            stream = await ai_routes.GeminiProvider().generate_stream(
+                model="m", contents=None, config=None, timeout=1.0
+            )
+            texts = [chunk.text async for chunk in stream]
+            done.set()
+            await task
+            return texts, ticks
+
+        texts, ticks = asyncio.run(scenario())
+        assert texts == ["0", "1", "2", "3"]
+        assert threads and threads[0].startswith("gemini")
+        # ~200 ms of blocking reads; a stalled loop would have ticked about once.
+        assert ticks >= 8
+
+    def test_stream_errors_reach_the_consumer(self, monkeypatch):
+        import asyncio
+        import types as pytypes
+        from app import ai_routes
+
+        def generate_content_stream(**kwargs):
+            yield pytypes.SimpleNamespace(text="partial")
+            raise RuntimeError("connection reset")
+
+        fake = pytypes.SimpleNamespace(models=pytypes.SimpleNamespace(generate_content_stream=generate_content_stream))
+        monkeypatch.setattr(ai_routes, "_client", lambda timeout=None: fake)
+
+        async def consume():
+            received = []
+            stream = await ai_routes.GeminiProvider().generate_stream(
+                model="m", contents=None, config=None, timeout=1.0
+            )
+            try:
+                async for chunk in stream:
+                    received.append(chunk.text)
+            except RuntimeError as exc:
+                return received, str(exc)
+            return received, None
+
+        assert asyncio.run(consume()) == (["partial"], "connection reset")
+
+    def test_validator_flags_malformed_json_early(self):
+        from app.ai_routes import _JsonStreamValidator
+
+        validator = _JsonStreamValidator()
+        validator.feed('{"a":[1,2}')
+        assert validator.error == "Mismatched '}'"
+
+        prose = _JsonStreamValidator()
+        prose.feed("Sure! Here is")
+        assert prose.error and not prose.started
+
+        ok = _JsonStreamValidator()
+        for piece in ['``', '`json\n{"a":"[\\"', '"}', "\n```"]:
+            ok.feed(piece)
+        assert ok.complete and ok.error is None
+
+
+class TestImageUploads:
+    """Test multipart image uploads and off-loop decoding."""
+
+    def _body(self, boundary, parts):
+        chunks = []
+        for headers, data in parts:
+            chunks.append(f"--{boundary}\r\n{headers}\r\n\r\n".encode() + data + b"\r\n")
+        chunks.append(f"--{boundary}--\r\n".encode())
+        return b"".join(chunks)
+
+    def test_streaming_parser_handles_split_chunks_and_limits(self):
+        import asyncio
+        from fastapi import HTTPException
+        from app.uploads import read_multipart
+
+        png = b"\x89PNG\r\n\x1a\n" + b"\r\n--" * 50
+        body = self._body("xyz", [
+            ('Content-Disposition: form-data; name="payload"', b'{"lang":"de"}'),
+            ('Content-Disposition: form-data; name="images"; filename="a.png"\r\nContent-Type: image/png', png),
+        ])
+        consumed = []
+
+        async def chunks(size, data):
+            for start in range(0, len(data), size):
+                consumed.append(start)
+                yield data[start:start + size]
+
+        for size in (1, 7, len(body)):
+            form = asyncio.run(read_multipart(chunks(size, body), b"xyz", max_file_bytes=1000, max_files=2))
+            assert form.fields == {"payload": '{"lang":"de"}'}
+            assert form.files[0].data == png and form.files[0].content_type == "image/png"
+
+        consumed.clear()
+        big = self._body("xyz", [('Content-Disposition: form-data; name="images"; filename="b.jpg"', b"\xff" * 5000)])
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(read_multipart(chunks(100, big), b"xyz", max_file_bytes=1000, max_files=2))
+        assert excinfo.value.status_code == 413
+        assert len(consumed) < len(big) // 100
+
+    def test_upload_endpoint_sniffs_types(self, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app import ai_routes
+
+        seen = {}
+
+        async def fake_analysis(payload, images):
+            seen["lang"] = payload.lang
+            seen["images"] = images
+            return {"potentialIssues": [], "recommendedActions": [], "disclaimer": "ok"}
+
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_routes, "_run_image_analysis", fake_analysis)
+        app = FastAPI()
+        app.include_router(ai_routes.router)
+        client = TestClient(app)
+
+        jpeg = b"\xff\xd8\xff\xe0" + b"0" * 32
+        body = self._body("b0undary", [
+            ('Content-Disposition: form-data; name="payload"', b'{"lang":"de","userNotes":"x"}'),
+            ('Content-Disposition: form-data; name="images"; filename="p.jpg"\r\nContent-Type: application/octet-stream', jpeg),
+        ])
+        response = client.post(
+            "/api/gemini/analyze-image/upload",
+            content=body,
+            headers={"Content-Type": "multipart/form-data; boundary=b0undary"},
+        )
+        assert response.status_code == 200
+        assert seen == {"lang": "de", "images": [(jpeg, "image/jpeg")]}
+
+        bogus = self._body("b0undary", [('Content-Disposition: form-data; name="images"; filename="x.gif"\r\nContent-Type: image/gif', b"GIF89a")])
+        response = client.post(
+            "/api/gemini/analyze-image/upload",
+            content=bogus,
+            headers={"Content-Type": "multipart/form-data; boundary=b0undary"},
+        )
+        assert response.status_code == 400
+
+        # A declared image type does not rescue bytes that are not an image.
+        spoofed = self._body("b0undary", [('Content-Disposition: form-data; name="images"; filename="x.png"\r\nContent-Type: image/png', b"<script>alert(1)</script>")])
+        response = client.post(
+            "/api/gemini/analyze-image/upload",
+            content=spoofed,
+            headers={"Content-Type": "multipart/form-data; boundary=b0undary"},
+        )
+        assert response.status_code == 400
+
+    def test_large_journal_history_fits_payload_field(self, monkeypatch):
+        import json
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app import ai_routes
+
+        seen = {}
+
+        async def fake_analysis(payload, images):
+            seen["entries"] = len(payload.journalHistory or [])
+            return {"potentialIssues": [], "recommendedActions": [], "disclaimer": "ok"}
+
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(ai_routes, "_run_image_analysis", fake_analysis)
+        app = FastAPI()
+        app.include_router(ai_routes.router)
+        client = TestClient(app)
+
+        history = [
+            {"id": f"e{index}", "date": f"2026-01-{index % 28 + 1:02d}", "phase": "W3", "notes": "n" * 4000}
+            for index in range(70)
+        ]
+        meta = json.dumps({"lang": "en", "journalHistory": history}).encode()
+        assert len(meta) > 256 * 1024
+        jpeg = b"\xff\xd8\xff\xe0" + b"0" * 32
+
+        def post(payload_bytes):
+            body = self._body("b0undary", [
+                ('Content-Disposition: form-data; name="payload"', payload_bytes),
+                ('Content-Disposition: form-data; name="images"; filename="p.jpg"\r\nContent-Type: image/jpeg', jpeg),
+            ])
+            return client.post(
+                "/api/gemini/analyze-image/upload",
+                content=body,
+                headers={"Content-Type": "multipart/form-data; boundary=b0undary"},
+            )
+
+        response = post(meta)
+        assert response.status_code == 200 and seen["entries"] == 70
+
+        # The payload field keeps its own, configurable ceiling.
+        monkeypatch.setattr(ai_routes, "MAX_UPLOAD_PAYLOAD_BYTES", 100_000)
+        assert post(meta).status_code == 413
+
+    def test_base64_images_decode_off_loop(self, monkeypatch):
+        import asyncio
+        import base64
+        import threading
+        from app import ai_routes
+
+        threads = []
+        original = ai_routes._decode_data_uri_or_b64
+
+        def spy(value):
+            threads.append(threading.current_thread().name)
+            return original(value)
+
+        monkeypatch.setattr(ai_routes, "_decode_data_uri_or_b64", spy)
+        encoded = "data:image/png;base64," + base64.b64encode(b"abc").decode()
+        decoded = asyncio.run(ai_routes._decode_images([encoded, base64.b64encode(b"def").decode()]))
+        assert decoded == [(b"abc", "image/png"), (b"def", "image/jpeg")]
+        assert all(name.startswith("image-decode") for name in threads)
+
+
+class TestImagePipeline:
+    """Test image pre-processing reuse and the Pillow-less fallback."""
+
+    def test_processed_variants_cached_by_source_hash(self, monkeypatch):
+        import asyncio
+        import base64
+        from concurrent.futures import ThreadPoolExecutor
+        from app import image_pipeline
+
+        calls = []
+
+        def fake_process(data, mime_type, max_edge, fmt, quality):
+            calls.append(data)
+            return b"small:" + data[:4], "image/webp"
+
+        pool = ThreadPoolExecutor(max_workers=2)
+        monkeypatch.setattr(image_pipeline, "available", lambda: True)
+        monkeypatch.setattr(image_pipeline, "_process_image", fake_process)
+        monkeypatch.setattr(image_pipeline, "_executor", lambda: pool)
+        image_pipeline.reset_cache()
+
+        first = asyncio.run(image_pipeline.preprocess_images([(b"photo-one", "image/jpeg"), (b"photo-two", "image/png")]))
+        assert first == [(b"small:phot", "image/webp"), (b"small:phot", "image/webp")]
+        again = asyncio.run(image_pipeline.preprocess_images([(b"photo-one", "image/jpeg")]))
+        assert again == first[:1] and len(calls) == 2
+
+        # Re-submitting already processed output is a cache hit, not a re-encode.
+        uri = "data:image/webp;base64," + base64.b64encode(b"small:phot").decode()
+        assert image_pipeline.preprocess_data_uris([uri, "https://example/img.jpg"]) == [uri, "https://example/img.jpg"]
+        assert len(calls) == 2
+        pool.shutdown()
+
+    def test_large_photo_is_downscaled_and_stripped(self):
+        import asyncio
+        import io
+        pytest.importorskip("PIL")
+        from PIL import Image
+        from app import image_pipeline
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90°, as phone cameras tag portrait shots
+        exif[0x010F] = "GrowCam"
+        source = io.BytesIO()
+        Image.new("RGB", (4000, 3000), (40, 120, 40)).save(source, format="JPEG", quality=95, exif=exif)
+        data = source.getvalue()
+
+        image_pipeline.reset_cache()
+        [(output, mime_type)] = asyncio.run(image_pipeline.preprocess_images([(data, "image/jpeg")]))
+        assert mime_type == {"webp": "image/webp", "jpeg": "image/jpeg"}[image_pipeline.OUTPUT_FORMAT]
+        with Image.open(io.BytesIO(output)) as result:
+            assert result.format.lower() == image_pipeline.OUTPUT_FORMAT
+            assert max(result.size) <= image_pipeline.MAX_EDGE
+            assert result.size[1] > result.size[0]  # orientation applied before stripping
+            assert not result.info.get("exif") and not dict(result.getexif())
+        assert len(output) < len(data)
+
+    def test_broken_worker_pool_is_replaced(self, monkeypatch):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        from app import image_pipeline
+
+        class BrokenPool:
+            def submit(self, *args, **kwargs):
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker died"))
+                return future
+
+        broken = BrokenPool()
+        monkeypatch.setattr(image_pipeline, "available", lambda: True)
+        monkeypatch.setattr(image_pipeline, "_pool", broken)
+        image_pipeline.reset_cache()
+
+        images = [(b"crashes-the-worker", "image/jpeg")]
+        assert image_pipeline.preprocess_images_sync(images) == images
+        assert image_pipeline._pool is None
+
+    def test_passthrough_without_pillow(self, monkeypatch):
+        import asyncio
+        from app import image_pipeline
+
+        monkeypatch.setattr(image_pipeline, "Image", None)
+        images = [(b"raw", "image/jpeg")]
+        assert asyncio.run(image_pipeline.preprocess_images(images)) == images
+        assert image_pipeline.preprocess_data_uris(["data:image/png;base64,AAAA"]) == ["data:image/png;base64,AAAA"]
+
+
+class TestJournalContext:
+    """Test the token-budgeted journal history builder."""
+
+    def _entries(self, count):
+        from datetime import date, timedelta
+
+        start = date(2026, 1, 1)
+        return [
+            {
+                "id": f"e{index}",
+                "date": (start + timedelta(days=index)).isoformat(),
+                "phase": "Veg" if index < 30 else "Flower",
+                "entryType": "Observation",
+                "notes": f"note {index} " + "leafy " * 40,
+                "metrics": {"ec": 1.0 + index / 100, "ph": 6.0, "temp": None},
+            }
+            for index in range(count)
+        ]
+
+    def test_recent_verbatim_older_weekly_within_budget(self):
+        from app.journal_context import build_journal_context, estimate_tokens
+
+        entries = self._entries(60)
+        context = build_journal_context(entries, budget=600)
+        assert estimate_tokens(context) <= 600
+        lines = context.splitlines()
+        assert lines[0].startswith("- 2026-03-01 | Flower | Observation | ec=1.59 ph=6")
+        assert "Earlier weeks:" in lines
+        weekly = lines[lines.index("Earlier weeks:") + 1]
+        assert weekly.startswith("- 2026-W") and "min/avg/max ec=" in weekly
+        assert "temp" not in context
+
+        tight = build_journal_context(entries, budget=120)
+        assert estimate_tokens(tight) <= 120 and "older weeks omitted" in tight
+
+    def test_context_cached_per_grow_and_last_entry(self, monkeypatch):
+        from app import journal_context as module
+
+        module.reset_cache()
+        builds = []
+        original = module.build_journal_context
+        monkeypatch.setattr(module, "build_journal_context", lambda entries, budget: builds.append(1) or original(entries, budget))
+        entries = self._entries(10)
+        first = module.journal_context(entries, "grow-a")
+        assert module.journal_context(list(reversed(entries)), "grow-a") == first
+        assert len(builds) == 1
+        module.journal_context(entries + self._entries(11)[10:], "grow-a")
+        assert len(builds) == 2
+
+    def test_image_prompt_includes_history(self):
+        from app import ai_routes
+
+        payload = ai_routes.AnalyzeImagePayload(imagesBase64=["x"], journalHistory=self._entries(3), growId="g")
+        prompt = ai_routes._build_image_prompt(payload)
+        assert "Journal history (newest first):\n- 2026-01-03" in prompt
+
+
+class TestFakeAiProvider:
+    """Test the offline stand-in provider behind the AI generators."""
+
+    def _use_fake(self, monkeypatch, **env):
+        from app import ai_cache, ai_routes
+
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        monkeypatch.setenv("AI_PROVIDER", "fake")
+        monkeypatch.setenv("FAKE_AI_LATENCY_MS", "0")
+        monkeypatch.setenv("GEMINI_BACKOFF_INITIAL", "0")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setattr(ai_routes, "_providers", {})
+        monkeypatch.setattr(ai_routes, "_read_addon_options", lambda: {})
+        ai_cache.clear()
+        return ai_routes
+
+    def test_endpoints_answer_offline_and_deterministically(self, monkeypatch):
+        import asyncio
+        ai_routes = self._use_fake(monkeypatch)
+
+        payload = ai_routes.StagePayload(phase="Fake week 3", daysSinceStart=21, bypassCache=True)
+        first = asyncio.run(ai_routes.analyze_stage(payload))
+        second = asyncio.run(ai_routes.analyze_stage(payload))
+        assert first == second
+        assert first["stage"] == "Vegetative" and first["reasoning"].startswith("fake response ")
+
+        text = asyncio.run(ai_routes.analyze_text(ai_routes.AnalyzeTextPayload(text="hello offline world")))
+        assert text["result"].endswith("hello offline world")
+        assert ai_routes.read_provider_stats()["completed"] == 3
+
+    def test_injected_429s_are_retried_then_surface(self, monkeypatch):
+        import asyncio
+        from fastapi import HTTPException
+        from app.ai_providers import FakeProvider
+
+        ai_routes = self._use_fake(monkeypatch, FAKE_AI_429_RATE="1", GEMINI_MAX_RETRIES="3")
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(ai_routes._generate_text_with_retry("busy", max_tokens=8, temperature=0.0))
+        assert excinfo.value.status_code == 502
+        stats = ai_routes.read_provider_stats()
+        assert stats["calls"] == 3 and stats["rateLimited"] == 3
+
+        def outcomes(seed):
+            provider = FakeProvider(latency_ms=0, error_rate=0.3, rate_limit_rate=0.2, seed=seed)
+            contents = ai_routes.types.Content(role="user", parts=[ai_routes.types.Part.from_text(text="x")])
+            results = []
+            for _ in range(20):
+                try:
+                    asyncio.run(provider.generate(model="m", contents=contents, config=None, timeout=1))
+                    results.append(200)
+                except Exception as exc:
+                    results.append(exc.code)
+            return results
+
+        assert outcomes(7) == outcomes(7)
+        assert {429, 503, 200} <= set(outcomes(7))
+
+    def test_incomplete_provider_cannot_be_instantiated(self):
+        from app.ai_providers import AiProvider
+
+        class TextOnly(AiProvider):
+            async def generate(self, *, model, contents, config, timeout):
+                return None
+
+        with pytest.raises(TypeError):
+            TextOnly()
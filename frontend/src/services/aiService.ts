@@ -30,28 +30,25 @@ export interface ServiceError {
 
 export type ServiceResult<T> = { ok: true; data: T } | { ok: false; error: ServiceError };
 
+export interface AiRequestOptions {
+  /** Skip the server-side response cache and fetch a fresh answer. */
+  bypassCache?: boolean;
+  /** Background work yields to interactive requests in the server's AI queue. */
+  priority?: "interactive" | "batch";
+}
+
 // Maximum total file size: 10MB
 const MAX_TOTAL_IMAGE_SIZE_BYTES = 10 * 1024 * 1024;
+// The server condenses older entries into weekly summaries; a season of daily entries is plenty.
+const MAX_HISTORY_ENTRIES = 365;
 
-const fileToBase64 = (file: File): Promise<string> =>
-  new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.onload = () => {
-      const result = reader.result as string;
-      if (!result || !result.includes(',')) {
-        reject(new Error("Invalid file data"));
-        return;
-      }
-      const base64 = result.split(",")[1];
-      if (!base64) {
-        reject(new Error("Failed to extract base64 data"));
-        return;
-      }
-      resolve(base64);
-    };
-    reader.onerror = () => reject(reader.error ?? new Error("Failed to read file"));
-    reader.readAsDataURL(file);
-  });
+/** Newest entries only, without images or earlier AI answers, which never reach the prompt. */
+const trimJournalHistory = (history?: JournalEntry[]) =>
+  history
+    ?.slice()
+    .sort((a, b) => b.date.localeCompare(a.date))
+    .slice(0, MAX_HISTORY_ENTRIES)
+    .map(({ images: _images, aiAnalysisResult: _analysis, ...entry }) => entry);
 
 const createError = (
   code: string,
@@ -98,19 +95,7 @@ export const analyzePlantImage = async (
       return { ok: false, error: createError("IMAGE_TOO_LARGE", message) };
     }
 
-    let imagesBase64: string[];
-    try {
-      imagesBase64 = await Promise.all(imageFiles.map(fileToBase64));
-    } catch (err) {
-      const details = err instanceof Error ? err.message : String(err);
-      const message =
-        lang === "de"
-          ? "Die ausgewählten Fotos konnten nicht verarbeitet werden."
-          : "The selected photos could not be processed.";
-      return { ok: false, error: createError("IMAGE_ENCODING_FAILED", message, details) };
-    }
-
-    if (!imagesBase64.length) {
+    if (!imageFiles.length) {
       const message = lang === "de" ? "Bitte wähle mindestens ein Foto aus." : "Please select at least one photo.";
       return { ok: false, error: createError("NO_IMAGES_SELECTED", message) };
     }
@@ -118,19 +103,26 @@ export const analyzePlantImage = async (
     let response: Response;
     const normalizedNotes = typeof userNotes === "string" ? userNotes.trim() : "";
 
+    // Raw file parts avoid base64 inflation; the browser sets the multipart boundary.
+    const form = new FormData();
+    form.append(
+      "payload",
+      JSON.stringify({
+        inputs,
+        fullPhaseName,
+        userNotes: normalizedNotes || undefined,
+        lang,
+        ppm,
+        journalHistory: trimJournalHistory(journalHistory),
+        growId: journalHistory?.find((entry) => entry.growId)?.growId,
+      })
+    );
+    imageFiles.forEach((file) => form.append("images", file, file.name));
+
     try {
-      response = await fetch(apiUrl("/api/gemini/analyze-image"), {
+      response = await fetch(apiUrl("/api/gemini/analyze-image/upload"), {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          imagesBase64,
-          inputs,
-          fullPhaseName,
-          userNotes: normalizedNotes || undefined,
-          lang,
-          ppm,
-          journalHistory,
-        }),
+        body: form,
       });
     } catch (err) {
       const details = err instanceof Error ? err.message : String(err);
@@ -234,6 +226,8 @@ export const generateSteeringCopilot = async (payload: {
   constraints?: string[];
   existingRules?: string[];
   existingAlerts?: string[];
+  bypassCache?: boolean;
+  priority?: "interactive" | "batch";
 }): Promise<ServiceResult<SteeringCopilotResponse>> => {
   try {
     const response = await fetch(apiUrl("/api/gemini/steering-copilot"), {
@@ -259,7 +253,8 @@ export const generateSteeringCopilot = async (payload: {
 export const analyzeGrowthStage = async (
   phase: Phase,
   daysSinceStart: number,
-  lang: Language
+  lang: Language,
+  options: AiRequestOptions = {}
 ): Promise<ServiceResult<StageAnalysisResult>> => {
   const fallbackMessage =
     lang === "de"
@@ -272,7 +267,7 @@ export const analyzeGrowthStage = async (
       response = await fetch(apiUrl("/api/gemini/analyze-stage"), {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ phase, daysSinceStart, lang }),
+        body: JSON.stringify({ phase, daysSinceStart, lang, bypassCache: options.bypassCache, priority: options.priority }),
       });
     } catch (err) {
       const details = err instanceof Error ? err.message : String(err);
@@ -357,12 +352,15 @@ export const analyzeGrowthStage = async (
 };
 
 
-export const analyzeText = async (text: string): Promise<ServiceResult<{ result: string }>> => {
+export const analyzeText = async (
+  text: string,
+  options: AiRequestOptions = {}
+): Promise<ServiceResult<{ result: string }>> => {
   try {
     const response = await fetch(apiUrl("/api/gemini/analyze-text"), {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ text }),
+      body: JSON.stringify({ text, bypassCache: options.bypassCache, priority: options.priority }),
     });
 
     if (!response.ok) {
@@ -387,3 +385,82 @@ export const analyzeText = async (text: string): Promise<ServiceResult<{ result:
     return { ok: false, error: createError("UNEXPECTED_ERROR", "Text analysis failed", message) };
   }
 };
+
+export interface AiStreamHandlers {
+  /** Called with each text chunk as it arrives. */
+  onDelta?: (text: string) => void;
+  /** Called once if streamed JSON output stops being well-formed. */
+  onInvalid?: (message: string) => void;
+}
+
+const parseEventBlock = (block: string): { event: string; data: unknown } | null => {
+  let event = "message";
+  const dataLines: string[] = [];
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) dataLines.push(line.slice(5).trimStart());
+  }
+  if (!dataLines.length) return null;
+  try {
+    return { event, data: JSON.parse(dataLines.join("\n")) };
+  } catch {
+    return null;
+  }
+};
+
+/** POST to a Server-Sent Events endpoint and resolve with its final `result` event. */
+export const streamAiRequest = async <T>(
+  path: string,
+  body: unknown,
+  handlers: AiStreamHandlers = {}
+): Promise<ServiceResult<T>> => {
+  let response: Response;
+  try {
+    response = await fetch(apiUrl(path), {
+      method: "POST",
+      headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+      body: JSON.stringify(body),
+    });
+  } catch (err) {
+    const details = err instanceof Error ? err.message : String(err);
+    return { ok: false, error: createError("NETWORK_ERROR", "Streaming request failed", details) };
+  }
+  if (!response.ok || !response.body) {
+    const details = await response.text().catch(() => undefined);
+    return { ok: false, error: createError("PROXY_ERROR", "Streaming request failed", details, response.status) };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary >= 0) {
+      const parsed = parseEventBlock(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+      if (!parsed) continue;
+      const data = parsed.data as any;
+      if (parsed.event === "delta" && typeof data?.text === "string") handlers.onDelta?.(data.text);
+      else if (parsed.event === "invalid") handlers.onInvalid?.(String(data?.error ?? ""));
+      else if (parsed.event === "error") {
+        return { ok: false, error: createError("BACKEND_ERROR", String(data?.error ?? "Streaming failed")) };
+      } else if (parsed.event === "result") return { ok: true, data: data as T };
+    }
+    if (done) break;
+  }
+  return { ok: false, error: createError("INVALID_RESPONSE", "Stream ended without a result") };
+};
+
+export const streamAnalyzeText = (
+  text: string,
+  handlers: AiStreamHandlers = {},
+  options: AiRequestOptions = {}
+): Promise<ServiceResult<{ result: string }>> =>
+  streamAiRequest<{ result: string }>(
+    "/api/gemini/analyze-text/stream",
+    { text, bypassCache: options.bypassCache, priority: options.priority },
+    handlers
+  );
@@ -24,6 +24,16 @@ export interface MixResponse {
   ppm?: Record<string, number>;
 }
 
+export interface PlanCurvePoint {
+  phase: string;
+  stage: string;
+  ppm: Record<string, number>;
+}
+
+export interface PlanCurveResponse {
+  curve: PlanCurvePoint[];
+}
+
 export interface MixConfirmResponse extends MixResponse {
   inventory: Record<string, InventoryItem>;
   alerts: InventoryAlert[];
@@ -74,6 +84,58 @@ export const fetchNutrientPlan = async (payload: MixRequest): Promise<MixRespons
   });
 };
 
+export interface BatchMixRequest {
+  cultivar?: string;
+  substrate?: Substrate;
+  plan_id?: string;
+  items: Array<Pick<MixRequest, "current_week" | "reservoir_liters" | "observations">>;
+}
+
+export const fetchNutrientPlanBatch = async (payload: BatchMixRequest): Promise<{ results: MixResponse[] }> => {
+  return requestJson<{ results: MixResponse[] }>("/api/nutrients/plan/batch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+};
+
+export const fetchPlanCurve = async (params: {
+  cultivar?: string;
+  substrate?: Substrate;
+  plan_id?: string;
+}): Promise<PlanCurveResponse> => {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value) query.set(key, value);
+  });
+  const suffix = query.toString() ? `?${query.toString()}` : "";
+  return requestJson<PlanCurveResponse>(`/api/nutrients/plan/curve${suffix}`);
+};
+
+export interface DoseSolveRequest {
+  target: Record<string, number | null>;
+  waterProfile?: Record<string, number | null>;
+  osmosisShare?: number;
+  stage?: "veg" | "flower" | "ripen";
+  weights?: Record<string, number>;
+  maxDose?: number;
+}
+
+export interface DoseSolveResponse {
+  doses: { A: number; X: number; BZ: number };
+  ppm: Record<string, number>;
+  residuals: Record<string, number>;
+  weightedError: number;
+}
+
+export const solveNutrientDoses = async (payload: DoseSolveRequest): Promise<DoseSolveResponse> => {
+  return requestJson<DoseSolveResponse>("/api/nutrients/solve", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+};
+
 export const fetchInventory = async (): Promise<InventoryResponse> => {
   return requestJson<InventoryResponse>("/api/nutrients/inventory");
 };
@@ -86,6 +148,55 @@ export const confirmNutrientMix = async (payload: MixRequest): Promise<MixConfir
   });
 };
 
+export interface InventoryForecastProduct {
+  name: string;
+  unit: string;
+  current: number;
+  projectedUse: number;
+  remaining: number;
+  depletionDate: string | null;
+}
+
+export interface InventoryForecastResponse {
+  start: string;
+  end: string;
+  liters: number;
+  mixIntervalDays: number;
+  phases: Array<{ phase: string; start: string; days: number; mixes: number; consumption: Record<string, number> }>;
+  products: Record<string, InventoryForecastProduct>;
+}
+
+export const fetchInventoryForecast = async (params: {
+  reservoir_liters: number;
+  mix_interval_days?: number;
+  cultivar?: string;
+  substrate?: Substrate;
+  plan_id?: string;
+  start_date?: string;
+}): Promise<InventoryForecastResponse> => {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined && value !== "") query.set(key, String(value));
+  });
+  return requestJson<InventoryForecastResponse>(`/api/nutrients/inventory/forecast?${query.toString()}`);
+};
+
+export interface BatchTank extends MixRequest {
+  label?: string;
+}
+
+export interface BatchConfirmResponse extends InventoryResponse {
+  results: Array<MixResponse & { label?: string | null }>;
+}
+
+export const confirmNutrientMixBatch = async (tanks: BatchTank[]): Promise<BatchConfirmResponse> => {
+  return requestJson<BatchConfirmResponse>("/api/nutrients/confirm/batch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ tanks }),
+  });
+};
+
 export const consumeInventory = async (payload: {
   consumption: Record<string, number>;
   substrate?: Substrate;
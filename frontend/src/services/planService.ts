@@ -104,3 +104,30 @@ export const fetchWaterProfilePresets = async (substrate: Substrate): Promise<Wa
   const response = await requestJson<{ presets: WaterProfilePreset[] }>(`/api/plans/water-profiles?${query}`);
   return response.presets || [];
 };
+
+export interface GrowTimeline {
+  growId: string;
+  planId: string;
+  status: "active" | "pending" | "finished" | "unscheduled" | "empty";
+  startDate?: string;
+  phase?: string | null;
+  phaseIndex?: number;
+  dayOfGrow?: number;
+  dayInPhase?: number;
+  phaseDays?: number;
+  nextPhase?: string | null;
+  nextTransition?: string;
+  finishedOn?: string;
+}
+
+export const fetchGrowTimelines = async (
+  grows: Array<{ id: string; cultivar: Cultivar; substrate: Substrate; startDate?: string; planId?: string }>,
+  date?: string
+): Promise<GrowTimeline[]> => {
+  const response = await requestJson<{ date: string; grows: GrowTimeline[] }>("/api/plans/timeline", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ grows, date }),
+  });
+  return response.grows || [];
+};
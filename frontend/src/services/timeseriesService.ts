@@ -5,6 +5,9 @@ export type TimeSeriesResponse = {
   series: Record<string, TimeSeriesPoint[]>;
   range_hours: number;
   interval_minutes: number;
+  incremental?: boolean;
+  replace_from?: string | null;
+  watermark?: string;
 };
 
 const requestJson = async <T>(path: string, init?: RequestInit): Promise<T> => {
@@ -20,6 +23,7 @@ export const fetchTimeSeries = async (payload: {
   entity_ids: string[];
   range_hours: number;
   interval_minutes: number;
+  since?: string;
 }): Promise<TimeSeriesResponse> => {
   return requestJson<TimeSeriesResponse>("/api/timeseries/query", {
     method: "POST",